@@ -0,0 +1,547 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from backend.utils.logger import logger
+
+# 超过该大小的序列化数据使用zlib压缩
+COMPRESS_THRESHOLD = 512
+COMPRESSED_SUFFIX = "+zlib"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    session_id TEXT,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_session ON threads (session_id, updated_at);
+"""
+
+# (type, bytes)
+TypedBlob = Tuple[str, bytes]
+
+def _compress(typed: TypedBlob) -> TypedBlob:
+    type_, data = typed
+    if len(data) > COMPRESS_THRESHOLD:
+        return type_ + COMPRESSED_SUFFIX, zlib.compress(data, 1)
+    return typed
+
+def _decompress(type_: str, data: bytes) -> TypedBlob:
+    if type_.endswith(COMPRESSED_SUFFIX):
+        return type_[:-len(COMPRESSED_SUFFIX)], zlib.decompress(data)
+    return type_, data
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[int]):
+    """基于本地SQLite文件的LangGraph检查点存储
+
+    - 每个节点完成后由LangGraph写入完整的AgentState检查点
+    - 写入只进入内存队列，由后台线程批量提交，不阻塞事件循环和SSE推送
+    - 最近活跃线程的检查点保留在内存中，读取时优先命中内存
+    - 序列化结果超过阈值时使用zlib压缩，并定期清理旧检查点
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        keep_per_thread: int = 3,
+        ttl: int = 86400,
+        prune_interval: int = 200,
+        cache_threads: int = 256,
+        batch_size: int = 64
+    ):
+        super().__init__()
+        self.db_path = db_path
+        self.keep_per_thread = keep_per_thread
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self.cache_threads = cache_threads
+        self.batch_size = batch_size
+
+        # (thread_id, checkpoint_ns) -> OrderedDict[checkpoint_id -> (checkpoint, metadata, parent_id)]
+        self._recent: "OrderedDict[Tuple[str, str], OrderedDict[str, Tuple[TypedBlob, TypedBlob, Optional[str]]]]" = OrderedDict()
+        # (thread_id, checkpoint_ns, checkpoint_id) -> {(task_id, idx): (task_id, channel, value, task_path)}
+        self._writes: Dict[Tuple[str, str, str], Dict[Tuple[str, int], Tuple[str, str, TypedBlob, str]]] = {}
+        self._lock = threading.Lock()
+
+        self._queue: "queue.Queue[Optional[Tuple[str, Any]]]" = queue.Queue()
+        self._writes_since_prune = 0
+        self.stats = {"checkpoints_written": 0, "batches": 0, "pruned": 0}
+
+        if Path(db_path).parent:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+        self._writer = threading.Thread(
+            target=self._writer_loop, name="checkpoint-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ------------------------------------------------------------------
+    # 后台写入线程
+    # ------------------------------------------------------------------
+
+    def _writer_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    next_item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_item is None:
+                    # 将关闭信号放回，处理完当前批次后退出
+                    self._queue.task_done()
+                    self._queue.put(None)
+                    break
+                batch.append(next_item)
+
+            try:
+                self._apply_batch(conn, batch)
+            except Exception as e:
+                logger.error(f"Checkpoint batch write failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    def _apply_batch(self, conn: sqlite3.Connection, batch: List[Tuple[str, Any]]):
+        now = time.time()
+        with conn:
+            for op, payload in batch:
+                if op == "checkpoint":
+                    thread_id, ns, checkpoint_id, parent_id, checkpoint, metadata = payload
+                    ctype, cdata = _compress(checkpoint)
+                    mtype, mdata = metadata
+                    conn.execute(
+                        "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (thread_id, ns, checkpoint_id, parent_id, ctype, cdata, mtype, mdata, now)
+                    )
+                    conn.execute(
+                        "UPDATE threads SET updated_at = ? WHERE thread_id = ?",
+                        (now, thread_id)
+                    )
+                    self._writes_since_prune += 1
+                    self.stats["checkpoints_written"] += 1
+                elif op == "writes":
+                    rows = []
+                    for thread_id, ns, checkpoint_id, task_id, idx, channel, value, task_path in payload:
+                        vtype, vdata = _compress(value)
+                        rows.append((thread_id, ns, checkpoint_id, task_id, idx, channel, vtype, vdata, task_path))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                    )
+                elif op == "thread":
+                    thread_id, session_id, status = payload
+                    conn.execute(
+                        "INSERT INTO threads VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(thread_id) DO UPDATE SET status = excluded.status, "
+                        "updated_at = excluded.updated_at, "
+                        "session_id = COALESCE(excluded.session_id, threads.session_id)",
+                        (thread_id, session_id, status, now)
+                    )
+                elif op == "delete":
+                    for table in ("checkpoints", "writes", "threads"):
+                        conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (payload,))
+        self.stats["batches"] += 1
+
+        if self._writes_since_prune >= self.prune_interval:
+            self._writes_since_prune = 0
+            self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection):
+        """删除过期线程，并只为每个线程保留最近的若干检查点"""
+        cutoff = time.time() - self.ttl
+        with conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,)
+            )]
+            conn.execute("DELETE FROM checkpoints WHERE updated_at < ?", (cutoff,))
+            conn.execute("DELETE FROM threads WHERE updated_at < ?", (cutoff,))
+            conn.execute(
+                """
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns
+                            ORDER BY checkpoint_id DESC
+                        ) AS rn FROM checkpoints
+                    ) WHERE rn > ?
+                )
+                """,
+                (self.keep_per_thread,)
+            )
+            cursor = conn.execute(
+                """
+                DELETE FROM writes WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = writes.thread_id
+                    AND c.checkpoint_ns = writes.checkpoint_ns
+                    AND c.checkpoint_id = writes.checkpoint_id
+                )
+                """
+            )
+        self.stats["pruned"] += len(expired)
+        logger.debug(
+            f"Checkpoint pruning removed {len(expired)} expired threads "
+            f"and {cursor.rowcount} orphan writes"
+        )
+
+    def flush(self):
+        """阻塞直到所有排队的写入完成"""
+        self._queue.join()
+
+    def close(self):
+        """刷新队列并停止后台线程"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    # ------------------------------------------------------------------
+    # 会话与线程索引
+    # ------------------------------------------------------------------
+
+    def register_thread(self, thread_id: str, session_id: Optional[str]):
+        """登记一次咨询对应的检查点线程"""
+        self._queue.put(("thread", (thread_id, session_id, "running")))
+
+    def mark_thread(self, thread_id: str, status: str):
+        """更新线程状态（completed/failed）"""
+        self._queue.put(("thread", (thread_id, None, status)))
+
+    def find_resumable_thread(self, session_id: str) -> Optional[str]:
+        """查找会话中最近一次未完成的咨询线程"""
+        self.flush()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT thread_id FROM threads WHERE session_id = ? AND status = 'running' "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    async def afind_resumable_thread(self, session_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.find_resumable_thread, session_id)
+
+    # ------------------------------------------------------------------
+    # BaseCheckpointSaver 接口
+    # ------------------------------------------------------------------
+
+    def _make_tuple(
+        self,
+        thread_id: str,
+        ns: str,
+        checkpoint_id: str,
+        checkpoint: TypedBlob,
+        metadata: TypedBlob,
+        parent_id: Optional[str],
+        writes: Sequence[Tuple[str, str, TypedBlob, str]]
+    ) -> CheckpointTuple:
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed(checkpoint),
+            metadata=self.serde.loads_typed(metadata),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for task_id, channel, value, _ in writes
+            ],
+        )
+
+    def _get_recent(self, thread_id: str, ns: str, checkpoint_id: Optional[str]) -> Optional[CheckpointTuple]:
+        with self._lock:
+            checkpoints = self._recent.get((thread_id, ns))
+            if not checkpoints:
+                return None
+            if checkpoint_id is None:
+                checkpoint_id = next(reversed(checkpoints))
+            saved = checkpoints.get(checkpoint_id)
+            if saved is None:
+                return None
+            writes = list(self._writes.get((thread_id, ns, checkpoint_id), {}).values())
+        checkpoint, metadata, parent_id = saved
+        return self._make_tuple(thread_id, ns, checkpoint_id, checkpoint, metadata, parent_id, writes)
+
+    def _query_tuples(
+        self,
+        thread_id: Optional[str],
+        ns: Optional[str],
+        checkpoint_id: Optional[str],
+        before_id: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[CheckpointTuple]:
+        clauses, params = [], []
+        if thread_id is not None:
+            clauses.append("thread_id = ?")
+            params.append(thread_id)
+        if ns is not None:
+            clauses.append("checkpoint_ns = ?")
+            params.append(ns)
+        if checkpoint_id is not None:
+            clauses.append("checkpoint_id = ?")
+            params.append(checkpoint_id)
+        if before_id is not None:
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            f"type, checkpoint, metadata_type, metadata FROM checkpoints {where} "
+            "ORDER BY checkpoint_id DESC"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        results = []
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            for tid, cns, cid, parent_id, ctype, cdata, mtype, mdata in rows:
+                write_rows = conn.execute(
+                    "SELECT task_id, channel, type, value, task_path FROM writes "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+                    "ORDER BY task_id, idx",
+                    (tid, cns, cid)
+                ).fetchall()
+                writes = [
+                    (task_id, channel, _decompress(vtype, vdata), task_path)
+                    for task_id, channel, vtype, vdata, task_path in write_rows
+                ]
+                results.append(self._make_tuple(
+                    tid, cns, cid, _decompress(ctype, cdata), (mtype, mdata), parent_id, writes
+                ))
+        return results
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        recent = self._get_recent(thread_id, ns, checkpoint_id)
+        if recent is not None:
+            return recent
+
+        self.flush()
+        tuples = self._query_tuples(thread_id, ns, checkpoint_id, limit=1)
+        return tuples[0] if tuples else None
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        recent = self._get_recent(thread_id, ns, get_checkpoint_id(config))
+        if recent is not None:
+            return recent
+        # 内存未命中时在线程池中查询数据库，避免阻塞事件循环
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        self.flush()
+        configurable = config["configurable"] if config else {}
+        tuples = self._query_tuples(
+            configurable.get("thread_id"),
+            configurable.get("checkpoint_ns"),
+            get_checkpoint_id(config) if config else None,
+            before_id=get_checkpoint_id(before) if before else None,
+            limit=None if filter else limit
+        )
+        count = 0
+        for checkpoint_tuple in tuples:
+            if filter and not all(
+                checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()
+            ):
+                continue
+            if limit is not None and count >= limit:
+                break
+            count += 1
+            yield checkpoint_tuple
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self._lock:
+            key = (thread_id, ns)
+            checkpoints = self._recent.pop(key, None) or OrderedDict()
+            checkpoints[checkpoint["id"]] = (checkpoint_blob, metadata_blob, parent_id)
+            while len(checkpoints) > self.keep_per_thread:
+                old_id, _ = checkpoints.popitem(last=False)
+                self._writes.pop((thread_id, ns, old_id), None)
+            self._recent[key] = checkpoints
+            while len(self._recent) > self.cache_threads:
+                (old_thread, old_ns), old_checkpoints = self._recent.popitem(last=False)
+                for old_id in old_checkpoints:
+                    self._writes.pop((old_thread, old_ns, old_id), None)
+
+        self._queue.put((
+            "checkpoint",
+            (thread_id, ns, checkpoint["id"], parent_id, checkpoint_blob, metadata_blob)
+        ))
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        outer_key = (thread_id, ns, checkpoint_id)
+
+        rows = []
+        with self._lock:
+            existing = self._writes.setdefault(outer_key, {})
+            for idx, (channel, value) in enumerate(writes):
+                inner_key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+                if inner_key[1] >= 0 and inner_key in existing:
+                    continue
+                typed = self.serde.dumps_typed(value)
+                existing[inner_key] = (task_id, channel, typed, task_path)
+                rows.append((thread_id, ns, checkpoint_id, task_id, inner_key[1], channel, typed, task_path))
+
+        if rows:
+            self._queue.put(("writes", rows))
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._recent if key[0] == thread_id]:
+                for checkpoint_id in self._recent.pop(key):
+                    self._writes.pop((key[0], key[1], checkpoint_id), None)
+        self._queue.put(("delete", thread_id))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "pending_writes": self._queue.qsize(),
+            "cached_threads": len(self._recent),
+        }
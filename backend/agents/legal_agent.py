@@ -1,72 +1,125 @@
 import asyncio
+import hashlib
 import json
-from typing import Dict, Any, List, AsyncGenerator, Optional
+import time
+from typing import Dict, Any, List, AsyncGenerator, Optional, Tuple
 from datetime import datetime
 import uuid
 
-from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage, AIMessage
-from langchain.memory import ConversationBufferWindowMemory
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from typing_extensions import Annotated, TypedDict
 
-from backend.tools.legal_tools import (
-    LegalCaseSearchTool,
-    LawyerRecommendationTool,
-    LegalAnalysisTool,
-    WebSearchTool,
-    ReportGeneratorTool
-)
+from backend.tools.legal_tools import create_tools, initialize_tools
+from backend.agents.checkpoint import SQLiteCheckpointSaver
+from backend.agents.memory import SessionMemoryManager, ConversationTurn
 from backend.config import settings
+from backend.utils.json_utils import extract_json, format_for_prompt
+from backend.utils.llm import create_llm
+from backend.utils.metrics import GRAPH_NODE_DURATION, timed
+from backend.utils.rate_limit import llm_degraded
+from backend.utils.shared_state import InMemorySharedState, get_shared_state
+from backend.utils.startup import startup_report
+from backend.utils.tracing import annotate, traced, tracer
 from backend.utils.logger import logger, log_async_calls
 
+# 以这些词开头的短问题视为对上一次咨询的追问
+FOLLOW_UP_MARKERS = ("那", "那么", "如果", "还有", "另外", "此外", "再", "这种情况", "上述", "刚才", "所以")
+
+# 计算问题相似度时忽略的常见双字词
+COMMON_BIGRAMS = {"怎么", "么办", "如何", "什么", "可以", "是否", "应该", "需要", "我的", "请问", "问题"}
+
+# LLM规划失败或超出token额度时使用的默认计划
+DEFAULT_PLAN = ("法律案情分析", "案例检索", "解决方案建议")
+
+# 可以在规划完成前投机执行的工具及其对应的计划步骤（不调用LLM、开销低）
+SPECULATIVE_STEPS = {
+    "case_search": "案例检索",
+    "lawyer_recommendation": "律师推荐",
+}
+
+# 追问中出现这些关键词时，追加对应的执行步骤
+FOLLOW_UP_STEP_HINTS = {
+    "律师": "律师推荐",
+    "案例": "案例检索",
+    "判例": "案例检索",
+    "法条": "相关法条检索",
+    "风险": "风险评估",
+    "报告": "报告生成",
+}
+
+def merge_dict(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """状态字典合并：节点只返回新增或变化的键"""
+    return {**(left or {}), **(right or {})}
+
 class AgentState(TypedDict):
-    """Agent状态定义"""
+    """Agent状态定义
+
+    节点只返回发生变化的字段（增量），execution_results 和 metadata 按键合并。
+    """
     messages: Annotated[list, add_messages]
     plan: List[str]
     current_step: int
-    execution_results: Dict[str, Any]
+    execution_results: Annotated[Dict[str, Any], merge_dict]
     final_answer: str
     case_type: str
     session_id: str
-    metadata: Dict[str, Any]
+    metadata: Annotated[Dict[str, Any], merge_dict]
 
 class LegalPlanExecuteAgent:
     """基于LangGraph的法律咨询Plan-and-Execute Agent"""
     
-    def __init__(self):
+    def __init__(self, tools: Optional[Dict[str, Any]] = None):
         self.llm = None
-        self.tools = {}
+        # 可传入应用启动时已创建的工具（不依赖Agent的接口可以在Agent初始化完成前使用）
+        self.tools = tools if tools is not None else {}
         self.graph = None
-        self.memory = None
-        self.session_id = str(uuid.uuid4())
+        self.memory: Optional[SessionMemoryManager] = None
+        self.checkpointer: Optional[SQLiteCheckpointSaver] = None
+        # 线程ID -> {步骤签名: (投机任务, 开始时间)}
+        self._speculations: Dict[str, Dict[str, Tuple[asyncio.Task, float]]] = {}
+        self.speculation_stats = {"started": 0, "adopted": 0, "wasted": 0, "saved_ms": 0.0}
         
     @log_async_calls("agent")
     async def initialize(self):
         """初始化Agent"""
         try:
-            # 初始化LLM
-            llm_config = settings.llm_config
-            self.llm = ChatOpenAI(
-                api_key=llm_config["api_key"],
-                base_url=llm_config["base_url"],
-                model=llm_config["model"],
-                temperature=0.1,
-                streaming=True
-            )
+            # 初始化LLM（首次创建客户端时导入langchain_openai和建立TLS上下文，在线程中进行不阻塞事件循环）
+            with startup_report.phase("agent.llm"):
+                self.llm = await asyncio.to_thread(create_llm, temperature=0.1, streaming=True)
             
             # 初始化工具
-            await self._initialize_tools()
+            with startup_report.phase("agent.tools"):
+                await self._initialize_tools()
             
-            # 初始化记忆
-            self.memory = ConversationBufferWindowMemory(
-                k=settings.memory_max_tokens,
-                return_messages=True
-            )
+            # 初始化会话记忆
+            if settings.enable_memory:
+                shared_state = get_shared_state()
+                self.memory = SessionMemoryManager(
+                    max_tokens_per_session=settings.memory_max_tokens,
+                    max_sessions=settings.memory_max_sessions,
+                    max_total_tokens=settings.memory_max_total_tokens,
+                    idle_ttl=settings.memory_session_ttl,
+                    keep_recent_turns=settings.memory_keep_recent_turns,
+                    summarizer=self._summarize_turns if settings.memory_llm_summary else None,
+                    # 进程内共享状态与本地记忆重复，只在多worker共享存储时使用
+                    store=None if isinstance(shared_state, InMemorySharedState) else shared_state
+                )
+            
+            # 初始化检查点存储
+            if settings.enable_checkpointing:
+                with startup_report.phase("agent.checkpointer"):
+                    self.checkpointer = SQLiteCheckpointSaver(
+                        settings.checkpoint_db_path,
+                        keep_per_thread=settings.checkpoint_keep_per_thread,
+                        ttl=settings.checkpoint_ttl,
+                        prune_interval=settings.checkpoint_prune_interval
+                    )
             
             # 构建LangGraph
-            self._build_graph()
+            with startup_report.phase("agent.graph"):
+                self._build_graph()
             
             logger.info("Legal Plan-Execute Agent initialized successfully")
             
@@ -76,38 +129,74 @@ class LegalPlanExecuteAgent:
     
     async def _initialize_tools(self):
         """初始化工具"""
-        self.tools = {
-            "case_search": LegalCaseSearchTool(),
-            "lawyer_recommendation": LawyerRecommendationTool(),
-            "legal_analysis": LegalAnalysisTool(),
-            "web_search": WebSearchTool(),
-            "report_generator": ReportGeneratorTool()
-        }
+        if not self.tools:
+            self.tools.update(create_tools())
+        await initialize_tools(self.tools)
+    
+    async def _summarize_turns(self, summary: str, turns: List[ConversationTurn]) -> str:
+        """使用LLM将早期对话折叠为摘要"""
+        dialogue = "\n".join(
+            f"{'用户' if turn.role == 'user' else '助手'}：{turn.content}" for turn in turns
+        )
+        prompt = f"""
+        请将以下法律咨询对话压缩为简洁的摘要，保留案情事实、用户诉求和已给出的关键结论。
         
-        # 初始化每个工具
-        for tool_name, tool in self.tools.items():
-            try:
-                if hasattr(tool, 'initialize'):
-                    await tool.initialize()
-                logger.debug(f"Tool {tool_name} initialized")
-            except Exception as e:
-                logger.warning(f"Failed to initialize tool {tool_name}: {e}")
+        已有摘要：{summary or '无'}
+        
+        新增对话：
+        {dialogue}
+        
+        只返回摘要正文。
+        """
+        response = await self.llm.ainvoke([SystemMessage(content=prompt)])
+        return response.content.strip()
+    
+    def _format_history(self, state: AgentState) -> str:
+        """将当前问题之前的会话历史格式化为提示词文本"""
+        lines = []
+        for message in state["messages"][:-1]:
+            if isinstance(message, SystemMessage):
+                lines.append(f"历史摘要：{message.content}")
+            elif isinstance(message, HumanMessage):
+                lines.append(f"用户：{message.content}")
+            elif isinstance(message, AIMessage):
+                lines.append(f"助手：{message.content}")
+        return "\n".join(lines)
     
     def _build_graph(self):
         """构建LangGraph工作流"""
         workflow = StateGraph(AgentState)
         
-        # 添加节点
-        workflow.add_node("planner", self._planner_node)
-        workflow.add_node("executor", self._executor_node)
-        workflow.add_node("analyzer", self._analyzer_node)
-        workflow.add_node("finalizer", self._finalizer_node)
+        # 添加节点（每个节点的执行时间记录到指标直方图，并在请求追踪中记录为子span）
+        nodes = {
+            "planner": self._planner_node,
+            "replanner": self._replanner_node,
+            "executor": self._executor_node,
+            "analyzer": self._analyzer_node,
+            "finalizer": self._finalizer_node,
+        }
+        for node_name, node in nodes.items():
+            workflow.add_node(node_name, traced(f"node.{node_name}")(timed(GRAPH_NODE_DURATION, node_name)(node)))
         
-        # 设置入口点
-        workflow.set_entry_point("planner")
+        # 设置入口点：追问走增量规划，其余走完整规划
+        workflow.set_conditional_entry_point(
+            self._route_entry,
+            {
+                "planner": "planner",
+                "replanner": "replanner"
+            }
+        )
         
         # 添加边
         workflow.add_edge("planner", "executor")
+        workflow.add_conditional_edges(
+            "replanner",
+            self._should_continue,
+            {
+                "continue": "executor",
+                "finish": "finalizer"
+            }
+        )
         workflow.add_edge("executor", "analyzer")
         workflow.add_conditional_edges(
             "analyzer",
@@ -119,18 +208,74 @@ class LegalPlanExecuteAgent:
         )
         workflow.add_edge("finalizer", END)
         
-        self.graph = workflow.compile()
+        self.graph = workflow.compile(checkpointer=self.checkpointer)
+    
+    def _route_entry(self, state: AgentState) -> str:
+        """选择入口节点"""
+        return "replanner" if state["metadata"].get("follow_up") else "planner"
     
-    async def _planner_node(self, state: AgentState) -> AgentState:
+    async def _replanner_node(self, state: AgentState) -> Dict[str, Any]:
+        """增量规划节点 - 对比会话中的上一次计划，只重新执行输入发生变化的步骤"""
+        logger.debug("Executing replanner node")
+        
+        session = self.memory.get(state["session_id"]) if self.memory is not None else None
+        prior_plan = list(session.plan) if session is not None else []
+        follow_up_query = state["messages"][-1].content
+        
+        full_plan = [step for step in prior_plan if not self._is_report_step(step)]
+        for keyword, step in FOLLOW_UP_STEP_HINTS.items():
+            if keyword in follow_up_query and step not in full_plan:
+                full_plan.append(step)
+        
+        step_query = self._step_query(state)
+        pending_steps = []
+        reused_results = {}
+        step_signatures = {}
+        for step in full_plan:
+            tool_name, tool_args = self._route_step(step, step_query, state)
+            signature = self._step_signature(tool_name, tool_args)
+            step_signatures[step] = signature
+            cached_result = session.get_cached_result(signature) if session and signature else None
+            if cached_result is not None:
+                reused_results[step] = cached_result
+            else:
+                pending_steps.append(step)
+        
+        logger.info(
+            f"Follow-up replanned: reusing {len(reused_results)} steps, "
+            f"re-running {len(pending_steps)} steps"
+        )
+        return {
+            "plan": pending_steps,
+            "current_step": 0,
+            "execution_results": reused_results,
+            "metadata": {
+                "full_plan": full_plan,
+                "reused_steps": list(reused_results.keys()),
+                "step_signatures": step_signatures
+            }
+        }
+    
+    @staticmethod
+    def _is_report_step(step: str) -> bool:
+        return "报告" in step
+    
+    def _step_query(self, state: AgentState) -> str:
+        """工具步骤使用的查询文本：追问时沿用原始案情，否则为当前问题"""
+        return state["metadata"].get("case_context") or state["messages"][-1].content
+    
+    async def _planner_node(self, state: AgentState) -> Dict[str, Any]:
         """规划节点 - 分析用户查询并制定执行计划"""
         logger.debug("Executing planner node")
         
         user_query = state["messages"][-1].content
         case_type = state.get("case_type", "general")
+        history = self._format_history(state)
+        history_section = f"\n        会话历史：\n{history}\n" if history else ""
         
         planning_prompt = f"""
         作为专业的法律咨询AI助手，请分析以下用户查询并制定详细的执行计划。
-        
+        {history_section}
         用户查询：{user_query}
         案例类型：{case_type}
         
@@ -150,98 +295,213 @@ class LegalPlanExecuteAgent:
         }}
         """
         
+        if llm_degraded.get():
+            # 超出token额度时不调用LLM制定计划，直接使用默认计划
+            return {"plan": list(DEFAULT_PLAN), "current_step": 0, "metadata": {"degraded": True}}
+        
         try:
             response = await self.llm.ainvoke([SystemMessage(content=planning_prompt)])
-            response_content = response.content.strip()
-            
-            # 尝试提取JSON部分
-            if '{' in response_content and '}' in response_content:
-                start_idx = response_content.find('{')
-                end_idx = response_content.rfind('}') + 1
-                json_str = response_content[start_idx:end_idx]
-                plan_data = json.loads(json_str)
-            else:
+            plan_data = extract_json(response.content)
+            if not isinstance(plan_data, dict):
                 raise ValueError("No valid JSON found in response")
             
-            state["plan"] = plan_data["plan"]
-            state["current_step"] = 0
-            state["execution_results"] = {}
-            state["metadata"]["planning_reasoning"] = plan_data.get("reasoning", "")
-            
-            logger.info(f"Plan created with {len(state['plan'])} steps")
+            logger.info(f"Plan created with {len(plan_data['plan'])} steps")
+            return {
+                "plan": plan_data["plan"],
+                "current_step": 0,
+                "metadata": {"planning_reasoning": plan_data.get("reasoning", "")}
+            }
             
         except Exception as e:
             logger.error(f"Planning failed: {e}")
             # 使用默认计划
-            state["plan"] = ["法律案情分析", "案例检索", "解决方案建议"]
-            state["current_step"] = 0
-            state["execution_results"] = {}
-        
-        return state
+            return {"plan": list(DEFAULT_PLAN), "current_step": 0}
     
-    async def _executor_node(self, state: AgentState) -> AgentState:
+    async def _executor_node(self, state: AgentState) -> Dict[str, Any]:
         """执行节点 - 执行当前计划步骤"""
-        logger.debug(f"Executing step {state['current_step']}")
+        logger.debug("Executing step %s", state["current_step"])
         
         if state["current_step"] >= len(state["plan"]):
-            return state
+            return {}
         
         current_step = state["plan"][state["current_step"]]
-        user_query = state["messages"][-1].content
+        user_query = self._step_query(state)
+        metadata: Dict[str, Any] = {}
         
         try:
-            result = await self._execute_step(current_step, user_query, state)
-            state["execution_results"][current_step] = result
-            state["current_step"] += 1
+            tool_name, tool_args = self._route_step(current_step, user_query, state)
+            signature = self._step_signature(tool_name, tool_args)
+            metadata["step_signatures"] = {
+                **state["metadata"].get("step_signatures", {}), current_step: signature
+            }
+            
+            cached_result = self._get_cached_result(state["session_id"], signature)
+            speculation = self._take_speculation(state["metadata"].get("thread_id"), signature)
+            if cached_result is not None:
+                if speculation is not None:
+                    # 会话缓存命中，投机结果用不到，立即取消避免继续消耗
+                    self._waste_speculation(speculation[0])
+                result = cached_result
+                annotate(step=current_step, cache="session")
+                metadata["reused_steps"] = state["metadata"].get("reused_steps", []) + [current_step]
+                logger.info(f"Step '{current_step}' reused cached session result")
+            elif speculation is not None:
+                annotate(step=current_step, cache="speculation")
+                result = await self._adopt_speculation(current_step, *speculation)
+            else:
+                result = await self._execute_step(tool_name, tool_args, signature)
             
             logger.info(f"Step '{current_step}' completed successfully")
             
         except Exception as e:
             logger.error(f"Step '{current_step}' failed: {e}")
-            state["execution_results"][current_step] = {
+            result = {
                 "error": str(e),
                 "status": "failed"
             }
-            state["current_step"] += 1
         
-        return state
+        return {
+            "current_step": state["current_step"] + 1,
+            "execution_results": {current_step: result},
+            "metadata": metadata
+        }
     
-    async def _execute_step(self, step: str, query: str, state: AgentState) -> Dict[str, Any]:
-        """执行具体步骤"""
+    async def _execute_step(
+        self, tool_name: str, tool_args: Dict[str, Any], signature: Optional[str]
+    ) -> Dict[str, Any]:
+        """执行步骤对应的工具"""
+        with tracer.span(f"tool.{tool_name}", tool=tool_name):
+            if signature and settings.tool_cache_ttl > 0:
+                # 相同输入的步骤在所有会话和worker间只执行一次
+                return await get_shared_state().single_flight(
+                    f"tool:{signature}",
+                    lambda: self._invoke_tool(tool_name, tool_args),
+                    ttl=settings.tool_cache_ttl,
+                    should_cache=lambda value: not (isinstance(value, dict) and "error" in value)
+                )
+            return await self._invoke_tool(tool_name, tool_args)
+    
+    def _start_speculation(self, thread_id: str, query: str, state: Dict[str, Any]):
+        """在规划进行的同时提前执行低开销工具，参数与执行节点中对应步骤的参数一致"""
+        speculations = {}
+        for tool_name in settings.speculative_tools:
+            step = SPECULATIVE_STEPS.get(tool_name)
+            if step is None or tool_name not in self.tools:
+                continue
+            routed_tool, tool_args = self._route_step(step, query, state)
+            signature = self._step_signature(routed_tool, tool_args)
+            task = asyncio.create_task(self._execute_step(routed_tool, tool_args, signature))
+            speculations[signature] = (task, time.perf_counter())
+            self.speculation_stats["started"] += 1
+        if speculations:
+            self._speculations[thread_id] = speculations
+    
+    def _take_speculation(
+        self, thread_id: Optional[str], signature: Optional[str]
+    ) -> Optional[Tuple[asyncio.Task, float]]:
+        """取出与步骤签名匹配的投机任务"""
+        speculations = self._speculations.get(thread_id) if thread_id else None
+        if not speculations or not signature:
+            return None
+        return speculations.pop(signature, None)
+    
+    async def _adopt_speculation(self, step: str, task: asyncio.Task, started_at: float) -> Dict[str, Any]:
+        """采用投机结果，节省的时间为执行节点需要结果之前已经完成的执行时间"""
+        adopted_at = time.perf_counter()
+        result = await task
+        finished_at = time.perf_counter()
+        saved_ms = (min(adopted_at, finished_at) - started_at) * 1000
+        self.speculation_stats["adopted"] += 1
+        self.speculation_stats["saved_ms"] += saved_ms
+        logger.info(f"Step '{step}' adopted speculative result, saved {saved_ms:.1f}ms")
+        return result
+    
+    def _waste_speculation(self, task: asyncio.Task):
+        """取消用不到的投机任务并计入浪费"""
+        if task.done():
+            if not task.cancelled():
+                task.exception()  # 避免未取回的异常告警
+        else:
+            task.cancel()
+        self.speculation_stats["wasted"] += 1
+    
+    def _discard_speculations(self, thread_id: str):
+        """丢弃计划中未用到的投机任务"""
+        for task, _ in self._speculations.pop(thread_id, {}).values():
+            self._waste_speculation(task)
+    
+    def speculation_metrics(self) -> Dict[str, Any]:
+        """投机执行统计"""
+        stats = self.speculation_stats
+        finished = stats["adopted"] + stats["wasted"]
+        return {
+            **stats,
+            "saved_ms": round(stats["saved_ms"], 1),
+            "wasted_ratio": round(stats["wasted"] / finished, 4) if finished else 0.0,
+            "avg_saved_ms": round(stats["saved_ms"] / stats["adopted"], 1) if stats["adopted"] else 0.0,
+            "in_flight": sum(len(speculations) for speculations in self._speculations.values()),
+        }
+    
+    def _route_step(self, step: str, query: str, state: AgentState) -> Tuple[str, Dict[str, Any]]:
+        """将计划步骤映射为 (工具名, 调用参数)"""
         step_lower = step.lower()
         
         if "分析" in step_lower or "案情" in step_lower:
-            return await self.tools["legal_analysis"].analyze(query)
+            return "legal_analysis", {"case_description": query}
         
         elif "检索" in step_lower or "案例" in step_lower:
-            return await self.tools["case_search"].search(query, state.get("case_type", ""))
+            return "case_search", {"keywords": query, "case_type": state.get("case_type", "")}
         
         elif "律师" in step_lower or "推荐" in step_lower:
-            return await self.tools["lawyer_recommendation"].recommend(
-                state.get("case_type", ""), 
-                state["metadata"].get("location", "")
-            )
+            return "lawyer_recommendation", {
+                "case_type": state.get("case_type", ""),
+                "location": state["metadata"].get("location", "")
+            }
         
         elif "搜索" in step_lower or "查找" in step_lower:
-            return await self.tools["web_search"].search(query)
+            return "web_search", {"query": query}
         
         elif "报告" in step_lower or "生成" in step_lower:
-            return await self.tools["report_generator"].generate(state["execution_results"])
+            return "report_generator", {"execution_results": state["execution_results"]}
         
         else:
             # 通用LLM处理
-            prompt = f"请处理以下法律相关任务：{step}\n\n用户查询：{query}"
+            return "llm", {"step": step, "query": query}
+    
+    @staticmethod
+    def _step_signature(tool_name: str, tool_args: Dict[str, Any]) -> Optional[str]:
+        """计算步骤输入签名，输入相同的步骤可以复用之前的结果"""
+        if tool_name == "report_generator":
+            # 报告依赖于本次所有执行结果，不复用
+            return None
+        payload = json.dumps([tool_name, tool_args], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    
+    def _get_cached_result(self, session_id: str, signature: Optional[str]) -> Optional[Dict[str, Any]]:
+        """从会话记忆中查找输入签名相同的历史执行结果"""
+        if not signature or self.memory is None:
+            return None
+        session = self.memory.get(session_id)
+        if session is None:
+            return None
+        return session.get_cached_result(signature)
+    
+    async def _invoke_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> Dict[str, Any]:
+        """执行具体步骤"""
+        if tool_name == "llm":
+            prompt = f"请处理以下法律相关任务：{tool_args['step']}\n\n用户查询：{tool_args['query']}"
             response = await self.llm.ainvoke([SystemMessage(content=prompt)])
             return {"content": response.content, "type": "llm_response"}
+        
+        return await self.tools[tool_name].execute(**tool_args)
     
-    async def _analyzer_node(self, state: AgentState) -> AgentState:
+    async def _analyzer_node(self, state: AgentState) -> Dict[str, Any]:
         """分析节点 - 分析执行结果并决定是否继续"""
         logger.debug("Executing analyzer node")
         
         # 检查是否所有步骤都已完成
         if state["current_step"] >= len(state["plan"]):
-            state["metadata"]["analysis_result"] = "all_steps_completed"
-            return state
+            return {"metadata": {"analysis_result": "all_steps_completed"}}
         
         # 分析当前执行结果的质量
         current_results = state["execution_results"]
@@ -250,12 +510,11 @@ class LegalPlanExecuteAgent:
         
         if len(failed_steps) > len(state["plan"]) // 2:
             # 如果失败步骤过多，提前结束
-            state["metadata"]["analysis_result"] = "too_many_failures"
-            state["current_step"] = len(state["plan"])  # 强制结束
-        else:
-            state["metadata"]["analysis_result"] = "continue_execution"
-        
-        return state
+            return {
+                "current_step": len(state["plan"]),  # 强制结束
+                "metadata": {"analysis_result": "too_many_failures"}
+            }
+        return {"metadata": {"analysis_result": "continue_execution"}}
     
     def _should_continue(self, state: AgentState) -> str:
         """决定是否继续执行"""
@@ -268,21 +527,25 @@ class LegalPlanExecuteAgent:
         
         return "continue"
     
-    async def _finalizer_node(self, state: AgentState) -> AgentState:
+    async def _finalizer_node(self, state: AgentState) -> Dict[str, Any]:
         """最终化节点 - 生成最终答案"""
         logger.debug("Executing finalizer node")
         
         user_query = state["messages"][-1].content
         execution_results = state["execution_results"]
+        history = self._format_history(state)
+        history_section = f"\n        会话历史：\n{history}\n" if history else ""
+        if state["metadata"].get("follow_up"):
+            history_section += "\n        这是对上述咨询的追问，请结合已有执行结果重点回答追问内容。\n"
         
         # 构建最终回答
         final_prompt = f"""
         基于以下执行结果，为用户提供一个全面、专业的法律咨询回答。
-        
+        {history_section}
         用户查询：{user_query}
         
         执行结果：
-        {json.dumps(execution_results, ensure_ascii=False, indent=2)}
+        {format_for_prompt(execution_results)}
         
         请提供一个结构化的回答，包括：
         1. 问题分析
@@ -296,48 +559,179 @@ class LegalPlanExecuteAgent:
         
         try:
             response = await self.llm.ainvoke([SystemMessage(content=final_prompt)])
-            state["final_answer"] = response.content
-            
-            # 添加到消息历史
-            state["messages"].append(AIMessage(content=response.content))
-            
             logger.info("Final answer generated successfully")
+            # 添加到消息历史
+            return {"final_answer": response.content, "messages": [AIMessage(content=response.content)]}
             
         except Exception as e:
             logger.error(f"Failed to generate final answer: {e}")
-            state["final_answer"] = "抱歉，生成最终回答时出现错误，请稍后重试。"
-        
-        return state
+            return {"final_answer": "抱歉，生成最终回答时出现错误，请稍后重试。"}
+    
+    def _build_history_messages(self, session_id: str) -> List[Any]:
+        """从会话记忆构建历史消息（摘要 + 最近对话）"""
+        if self.memory is None:
+            return []
+        session = self.memory.get(session_id)
+        if session is None or not session.has_history:
+            return []
+        
+        messages: List[Any] = []
+        if session.summary:
+            messages.append(SystemMessage(content=session.summary))
+        for turn in session.turns:
+            if turn.role == "user":
+                messages.append(HumanMessage(content=turn.content))
+            else:
+                messages.append(AIMessage(content=turn.content))
+        return messages
+    
+    def _is_follow_up(self, query: str, case_type: str, session_id: str, follow_up: Optional[bool]) -> bool:
+        """判断当前问题是否为对会话中上一次咨询的追问"""
+        if not settings.enable_incremental_replanning or self.memory is None:
+            return False
+        session = self.memory.get(session_id)
+        if session is None or not session.plan or not session.case_context:
+            return False
+        if follow_up is not None:
+            return follow_up
+        
+        # 案件类型发生变化时视为新的咨询
+        if case_type and case_type != "general" and session.case_type and case_type != session.case_type:
+            return False
+        
+        stripped = query.strip()
+        if stripped.startswith(FOLLOW_UP_MARKERS):
+            return True
+        if len(stripped) > settings.follow_up_max_query_chars:
+            return False
+        
+        # 短问题与原始案情存在足够的字面重叠时视为追问
+        query_bigrams = {stripped[i:i + 2] for i in range(len(stripped) - 1)} - COMMON_BIGRAMS
+        if not query_bigrams:
+            return False
+        context = session.case_context
+        overlap = sum(1 for bigram in query_bigrams if bigram in context)
+        return overlap / len(query_bigrams) >= settings.follow_up_min_overlap
+    
+    async def _load_resumable(self, session_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """查找会话中最近一次未完成的咨询，返回 (线程ID, 已保存的状态)"""
+        if self.checkpointer is None:
+            return None
+        thread_id = await self.checkpointer.afind_resumable_thread(session_id)
+        if thread_id is None:
+            return None
+        snapshot = await self.graph.aget_state({"configurable": {"thread_id": thread_id}})
+        if not snapshot.values or not snapshot.next:
+            return None
+        return thread_id, snapshot.values
     
     @log_async_calls("agent")
-    async def stream_consultation(self, query: str, case_type: str = "general") -> AsyncGenerator[Dict[str, Any], None]:
-        """流式法律咨询"""
+    async def stream_consultation(
+        self,
+        query: str,
+        case_type: str = "general",
+        session_id: Optional[str] = None,
+        follow_up: Optional[bool] = None,
+        resume: bool = False
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """流式法律咨询
+
+        follow_up为None时自动判断是否为追问；追问只重新执行输入发生变化的步骤。
+        resume为True时从会话中最近一次未完成咨询的最后一个已完成节点继续执行。
+        """
+        session_id = session_id or str(uuid.uuid4())
+        thread_id: Optional[str] = None
         try:
-            # 初始化状态
-            initial_state = {
-                "messages": [HumanMessage(content=query)],
-                "plan": [],
-                "current_step": 0,
-                "execution_results": {},
-                "final_answer": "",
-                "case_type": case_type,
-                "session_id": self.session_id,
-                "metadata": {
-                    "start_time": datetime.now().isoformat(),
-                    "location": "未指定"
+            if self.memory is not None:
+                # 同一会话的上一次咨询可能由其他worker处理
+                await self.memory.load(session_id)
+            
+            if resume:
+                resumable = await self._load_resumable(session_id)
+                if resumable is None:
+                    yield {
+                        "type": "error",
+                        "content": "没有可以恢复的咨询",
+                        "data": {"session_id": session_id},
+                        "timestamp": datetime.now().isoformat()
+                    }
+                    return
+                
+                thread_id, saved_state = resumable
+                graph_input = None
+                query = next(
+                    message.content for message in reversed(saved_state["messages"])
+                    if isinstance(message, HumanMessage)
+                )
+                case_type = saved_state["case_type"]
+                progress = saved_state
+                is_follow_up = saved_state["metadata"].get("follow_up", False)
+                case_context = saved_state["metadata"].get("case_context") or query
+                
+                yield {
+                    "type": "start",
+                    "content": "继续之前未完成的咨询...",
+                    "data": {
+                        "session_id": session_id,
+                        "thread_id": thread_id,
+                        "resumed": True,
+                        "completed_steps": list(saved_state["execution_results"].keys())
+                    },
+                    "timestamp": datetime.now().isoformat()
+                }
+            else:
+                is_follow_up = self._is_follow_up(query, case_type, session_id, follow_up)
+                case_context = self.memory.get(session_id).case_context if is_follow_up else query
+                thread_id = str(uuid.uuid4())
+                
+                # 初始化状态
+                graph_input = {
+                    "messages": self._build_history_messages(session_id) + [HumanMessage(content=query)],
+                    "plan": [],
+                    "current_step": 0,
+                    "execution_results": {},
+                    "final_answer": "",
+                    "case_type": case_type,
+                    "session_id": session_id,
+                    "metadata": {
+                        "start_time": datetime.now().isoformat(),
+                        "thread_id": thread_id,
+                        "location": "未指定",
+                        "follow_up": is_follow_up,
+                        "case_context": case_context if is_follow_up else ""
+                    }
+                }
+                progress = graph_input
+                if self.checkpointer is not None:
+                    self.checkpointer.register_thread(thread_id, session_id)
+                if settings.enable_speculative_tools and not is_follow_up:
+                    # 追问走增量规划，复用已有结果，不需要投机执行
+                    self._start_speculation(thread_id, query, graph_input)
+                
+                # 发送开始事件
+                yield {
+                    "type": "start",
+                    "content": "开始分析您的法律问题...",
+                    "data": {"session_id": session_id, "thread_id": thread_id, "degraded": llm_degraded.get()},
+                    "timestamp": datetime.now().isoformat()
                 }
-            }
             
-            # 发送开始事件
-            yield {
-                "type": "start",
-                "content": "开始分析您的法律问题...",
-                "timestamp": datetime.now().isoformat()
-            }
+            graph_config = {"configurable": {"thread_id": thread_id}}
+            
+            # 各节点只返回变化的字段，这里按相同规则在本地累积计划、执行结果和元数据
+            plan = list(progress["plan"])
+            execution_results = dict(progress["execution_results"])
+            metadata = dict(progress["metadata"])
             
             # 执行工作流
-            async for event in self.graph.astream(initial_state):
+            async for event in self.graph.astream(graph_input, graph_config, stream_mode="updates"):
                 for node_name, node_output in event.items():
+                    if not node_output:
+                        continue
+                    plan = node_output.get("plan", plan)
+                    execution_results.update(node_output.get("execution_results", {}))
+                    metadata.update(node_output.get("metadata", {}))
+                    
                     if node_name == "planner":
                         plan_str = ', '.join(node_output['plan'])
                         yield {
@@ -347,32 +741,73 @@ class LegalPlanExecuteAgent:
                             "timestamp": datetime.now().isoformat()
                         }
                     
+                    elif node_name == "replanner":
+                        reused_steps = metadata.get("reused_steps", [])
+                        yield {
+                            "type": "planning",
+                            "content": (
+                                f"追问模式：复用{len(reused_steps)}个已完成步骤，重新执行："
+                                + (', '.join(node_output['plan']) or "无")
+                            ),
+                            "data": {
+                                "plan": node_output["plan"],
+                                "reused_steps": reused_steps,
+                                "follow_up": True
+                            },
+                            "timestamp": datetime.now().isoformat()
+                        }
+                    
                     elif node_name == "executor":
                         current_step = node_output["current_step"] - 1
-                        if current_step >= 0 and current_step < len(node_output["plan"]):
-                            step_name = node_output["plan"][current_step]
+                        if current_step >= 0 and current_step < len(plan):
+                            step_name = plan[current_step]
                             yield {
                                 "type": "execution",
                                 "content": "正在执行：" + step_name,
                                 "data": {
                                     "step": step_name,
                                     "step_number": current_step + 1,
-                                    "total_steps": len(node_output["plan"])
+                                    "total_steps": len(plan),
+                                    "reused": step_name in metadata.get("reused_steps", [])
                                 },
                                 "timestamp": datetime.now().isoformat()
                             }
                     
                     elif node_name == "finalizer":
+                        if self.memory is not None:
+                            await self.memory.record_consultation(
+                                session_id,
+                                query,
+                                node_output["final_answer"],
+                                case_type=case_type,
+                                plan=metadata.get("full_plan", plan),
+                                execution_results=execution_results,
+                                step_signatures=metadata.get("step_signatures", {}),
+                                case_context=case_context
+                            )
+                        # 完整执行结果按需通过 result_id 获取，事件中只包含各步骤状态
+                        await self._store_execution_results(thread_id, execution_results)
                         yield {
                             "type": "final_answer",
                             "content": node_output["final_answer"],
                             "data": {
-                                "execution_results": node_output["execution_results"],
-                                "session_id": node_output["session_id"]
+                                "result_id": thread_id,
+                                "steps": [
+                                    {
+                                        "step": step,
+                                        "status": "failed" if isinstance(result, dict) and "error" in result else "success",
+                                        "reused": step in metadata.get("reused_steps", [])
+                                    }
+                                    for step, result in execution_results.items()
+                                ],
+                                "session_id": session_id
                             },
                             "timestamp": datetime.now().isoformat()
                         }
             
+            if self.checkpointer is not None:
+                self.checkpointer.mark_thread(thread_id, "completed")
+            
             # 发送完成事件
             yield {
                 "type": "complete",
@@ -383,16 +818,100 @@ class LegalPlanExecuteAgent:
         except Exception as e:
             error_msg = str(e)
             logger.error("Error in stream_consultation: %s", error_msg)
+            if self.checkpointer is not None and thread_id is not None:
+                # 出错的咨询不再作为可恢复的咨询提供给 resume
+                self.checkpointer.mark_thread(thread_id, "failed")
             yield {
                 "type": "error",
                 "content": "处理过程中出现错误：" + error_msg,
                 "timestamp": datetime.now().isoformat()
             }
+        finally:
+            if thread_id is not None:
+                self._discard_speculations(thread_id)
+    
+    async def _store_execution_results(self, result_id: str, execution_results: Dict[str, Any]):
+        """缓存一次咨询的完整执行结果，供结果接口按需读取"""
+        await get_shared_state().set(
+            f"execution_results:{result_id}", execution_results, ttl=settings.execution_results_ttl
+        )
+    
+    async def get_execution_results(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """读取咨询的完整执行结果，过期或不存在时返回None"""
+        return await get_shared_state().get(f"execution_results:{result_id}")
     
     async def analyze_case(self, case_description: str) -> Dict[str, Any]:
         """分析法律案情"""
         return await self.tools["legal_analysis"].analyze(case_description)
     
+    async def analyze_cases(
+        self,
+        case_descriptions: List[str],
+        concurrency: Optional[int] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """批量分析案情，按完成顺序逐条返回结果，最后返回批次统计
+        
+        内容相同的案情只分析一次，结果中的indices为其在输入中的所有位置。
+        实际的LLM并发同时受进程级LLM并发上限约束。
+        """
+        started = time.perf_counter()
+        positions: Dict[str, List[int]] = {}
+        for index, description in enumerate(case_descriptions):
+            positions.setdefault(description.strip(), []).append(index)
+        positions.pop("", None)
+        
+        pending: asyncio.Queue = asyncio.Queue()
+        for description, indices in positions.items():
+            pending.put_nowait((description, indices))
+        finished: asyncio.Queue = asyncio.Queue()
+        
+        async def worker():
+            while True:
+                try:
+                    description, indices = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                item_started = time.perf_counter()
+                try:
+                    result = await self.analyze_case(description)
+                    failed = isinstance(result, dict) and "error" in result
+                    item = {"indices": indices, "status": "failed" if failed else "success", "data": result}
+                except Exception as e:
+                    item = {"indices": indices, "status": "failed", "error": str(e)}
+                item["duration_ms"] = round((time.perf_counter() - item_started) * 1000, 1)
+                await finished.put(item)
+        
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(min(concurrency or settings.batch_analysis_concurrency, len(positions)))
+        ]
+        succeeded = failed = 0
+        try:
+            for _ in range(len(positions)):
+                item = await finished.get()
+                if item["status"] == "success":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield {"type": "result", **item}
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        elapsed = time.perf_counter() - started
+        yield {
+            "type": "summary",
+            "total": len(case_descriptions),
+            "unique": len(positions),
+            "duplicates": sum(len(indices) - 1 for indices in positions.values()),
+            "empty": len(case_descriptions) - sum(len(indices) for indices in positions.values()),
+            "succeeded": succeeded,
+            "failed": failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_per_second": round(len(positions) / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+    
     async def search_cases(self, keywords: str, case_type: str = "") -> Dict[str, Any]:
         """搜索相关案例"""
         return await self.tools["case_search"].search(keywords, case_type)
@@ -405,13 +924,27 @@ class LegalPlanExecuteAgent:
         """生成法律分析报告"""
         return await self.tools["report_generator"].generate(case_data)
     
+    async def clear_session(self, session_id: str) -> bool:
+        """清除会话记忆"""
+        if self.memory is None:
+            return False
+        return await self.memory.delete(session_id)
+    
+    async def close(self):
+        """释放资源，刷新尚未写入的检查点"""
+        if self.checkpointer is not None:
+            await asyncio.to_thread(self.checkpointer.close)
+    
     async def get_status(self) -> Dict[str, Any]:
         """获取Agent状态"""
         return {
-            "session_id": self.session_id,
             "initialized": self.llm is not None,
             "tools_count": len(self.tools),
             "memory_enabled": self.memory is not None,
+            "memory": self.memory.stats() if self.memory is not None else None,
             "graph_built": self.graph is not None,
+            "checkpointing": self.checkpointer.get_stats() if self.checkpointer is not None else None,
+            "shared_state": dict(get_shared_state().stats),
+            "speculation": self.speculation_metrics(),
             "timestamp": datetime.now().isoformat()
         }
\ No newline at end of file
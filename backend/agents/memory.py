@@ -0,0 +1,351 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+from backend.utils.logger import logger
+from backend.utils.shared_state import SharedState
+from backend.utils.tokens import estimate_tokens, estimate_object_tokens
+
+# 摘要函数签名：(已有摘要, 待折叠的对话轮次) -> 新摘要
+Summarizer = Callable[[str, List["ConversationTurn"]], Awaitable[str]]
+
+class ConversationTurn:
+    """单条对话记录"""
+
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content}
+
+class SessionMemory:
+    """单个会话的记忆
+
+    保存最近的对话轮次、被折叠的历史摘要，以及上一次咨询的执行计划和
+    按输入签名索引的工具执行结果，供后续追问复用。
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.turns: List[ConversationTurn] = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.case_type = ""
+        self.case_context = ""
+        self.plan: List[str] = []
+        self.execution_results: Dict[str, Any] = {}
+        self.results_by_signature: Dict[str, Any] = {}
+        self.results_tokens = 0
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.updated_at = 0.0
+        # 已计入管理器总token数的部分，会话内容变化后由管理器同步
+        self.accounted_tokens = 0
+
+    @property
+    def conversation_tokens(self) -> int:
+        """对话部分（摘要+轮次）占用的token数"""
+        return self.summary_tokens + sum(turn.tokens for turn in self.turns)
+
+    @property
+    def total_tokens(self) -> int:
+        """会话占用的总token数（含缓存的执行结果）"""
+        return self.conversation_tokens + self.results_tokens
+
+    @property
+    def has_history(self) -> bool:
+        return bool(self.turns or self.summary)
+
+    def touch(self):
+        self.last_access = time.time()
+
+    def get_cached_result(self, signature: str) -> Optional[Any]:
+        """按输入签名获取缓存的工具执行结果"""
+        return self.results_by_signature.get(signature)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "summary": self.summary,
+            "turns": [turn.to_dict() for turn in self.turns],
+            "case_type": self.case_type,
+            "case_context": self.case_context,
+            "plan": self.plan,
+            "total_tokens": self.total_tokens,
+            "last_access": self.last_access,
+        }
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """序列化为可写入共享存储的快照"""
+        return {
+            "turns": [turn.to_dict() for turn in self.turns],
+            "summary": self.summary,
+            "case_type": self.case_type,
+            "case_context": self.case_context,
+            "plan": self.plan,
+            "execution_results": self.execution_results,
+            "results_by_signature": self.results_by_signature,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_snapshot(cls, session_id: str, snapshot: Dict[str, Any]) -> "SessionMemory":
+        """从共享存储中的快照恢复会话"""
+        session = cls(session_id)
+        session.turns = [ConversationTurn(turn["role"], turn["content"]) for turn in snapshot["turns"]]
+        session.summary = snapshot["summary"]
+        session.summary_tokens = estimate_tokens(session.summary)
+        session.case_type = snapshot["case_type"]
+        session.case_context = snapshot["case_context"]
+        session.plan = list(snapshot["plan"])
+        session.execution_results = dict(snapshot["execution_results"])
+        session.results_by_signature = dict(snapshot["results_by_signature"])
+        session.results_tokens = estimate_object_tokens(session.execution_results)
+        session.updated_at = snapshot["updated_at"]
+        return session
+
+async def extractive_summarizer(summary: str, turns: List[ConversationTurn]) -> str:
+    """默认摘要函数 - 截取每轮对话的开头部分，不调用LLM"""
+    lines = [summary] if summary else []
+    for turn in turns:
+        speaker = "用户" if turn.role == "user" else "助手"
+        content = turn.content.replace("\n", " ").strip()
+        if len(content) > 120:
+            content = content[:120] + "…"
+        lines.append(f"{speaker}：{content}")
+    return "\n".join(lines)
+
+class SessionMemoryManager:
+    """进程级会话记忆管理器
+
+    - 每个会话按token数（而非消息条数）限制窗口大小，超出部分折叠为摘要
+    - 全局限制会话数量和总token数，超出时按LRU淘汰最久未访问的会话
+    - 空闲超过TTL的会话在访问或淘汰时被清理
+    - 配置共享存储时，会话在每次咨询后写入存储，其他worker通过 load 获取最新版本
+    """
+
+    def __init__(
+        self,
+        max_tokens_per_session: int = 4000,
+        max_sessions: int = 1000,
+        max_total_tokens: int = 2_000_000,
+        idle_ttl: int = 3600,
+        keep_recent_turns: int = 4,
+        summarizer: Optional[Summarizer] = None,
+        store: Optional[SharedState] = None
+    ):
+        self.max_tokens_per_session = max_tokens_per_session
+        self.max_sessions = max_sessions
+        self.max_total_tokens = max_total_tokens
+        self.idle_ttl = idle_ttl
+        self.keep_recent_turns = keep_recent_turns
+        self.summarizer = summarizer or extractive_summarizer
+        self.store = store
+        self._sessions: "OrderedDict[str, SessionMemory]" = OrderedDict()
+        self._total_tokens = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def total_tokens(self) -> int:
+        return self._total_tokens
+
+    def _is_expired(self, session: SessionMemory, now: float) -> bool:
+        return self.idle_ttl > 0 and now - session.last_access > self.idle_ttl
+
+    def get(self, session_id: str) -> Optional[SessionMemory]:
+        """获取会话（不存在或已过期时返回None）"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+
+        if self._is_expired(session, time.time()):
+            self._remove(session_id)
+            return None
+
+        session.touch()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def get_or_create(self, session_id: str) -> SessionMemory:
+        """获取会话，不存在时创建"""
+        session = self.get(session_id)
+        if session is None:
+            session = SessionMemory(session_id)
+            self._sessions[session_id] = session
+            self._evict()
+        return session
+
+    @staticmethod
+    def _store_key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    async def load(self, session_id: str) -> Optional[SessionMemory]:
+        """获取会话，共享存储中有更新的版本时（由其他worker写入）先同步到本地"""
+        session = self.get(session_id)
+        if self.store is None:
+            return session
+
+        try:
+            snapshot = await self.store.get(self._store_key(session_id))
+        except Exception as e:
+            logger.warning(f"Failed to load session {session_id} from shared store: {e}")
+            return session
+        if snapshot is None or (session is not None and session.updated_at >= snapshot["updated_at"]):
+            return session
+
+        self._remove(session_id)
+        session = SessionMemory.from_snapshot(session_id, snapshot)
+        self._sessions[session_id] = session
+        self._account(session)
+        self._evict()
+        return session
+
+    def _account(self, session: SessionMemory):
+        """将会话当前的token数同步到总量"""
+        self._total_tokens += session.total_tokens - session.accounted_tokens
+        session.accounted_tokens = session.total_tokens
+
+    def _remove(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_tokens -= session.accounted_tokens
+
+    def _evict(self):
+        """淘汰过期会话，并按LRU顺序淘汰直到满足全局上限"""
+        now = time.time()
+        expired = [sid for sid, session in self._sessions.items()
+                   if self._is_expired(session, now)]
+        for session_id in expired:
+            self._remove(session_id)
+            self.evictions += 1
+
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or
+            self._total_tokens > self.max_total_tokens
+        ):
+            session_id, _ = next(iter(self._sessions.items()))
+            self._remove(session_id)
+            self.evictions += 1
+            logger.debug(f"Evicted session {session_id} from memory")
+
+    async def _compact(self, session: SessionMemory):
+        """将超出token窗口的早期对话折叠为摘要"""
+        if session.conversation_tokens <= self.max_tokens_per_session:
+            return
+
+        fold_count = 0
+        remaining = session.conversation_tokens
+        while (
+            remaining > self.max_tokens_per_session and
+            len(session.turns) - fold_count > self.keep_recent_turns
+        ):
+            remaining -= session.turns[fold_count].tokens
+            fold_count += 1
+
+        if fold_count == 0:
+            return
+
+        folded = session.turns[:fold_count]
+        try:
+            summary = await self.summarizer(session.summary, folded)
+        except Exception as e:
+            logger.warning(f"Session summarization failed, using extractive summary: {e}")
+            summary = await extractive_summarizer(session.summary, folded)
+
+        # 摘要本身也受窗口约束，保留末尾（最新）部分
+        summary_budget = max(self.max_tokens_per_session // 4, 1)
+        while estimate_tokens(summary) > summary_budget and len(summary) > 1:
+            summary = summary[len(summary) // 4:]
+
+        session.turns = session.turns[fold_count:]
+        session.summary = summary
+        session.summary_tokens = estimate_tokens(summary)
+
+    async def record_consultation(
+        self,
+        session_id: str,
+        query: str,
+        answer: str,
+        case_type: str = "",
+        plan: Optional[List[str]] = None,
+        execution_results: Optional[Dict[str, Any]] = None,
+        step_signatures: Optional[Dict[str, str]] = None,
+        case_context: Optional[str] = None
+    ) -> SessionMemory:
+        """记录一次咨询的问答以及可复用的执行结果
+
+        case_context为工具步骤实际使用的案情描述，追问时据此判断哪些步骤的输入未变。
+        """
+        session = self.get_or_create(session_id)
+
+        session.turns.append(ConversationTurn("user", query))
+        if answer:
+            session.turns.append(ConversationTurn("assistant", answer))
+        await self._compact(session)
+        if self._sessions.get(session_id) is not session:
+            # 生成摘要期间会话已被淘汰，或被其他worker写入的新版本替换
+            logger.debug(f"Session {session_id} was evicted or replaced while summarizing, skipping record")
+            return session
+
+        if case_type:
+            session.case_type = case_type
+        if case_context:
+            session.case_context = case_context
+        if plan is not None:
+            session.plan = list(plan)
+        if execution_results is not None:
+            # 只保留成功的结果用于复用
+            session.execution_results = {
+                step: result for step, result in execution_results.items()
+                if not (isinstance(result, dict) and
+                        (result.get("status") == "failed" or "error" in result))
+            }
+            session.results_by_signature = {
+                signature: session.execution_results[step]
+                for step, signature in (step_signatures or {}).items()
+                if signature and step in session.execution_results
+            }
+            session.results_tokens = estimate_object_tokens(session.execution_results)
+
+        session.touch()
+        session.updated_at = time.time()
+        self._account(session)
+        self._evict()
+
+        if self.store is not None:
+            try:
+                await self.store.set(self._store_key(session_id), session.to_snapshot(), ttl=self.idle_ttl or None)
+            except Exception as e:
+                logger.warning(f"Failed to save session {session_id} to shared store: {e}")
+        return session
+
+    def clear(self, session_id: str) -> bool:
+        """删除本地会话"""
+        existed = session_id in self._sessions
+        self._remove(session_id)
+        return existed
+
+    async def delete(self, session_id: str) -> bool:
+        """删除会话，包括共享存储中的副本"""
+        existed = self.clear(session_id)
+        if self.store is not None:
+            existed = existed or await self.store.get(self._store_key(session_id)) is not None
+            await self.store.delete(self._store_key(session_id))
+        return existed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_sessions": len(self._sessions),
+            "total_tokens": self._total_tokens,
+            "max_sessions": self.max_sessions,
+            "max_total_tokens": self.max_total_tokens,
+            "evictions": self.evictions,
+            "shared_store": self.store is not None,
+        }
@@ -0,0 +1,288 @@
+"""离线批量咨询
+
+从JSONL文件读取问题（每行 {"id": ..., "query": ..., "case_type": ...}），在进程内
+直接驱动 LegalPlanExecuteAgent.stream_consultation，结果按完成顺序增量写入
+JSONL 或 Parquet。已写入的问题ID记录在 <output>.progress 中，中断后重新运行
+同一命令会跳过已完成的问题（进度在结果落盘之后记录，崩溃时最多重复最后一条）。
+执行失败（超时、限流等临时错误）的问题不记录进度，重新运行时会再次执行，
+结果文件中保留每次尝试的记录；输入无效的行记录为失败且不会重试。
+
+用法：
+    python -m backend.bulk_runner questions.jsonl results.jsonl --concurrency 8
+    python -m backend.bulk_runner questions.jsonl results.parquet --flush-every 200
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+from backend.config import settings
+from backend.utils.llm import usage_scope
+from backend.utils.logger import logger
+
+def read_questions(path: Path) -> Iterator[Dict[str, Any]]:
+    """读取问题文件，缺少id时使用行号
+
+    无法解析或缺少query的行不会中断整个批次，以 invalid 字段标明原因，记录为失败。
+    """
+    with path.open("r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                question = json.loads(line)
+            except json.JSONDecodeError as e:
+                question = {"invalid": f"Invalid JSON on line {line_number}: {e}"}
+            if not isinstance(question, dict):
+                question = {"invalid": f"Line {line_number} is not a JSON object"}
+            elif "invalid" not in question and not (
+                isinstance(question.get("query"), str) and question["query"].strip()
+            ):
+                question["invalid"] = f"Line {line_number} has no query"
+            question["id"] = str(question.get("id", line_number))
+            yield question
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+class JsonlResultWriter:
+    """逐条追加写入JSONL，每条结果写入后立即落盘"""
+
+    def __init__(self, path: Path):
+        self._file = path.open("a", encoding="utf-8")
+        self._pending: List[str] = []
+
+    def write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._pending.append(record["id"])
+
+    def flush(self, force: bool = False) -> List[str]:
+        """落盘并返回本次持久化的结果ID"""
+        self._file.flush()
+        written, self._pending = self._pending, []
+        return written
+
+    def close(self):
+        self._file.close()
+
+class ParquetResultWriter:
+    """按批写入Parquet分片文件（<output>/part-NNNNN.parquet），需要安装pyarrow"""
+
+    COLUMNS = (
+        "id", "query", "case_type", "status", "answer", "plan", "error",
+        "latency_ms", "llm_calls", "prompt_tokens", "completion_tokens", "finished_at"
+    )
+
+    def __init__(self, path: Path, flush_every: int = 100):
+        import pandas
+        self._pandas = pandas
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self._part = len(list(path.glob("part-*.parquet")))
+        self._buffer: List[Dict[str, Any]] = []
+
+    def write(self, record: Dict[str, Any]):
+        self._buffer.append({column: record.get(column) for column in self.COLUMNS})
+
+    def flush(self, force: bool = False) -> List[str]:
+        if not self._buffer or (not force and len(self._buffer) < self.flush_every):
+            return []
+        frame = self._pandas.DataFrame(self._buffer, columns=list(self.COLUMNS))
+        frame.to_parquet(self.path / f"part-{self._part:05d}.parquet", index=False)
+        self._part += 1
+        written = [row["id"] for row in self._buffer]
+        self._buffer = []
+        return written
+
+    def close(self):
+        pass
+
+class BulkRunner:
+    """并发执行批量咨询并记录进度"""
+
+    def __init__(
+        self,
+        agent: Any,
+        output: Path,
+        concurrency: int = 4,
+        flush_every: int = 100,
+        timeout: Optional[float] = None
+    ):
+        self.agent = agent
+        self.output = output
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.progress_path = output.with_name(output.name + ".progress")
+        if output.suffix == ".parquet":
+            self.writer = ParquetResultWriter(output, flush_every)
+        else:
+            self.writer = JsonlResultWriter(output)
+        self.latencies: List[float] = []
+        self.counters = {"succeeded": 0, "failed": 0, "skipped": 0}
+        # 执行失败、重新运行时需要重试的问题ID
+        self._retry_ids: Set[str] = set()
+        self.tokens = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def completed_ids(self) -> Set[str]:
+        if not self.progress_path.exists():
+            return set()
+        return set(self.progress_path.read_text(encoding="utf-8").split())
+
+    async def consult(self, question: Dict[str, Any]) -> Dict[str, Any]:
+        """执行单个咨询，收集最终回答、执行计划和token用量"""
+        usage: Dict[str, int] = {}
+        usage_scope.set(usage)
+        record = {
+            "id": question["id"],
+            "query": question.get("query"),
+            "case_type": question.get("case_type", "general"),
+            "status": "failed",
+            "answer": None,
+            "plan": None,
+            "error": None,
+        }
+        started = time.perf_counter()
+        if question.get("invalid"):
+            logger.warning(f"Skipping question {question['id']}: {question['invalid']}")
+            record["error"] = question["invalid"]
+            return self._finish(record, started, usage)
+        try:
+            async with asyncio.timeout(self.timeout):
+                async for event in self.agent.stream_consultation(question["query"], record["case_type"]):
+                    if event["type"] == "planning":
+                        record["plan"] = event["data"]["plan"]
+                    elif event["type"] == "final_answer":
+                        record["answer"] = event["content"]
+                        record["status"] = "success"
+                    elif event["type"] == "error":
+                        record["error"] = event["content"]
+        except TimeoutError:
+            record["error"] = "timeout"
+        except Exception as e:
+            record["error"] = str(e)
+        if record["status"] == "success" and record["error"]:
+            record["status"] = "failed"
+        return self._finish(record, started, usage)
+
+    @staticmethod
+    def _finish(record: Dict[str, Any], started: float, usage: Dict[str, int]) -> Dict[str, Any]:
+        record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        record["llm_calls"] = usage.get("calls", 0)
+        record["prompt_tokens"] = usage.get("prompt_tokens", 0)
+        record["completion_tokens"] = usage.get("completion_tokens", 0)
+        record["finished_at"] = time.time()
+        return record
+
+    def _record_progress(self, ids: List[str]):
+        ids = [question_id for question_id in ids if question_id not in self._retry_ids]
+        if ids:
+            with self.progress_path.open("a", encoding="utf-8") as f:
+                f.write("\n".join(ids) + "\n")
+
+    async def run(self, questions: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+        done = self.completed_ids()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.perf_counter()
+
+        async def produce():
+            for question in questions:
+                if question["id"] in done:
+                    self.counters["skipped"] += 1
+                    continue
+                await queue.put(question)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def consume():
+            while True:
+                question = await queue.get()
+                if question is None:
+                    return
+                record = await self.consult(question)
+                self.counters["succeeded" if record["status"] == "success" else "failed"] += 1
+                if not question.get("invalid"):
+                    self.latencies.append(record["latency_ms"])
+                    if record["status"] != "success":
+                        self._retry_ids.add(record["id"])
+                for key in self.tokens:
+                    self.tokens[key] += record[key]
+                self.writer.write(record)
+                self._record_progress(self.writer.flush())
+
+                finished = self.counters["succeeded"] + self.counters["failed"]
+                if finished % 100 == 0:
+                    logger.info(f"Bulk run progress: {finished} consultations finished")
+
+        try:
+            await asyncio.gather(produce(), *[consume() for _ in range(self.concurrency)])
+        finally:
+            self._record_progress(self.writer.flush(force=True))
+            self.writer.close()
+
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        finished = self.counters["succeeded"] + self.counters["failed"]
+        return {
+            **self.counters,
+            "elapsed_seconds": round(elapsed, 2),
+            "throughput_per_second": round(finished / elapsed, 3) if elapsed > 0 else 0.0,
+            **self.tokens,
+            "latency_ms": {
+                "p50": percentile(self.latencies, 50),
+                "p95": percentile(self.latencies, 95),
+                "p99": percentile(self.latencies, 99),
+            },
+        }
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rightify 离线批量咨询")
+    parser.add_argument("input", type=Path, help="问题文件（JSONL）")
+    parser.add_argument("output", type=Path, help="结果文件（.jsonl 或 .parquet 目录）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的咨询数")
+    parser.add_argument("--flush-every", type=int, default=100, help="Parquet每个分片的结果数")
+    parser.add_argument("--timeout", type=float, default=settings.max_execution_time, help="单次咨询超时（秒）")
+    parser.add_argument("--with-memory", action="store_true", help="保留会话记忆和检查点（默认关闭）")
+    return parser.parse_args(argv)
+
+async def run_bulk(args: argparse.Namespace) -> Dict[str, Any]:
+    from backend.agents.legal_agent import LegalPlanExecuteAgent
+
+    if not args.with_memory:
+        # 每个问题都是独立咨询，不需要会话记忆和断点恢复
+        settings.enable_memory = False
+        settings.enable_checkpointing = False
+
+    agent = LegalPlanExecuteAgent()
+    await agent.initialize()
+    try:
+        runner = BulkRunner(
+            agent, args.output,
+            concurrency=args.concurrency,
+            flush_every=args.flush_every,
+            timeout=args.timeout
+        )
+        return await runner.run(read_questions(args.input))
+    finally:
+        await agent.close()
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    report = asyncio.run(run_bulk(args))
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -20,6 +20,46 @@ class Settings(BaseModel):
     api_port: int = 8000
     api_prefix: str = "/api"
     
+    # 任务队列配置
+    job_workers: int = 4  # 同时执行的任务数
+    job_max_queue_size: int = 1000
+    job_ttl: int = 3600  # 任务记录和结果保留时间（秒）
+    job_max_events: int = 500  # 每个任务保留的进度事件数
+    job_poll_interval: float = 0.5  # 订阅任务进度时的轮询间隔（秒）
+    job_retry_after: int = 30  # 队列已满时建议客户端的重试间隔（秒）
+    
+    # SSE配置
+    sse_replay_buffer_size: int = 512  # 每次咨询保留的可回放事件数
+    sse_max_runs: int = 1000
+    sse_run_ttl: int = 600  # 咨询结束后回放缓冲区的保留时间（秒）
+    sse_sweep_interval: float = 60.0  # 定期清理过期回放缓冲区的间隔（秒）
+    sse_retry_ms: int = 3000  # 建议客户端的重连间隔
+    sse_event_format: str = "json"  # 默认事件格式：json 或 compact（短键名、数字事件类型、毫秒时间戳）
+    sse_json_backend: str = "auto"  # auto（已安装orjson时使用orjson）、orjson 或 json
+    enable_sse_compression: bool = True  # 按Accept-Encoding对流式响应进行br/gzip压缩
+    sse_gzip_level: int = 6
+    sse_brotli_quality: int = 5
+    
+    # 准入控制配置
+    enable_admission_control: bool = True
+    admission_expensive_concurrency: int = 16  # 咨询、分析、报告接口的总并发
+    admission_expensive_queue: int = 32
+    admission_cheap_concurrency: int = 64  # 案例检索、律师推荐接口的总并发
+    admission_cheap_queue: int = 128
+    admission_max_wait: float = 10.0  # 在等待队列中的最长时间（秒）
+    admission_retry_after: int = 5  # 拒绝时建议客户端的重试间隔（秒）
+    admission_endpoint_concurrency: Dict[str, int] = {"report": 4}  # 单个接口在所属预算内的并发上限
+    
+    # 限流配置（按API Key或IP统计）
+    enable_rate_limit: bool = os.getenv("ENABLE_RATE_LIMIT", "true").lower() != "false"  # 压测时可关闭
+    rate_limit_requests: int = 120  # 每个窗口内允许的请求数
+    rate_limit_window: int = 60  # 请求速率窗口（秒）
+    rate_limit_exempt_paths: List[str] = ["/api/health"]
+    llm_token_budget: int = 200_000  # 每个窗口内允许消耗的LLM token数
+    llm_token_window: int = 3600  # token额度窗口（秒）
+    degraded_model: Optional[str] = os.getenv("DEGRADED_MODEL")  # 超出token额度时使用的低成本模型
+    degraded_max_tokens: int = 512  # 降级模式下单次回答的最大输出token数
+    
     # CORS配置
     cors_origins: List[str] = ["*"]
     cors_methods: List[str] = ["*"]
@@ -30,11 +70,51 @@ class Settings(BaseModel):
     openai_base_url: Optional[str] = os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com")
     default_model: str = os.getenv("DEFAULT_MODEL", "deepseek-chat")
     
+    llm_max_concurrency: int = 32  # 进程内同时进行的LLM调用数
+    
+    # 批量分析配置
+    batch_analysis_concurrency: int = 8  # 单个批次内同时分析的案情数
+    batch_max_items: int = 5000
+    
     # Agent配置
     max_iterations: int = 10
     max_execution_time: int = 300  # 秒
     enable_memory: bool = True
-    memory_max_tokens: int = 4000
+    memory_max_tokens: int = 4000  # 单个会话的对话窗口（token）
+    memory_max_sessions: int = 1000
+    memory_max_total_tokens: int = 2_000_000  # 进程内所有会话的token上限
+    memory_session_ttl: int = 3600  # 会话空闲过期时间（秒）
+    memory_keep_recent_turns: int = 4  # 折叠摘要时至少保留的最近对话条数
+    memory_llm_summary: bool = False  # 是否使用LLM生成历史摘要
+    enable_incremental_replanning: bool = True  # 追问时只重新执行输入变化的步骤
+    follow_up_max_query_chars: int = 50  # 超过该长度的问题不会被自动识别为追问
+    follow_up_min_overlap: float = 0.2  # 短问题与原始案情的双字词重叠比例阈值
+    enable_speculative_tools: bool = True  # 规划期间提前执行几乎总会用到的本地工具
+    speculative_tools: List[str] = ["case_search", "lawyer_recommendation"]
+    execution_results_ttl: int = 3600  # 咨询完整执行结果的缓存时间（秒），final_answer事件只携带result_id
+    
+    # 启动时在后台初始化Agent（导入langchain/langgraph约需数秒），服务立即开始处理请求，
+    # 需要Agent的接口等待初始化完成；关闭后启动事件等待初始化完成，失败时启动失败
+    agent_background_init: bool = os.getenv("AGENT_BACKGROUND_INIT", "true").lower() != "false"
+    
+    # 预计算回答库配置
+    enable_answer_store: bool = True
+    answer_store_path: str = "data/answers.bin"
+    answer_store_version: str = "1"  # 修改提示词或更换模型后提升版本号，旧回答库将不再使用
+    
+    # 检查点配置
+    enable_checkpointing: bool = True
+    checkpoint_db_path: str = "data/checkpoints.sqlite"
+    checkpoint_keep_per_thread: int = 3  # 每个咨询线程保留的检查点数量
+    checkpoint_ttl: int = 86400  # 检查点保留时间（秒）
+    checkpoint_prune_interval: int = 200  # 每写入N个检查点执行一次清理
+    
+    # 长文本分析配置
+    analysis_long_input_tokens: int = 3000  # 超过该token数的案情按分块map-reduce方式分析
+    analysis_chunk_chars: int = 4000  # 每个分块的最大字符数
+    analysis_chunk_overlap: int = 300  # 相邻分块重叠的字符数
+    analysis_chunk_concurrency: int = 4  # 单次分析中同时进行的分块数
+    analysis_chunk_cache_ttl: int = 86400  # 分块分析结果缓存时间（秒）
     
     # 工具配置
     enable_web_search: bool = True
@@ -48,13 +128,50 @@ class Settings(BaseModel):
     
     # 数据库配置
     database_url: Optional[str] = None
-    redis_url: Optional[str] = None
+    redis_url: Optional[str] = os.getenv("REDIS_URL")
+    
+    # 共享状态配置（配置redis_url后多个worker共享缓存、会话和计数器）
+    shared_state_prefix: str = "rightify"
+    shared_state_max_entries: int = 10000  # 进程内实现的结果缓存最大条目数（按LRU淘汰）
+    shared_state_max_durable_entries: int = 100000  # 进程内实现的计数器、会话和执行结果最大条目数（按TTL过期）
+    tool_cache_ttl: int = 600  # 相同输入的工具结果共享缓存时间（秒）
+    single_flight_timeout: float = 120.0  # 等待其他worker计算结果的最长时间（秒）
+    
+    # 监控配置
+    enable_metrics: bool = True  # 在 /metrics 以Prometheus格式导出指标
+    enable_loop_monitor: bool = True  # 监控事件循环延迟并采样阻塞循环的调用栈
+    loop_monitor_interval: float = 0.1  # 心跳间隔（秒）
+    loop_block_threshold_ms: float = 100.0  # 超过该延迟视为阻塞并记录调用栈
+    loop_block_samples: int = 50  # 保留的阻塞采样数
+    # 严格模式（调试和测试用）：阻塞超过该值时关闭应用会抛出 BlockingCallError
+    loop_block_fail_ms: Optional[float] = float(os.getenv("LOOP_BLOCK_FAIL_MS")) if os.getenv("LOOP_BLOCK_FAIL_MS") else None
+    
+    # 追踪配置
+    enable_tracing: bool = True  # 每个API请求记录一个trace（/api/admin/traces 查询）
+    trace_buffer_size: int = 200  # 内存中保留的最近trace数
+    trace_max_spans: int = 500  # 单个trace最多记录的span数
+    otlp_endpoint: Optional[str] = os.getenv("OTLP_ENDPOINT")  # 如 http://localhost:4318/v1/traces
+    otlp_service_name: str = "rightify"
+    otlp_export_interval: float = 5.0  # 批量发送间隔（秒）
+    admin_token: Optional[str] = os.getenv("ADMIN_TOKEN")  # 管理接口和请求分析需要该 X-Admin-Token，未配置时不可用
+    
+    # 按请求采样分析配置（/api/legal/* 请求带 X-Profile: 1 或 ?profile=1 时启用）
+    enable_profiling: bool = True
+    profile_interval_ms: float = 5.0  # 采样间隔
+    profile_dir: str = "data/profiles"
+    profile_max_files: int = 50  # 磁盘上保留的最近分析结果数
+    profile_max_concurrent: int = 2  # 同时分析的请求数上限，超出时请求正常处理但不分析
     
     # 日志配置
     log_level: str = "INFO"
     log_file: str = "logs/app.log"
     log_max_size: int = 10 * 1024 * 1024  # 10MB
     log_backup_count: int = 5
+    log_format: str = "text"  # text 或 json（每行一个JSON对象）
+    log_async: bool = True  # 处理器在后台线程中运行，事件循环只负责入队
+    log_queue_size: int = 10000
+    log_queue_overflow: str = "drop_oldest"  # 队列满时：drop_oldest、drop_new 或 block
+    log_sample_rates: Dict[str, float] = {}  # 按日志记录器采样DEBUG日志，如 {"rightify.agent": 0.1}
     
     # 安全配置
     secret_key: str = "your-secret-key-change-in-production"
@@ -64,29 +181,26 @@ class Settings(BaseModel):
     max_file_size: int = 10 * 1024 * 1024  # 10MB
     allowed_file_types: List[str] = [".pdf", ".doc", ".docx", ".txt"]
     upload_dir: str = "uploads"
+    document_extract_workers: int = 2  # 文本提取进程数
     
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
         case_sensitive = False
         
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        
-        # 创建必要的目录
-        self._create_directories()
-        
-        # 验证必要的配置
+    def check_required(self):
+        """验证必要的配置（应用启动时调用，导入配置模块本身没有副作用）"""
         if not self.openai_api_key:
             raise ValueError(
                 "请在.env文件中设置OPENAI_API_KEY"
             )
     
-    def _create_directories(self):
+    def create_directories(self):
         """创建必要的目录"""
         directories = [
             Path(self.log_file).parent,
             Path(self.upload_dir),
+            Path(self.checkpoint_db_path).parent,
         ]
         
         for directory in directories:
@@ -105,6 +219,22 @@ class Settings(BaseModel):
         else:
             raise ValueError("No valid API key found for LLM provider")
     
+    @property
+    def admission_budgets(self) -> dict:
+        """获取准入控制预算配置"""
+        return {
+            "expensive": {
+                "concurrency": self.admission_expensive_concurrency,
+                "queue": self.admission_expensive_queue,
+                "max_wait": self.admission_max_wait,
+            },
+            "cheap": {
+                "concurrency": self.admission_cheap_concurrency,
+                "queue": self.admission_cheap_queue,
+                "max_wait": self.admission_max_wait,
+            },
+        }
+    
     @property
     def search_config(self) -> dict:
         """获取搜索引擎配置"""
@@ -120,12 +250,18 @@ class Settings(BaseModel):
 # 全局设置实例
 settings = Settings()
 
-# 导出常用配置
-LLM_CONFIG = settings.llm_config
+# 导出常用配置（LLM_CONFIG 在首次访问时读取，未配置API Key时导入本模块不会失败）
 SEARCH_CONFIG = settings.search_config
 LOG_CONFIG = {
     "level": settings.log_level,
     "file": settings.log_file,
     "max_size": settings.log_max_size,
     "backup_count": settings.log_backup_count,
-}
\ No newline at end of file
+    "format": settings.log_format,
+    "async": settings.log_async,
+}
+
+def __getattr__(name: str):
+    if name == "LLM_CONFIG":
+        return settings.llm_config
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,2 @@
+# Devtools package
+# 开发和压测工具，服务运行时不会加载
@@ -0,0 +1,318 @@
+"""本地模拟的OpenAI兼容LLM服务
+
+用于CI和离线环境下的压测：不调用真实模型，按提示词类型返回与规划、案情分析、
+报告生成等输出结构一致的JSON，延迟、输出速率和错误率均可配置。
+
+    python -m backend.devtools.fake_llm --port 9100 --latency lognormal:800:0.5 --token-rate 60
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=fake uv run uvicorn backend.main:app
+
+延迟分布写法（毫秒）：fixed:200、uniform:100:500、normal:300:50、lognormal:800:0.5
+（lognormal 为中位数和对数标准差）。延迟为首个token之前的等待时间，之后按
+--token-rate 逐块输出；非流式请求等待全部内容生成完成后一次返回。
+
+本模块只依赖FastAPI和uvicorn，不读取 backend.config，可以在没有配置文件的环境中单独运行。
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Dict, Any, AsyncIterator, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+# 每个流式分块包含的字符数（中文约每个字符一个token）
+CHUNK_CHARS = 4
+
+class LatencyModel:
+    """首个token前的延迟分布"""
+
+    def __init__(self, spec: str = "fixed:0", rng: Optional[random.Random] = None):
+        name, *params = spec.split(":")
+        if name not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {name}")
+        self.name = name
+        self.params = [float(param) for param in params] or [0.0]
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        """采样一次延迟（秒）"""
+        params = self.params
+        if self.name == "uniform":
+            value = self.rng.uniform(params[0], params[1] if len(params) > 1 else params[0])
+        elif self.name == "normal":
+            value = self.rng.gauss(params[0], params[1] if len(params) > 1 else 0.0)
+        elif self.name == "lognormal":
+            value = params[0] * math.exp(self.rng.gauss(0.0, params[1] if len(params) > 1 else 0.0))
+        else:
+            value = params[0]
+        return max(value, 0.0) / 1000
+
+class FakeLLMConfig:
+    """模拟服务配置"""
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        token_rate: float = 0.0,
+        error_429: float = 0.0,
+        error_5xx: float = 0.0,
+        answer_chars: int = 600,
+        seed: Optional[int] = None
+    ):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.token_rate = token_rate  # 每秒输出的token数，0表示不限速
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.answer_chars = answer_chars
+
+PLAN = {
+    "plan": ["法律案情分析", "案例检索", "律师推荐", "风险评估", "解决方案建议"],
+    "reasoning": "用户咨询涉及具体纠纷，需要先分析案情，再结合类似案例和专业律师给出建议。",
+}
+
+ANALYSIS = {
+    "case_type": "劳动纠纷",
+    "legal_relations": ["劳动合同关系"],
+    "applicable_laws": ["《中华人民共和国劳动合同法》第四十七条", "《中华人民共和国劳动合同法》第八十七条"],
+    "key_issues": ["解除劳动合同是否合法", "经济补偿金的计算"],
+    "risk_assessment": {"level": "中", "description": "证据不足时主张赔偿金存在一定风险。"},
+    "evidence_requirements": ["劳动合同", "工资流水", "解除通知"],
+    "time_limitations": "劳动争议仲裁时效为一年，自知道或应当知道权利被侵害之日起计算。",
+    "summary": "用人单位单方解除劳动合同，需判断解除理由是否合法并据此主张经济补偿或赔偿金。",
+}
+
+CHUNK_ANALYSIS = {
+    "case_type": "劳动纠纷",
+    "legal_relations": ["劳动合同关系"],
+    "applicable_laws": ["《中华人民共和国劳动合同法》第四十七条"],
+    "key_issues": ["解除劳动合同是否合法"],
+    "evidence_requirements": ["劳动合同"],
+    "risk_level": "中",
+    "time_limitations": "",
+    "summary": "本部分涉及劳动合同的解除经过。",
+}
+
+REPORT = {
+    "report_title": "劳动合同解除纠纷法律分析报告",
+    "executive_summary": "用人单位单方解除劳动合同，当事人可主张经济补偿或赔偿金。",
+    "case_analysis": "根据现有材料，解除理由不充分。",
+    "legal_basis": "《中华人民共和国劳动合同法》第四十七条、第八十七条。",
+    "risk_assessment": "中等风险，关键在于证据是否充分。",
+    "recommendations": "收集劳动合同、工资流水和解除通知，先协商，协商不成申请劳动仲裁。",
+    "precautions": "注意一年的仲裁时效。",
+    "action_plan": "一周内整理证据，两周内提交仲裁申请。",
+    "report_date": "2025-01-01",
+    "disclaimer": "本报告由模拟服务生成，仅用于测试。",
+}
+
+ANSWER_PARAGRAPH = (
+    "根据《中华人民共和国劳动合同法》的相关规定，用人单位解除劳动合同应当具有法定理由并履行法定程序。"
+    "违法解除劳动合同的，劳动者可以要求继续履行，或者要求用人单位按照经济补偿标准的二倍支付赔偿金。"
+    "建议您保留劳动合同、工资流水、解除通知等证据，先与用人单位协商，协商不成可以向劳动争议仲裁委员会申请仲裁。"
+)
+
+def canned_response(prompt: str, answer_chars: int = 600) -> str:
+    """按提示词类型返回与真实输出结构一致的内容"""
+    if "执行计划" in prompt:
+        return json.dumps(PLAN, ensure_ascii=False)
+    if "较长案情材料" in prompt:
+        return json.dumps(CHUNK_ANALYSIS, ensure_ascii=False)
+    if "法律分析师" in prompt:
+        return json.dumps(ANALYSIS, ensure_ascii=False)
+    if "分析报告" in prompt and "report_title" in prompt:
+        return json.dumps(REPORT, ensure_ascii=False)
+    if "压缩为简洁的摘要" in prompt:
+        return "用户咨询公司违法解除劳动合同的补偿问题，已说明可主张二倍经济补偿的赔偿金。"
+    repeats = max(answer_chars // len(ANSWER_PARAGRAPH), 0) + 1
+    return (ANSWER_PARAGRAPH * repeats)[:answer_chars]
+
+def message_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+def error_response(status_code: int, message: str, error_type: str) -> JSONResponse:
+    headers = {"Retry-After": "1"} if status_code == 429 else None
+    return JSONResponse(
+        {"error": {"message": message, "type": error_type, "code": status_code}},
+        status_code=status_code,
+        headers=headers
+    )
+
+def create_app(config: Optional[FakeLLMConfig] = None) -> FastAPI:
+    """创建模拟服务应用"""
+    config = config or FakeLLMConfig()
+    app = FastAPI(title="Rightify fake LLM")
+    stats = {"requests": 0, "streamed": 0, "errors_429": 0, "errors_5xx": 0, "completion_tokens": 0}
+    app.state.config = config
+    app.state.stats = stats
+
+    async def emit_delay(chars: int):
+        if config.token_rate > 0:
+            await asyncio.sleep(chars / config.token_rate)
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        roll = config.rng.random()
+        if roll < config.error_429:
+            stats["errors_429"] += 1
+            return error_response(429, "Rate limit reached (injected)", "rate_limit_exceeded")
+        if roll < config.error_429 + config.error_5xx:
+            stats["errors_5xx"] += 1
+            status_code = config.rng.choice((500, 502, 503))
+            return error_response(status_code, "Upstream error (injected)", "server_error")
+
+        model = body.get("model", "fake-llm")
+        prompt = message_text(body.get("messages", []))
+        content = canned_response(prompt, config.answer_chars)
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+        if max_tokens:
+            content = content[:max_tokens]
+        usage = {
+            "prompt_tokens": len(prompt),
+            "completion_tokens": len(content),
+            "total_tokens": len(prompt) + len(content),
+        }
+        stats["completion_tokens"] += len(content)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        await asyncio.sleep(config.latency.sample())
+
+        if not body.get("stream"):
+            await emit_delay(len(content))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        stats["streamed"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def stream() -> AsyncIterator[str]:
+            yield chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(content), CHUNK_CHARS):
+                piece = content[start:start + CHUNK_CHARS]
+                await emit_delay(len(piece))
+                yield chunk({"content": piece})
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    # OPENAI_BASE_URL 带或不带 /v1 均可
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "fake-llm", "object": "model", "owned_by": "rightify"}]}
+
+    @app.get("/fake/stats")
+    async def fake_stats():
+        """模拟服务的请求和错误统计"""
+        return stats
+
+    return app
+
+class FakeLLMServer:
+    """在后台线程中运行模拟服务（压测和测试用）"""
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="fake-llm", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+    def __enter__(self) -> "FakeLLMServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rightify 本地模拟LLM服务（OpenAI兼容）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:300:0.4", help="首个token前的延迟分布（毫秒）")
+    parser.add_argument("--token-rate", type=float, default=80.0, help="每秒输出的token数，0表示不限速")
+    parser.add_argument("--error-429", type=float, default=0.0, help="返回429的请求比例")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="返回5xx的请求比例")
+    parser.add_argument("--answer-chars", type=int, default=600, help="自由文本回答的长度")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子（延迟和错误注入可复现）")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    args = parse_args(argv)
+    config = FakeLLMConfig(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        error_429=args.error_429,
+        error_5xx=args.error_5xx,
+        answer_chars=args.answer_chars,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
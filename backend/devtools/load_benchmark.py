@@ -0,0 +1,356 @@
+"""端到端压测
+
+启动本地模拟LLM服务和一个独立的API服务进程（uvicorn），按设定并发压测咨询（SSE）、
+案情分析、案例检索和律师推荐接口，报告吞吐量、首个事件时间、延迟分位数和服务进程
+内存随时间的变化，结果保存为JSON，可与其他提交的结果对比：
+
+    python -m backend.devtools.load_benchmark --concurrency 16 --duration 30 \\
+        --output benchmarks/results/load.json --compare benchmarks/results/load-main.json
+
+--target 指定已运行的服务地址时只发送请求，不启动服务进程，也不记录内存。
+默认每个请求使用不同的问题，避免工具缓存和预计算回答掩盖真实开销；
+--repeat-queries 时在少量问题之间循环。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from backend.devtools.fake_llm import FakeLLMConfig, FakeLLMServer
+from backend.devtools.results import compare_results, format_comparison, latency_summary, load_results, save_results
+
+ENDPOINTS = ("consult", "analyze", "search", "lawyers")
+
+QUERIES = (
+    "公司违法解除劳动合同怎么办",
+    "交通事故对方全责，赔偿标准是什么",
+    "房东不退押金应该如何维权",
+    "网购商品质量问题商家拒绝退货",
+    "借钱给朋友没有借条如何起诉",
+    "离婚时婚前房产如何分割",
+    "工伤认定需要哪些材料",
+    "被拖欠工资三个月怎么办",
+)
+
+CASE_TYPES = ("劳动纠纷", "交通事故", "合同纠纷", "婚姻家庭")
+LOCATIONS = ("北京", "上海", "深圳", "成都")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """进程常驻内存（MB），读取 /proc，不可用时使用 ps"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        output = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True, timeout=5).stdout
+        return int(output.strip()) / 1024 if output.strip() else None
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+class ApiServer:
+    """独立进程中的API服务
+
+    服务的标准错误写入临时文件（管道无人读取时写满后会阻塞服务进程），
+    服务异常退出时报告其末尾部分。
+    """
+
+    def __init__(self, port: int, llm_base_url: str, workers: int = 1):
+        self.port = port
+        self.stderr_log = tempfile.TemporaryFile()
+        env = {
+            **os.environ,
+            "OPENAI_BASE_URL": llm_base_url,
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "fake"),
+            # 所有请求来自同一客户端，压测时关闭按客户端限流
+            "ENABLE_RATE_LIMIT": "false",
+        }
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "backend.main:app",
+                "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"
+            ],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=self.stderr_log
+        )
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def wait_ready(self, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"API server exited: {self.stderr_tail()}")
+                try:
+                    response = await client.get(f"{self.url}/api/health")
+                    if response.json().get("agent_status") == "ready":
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise TimeoutError("API server did not become ready")
+
+    def stderr_tail(self, max_bytes: int = 8192) -> str:
+        """服务标准错误输出的末尾部分"""
+        self.stderr_log.seek(0, os.SEEK_END)
+        self.stderr_log.seek(max(self.stderr_log.tell() - max_bytes, 0))
+        return self.stderr_log.read().decode(errors="replace")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.stderr_log.close()
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.first_event: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.events = 0
+
+    def record(self, status: str, latency: float):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == "200":
+            self.latencies.append(latency)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        total = sum(self.statuses.values())
+        result = {
+            "requests": total,
+            "statuses": self.statuses,
+            "error_rate": round(1 - len(self.latencies) / total, 4) if total else 0.0,
+            "throughput_rps": round(len(self.latencies) / elapsed, 3) if elapsed else 0.0,
+            "latency": latency_summary(self.latencies),
+        }
+        if self.first_event:
+            result["first_event"] = latency_summary(self.first_event)
+            result["events"] = self.events
+        return result
+
+class LoadBenchmark:
+    """按并发持续发送请求，直到达到时长或请求数"""
+
+    def __init__(
+        self,
+        base_url: str,
+        endpoints: List[str],
+        concurrency: int,
+        duration: float,
+        max_requests: Optional[int] = None,
+        repeat_queries: bool = False,
+        timeout: float = 300.0
+    ):
+        self.base_url = base_url
+        self.endpoints = endpoints
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.repeat_queries = repeat_queries
+        self.timeout = timeout
+        self.stats = {endpoint: EndpointStats() for endpoint in endpoints}
+        self._issued = 0
+
+    def _query(self, number: int) -> str:
+        query = QUERIES[number % len(QUERIES)]
+        return query if self.repeat_queries else f"{query}（编号{number}）"
+
+    async def _consult(self, client: httpx.AsyncClient, number: int):
+        stats = self.stats["consult"]
+        started = time.perf_counter()
+        first_event = None
+        events = 0
+        payload = {"query": self._query(number), "case_type": CASE_TYPES[number % len(CASE_TYPES)]}
+        async with client.stream("POST", "/api/legal/consult", json=payload) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    events += 1
+                    if first_event is None:
+                        first_event = time.perf_counter() - started
+            status = str(response.status_code)
+        stats.record(status, time.perf_counter() - started)
+        if status == "200" and first_event is not None:
+            stats.first_event.append(first_event)
+            stats.events += events
+
+    async def _post(self, client: httpx.AsyncClient, endpoint: str, path: str, payload: Dict[str, Any]):
+        started = time.perf_counter()
+        response = await client.post(path, json=payload)
+        self.stats[endpoint].record(str(response.status_code), time.perf_counter() - started)
+
+    async def _request(self, client: httpx.AsyncClient, endpoint: str, number: int):
+        try:
+            if endpoint == "consult":
+                await self._consult(client, number)
+            elif endpoint == "analyze":
+                await self._post(client, endpoint, "/api/legal/analyze", {"case_description": self._query(number)})
+            elif endpoint == "search":
+                await self._post(client, endpoint, "/api/legal/search-cases", {
+                    "keywords": self._query(number), "case_type": CASE_TYPES[number % len(CASE_TYPES)]
+                })
+            else:
+                await self._post(client, endpoint, "/api/legal/recommend-lawyers", {
+                    "case_type": CASE_TYPES[number % len(CASE_TYPES)],
+                    "location": LOCATIONS[number % len(LOCATIONS)] if self.repeat_queries else f"{LOCATIONS[number % len(LOCATIONS)]}{number}"
+                })
+        except httpx.HTTPError as e:
+            self.stats[endpoint].record(type(e).__name__, 0.0)
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float):
+        while time.monotonic() < deadline:
+            if self.max_requests is not None and self._issued >= self.max_requests:
+                return
+            number = self._issued
+            self._issued += 1
+            await self._request(client, self.endpoints[number % len(self.endpoints)], number)
+
+    async def run(self) -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            started = time.monotonic()
+            deadline = started + self.duration
+            await asyncio.gather(*(self._worker(client, deadline) for _ in range(self.concurrency)))
+            elapsed = time.monotonic() - started
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "endpoints": {endpoint: stats.summary(elapsed) for endpoint, stats in self.stats.items()},
+        }
+
+async def sample_memory(pid: int, interval: float, timeline: List[List[float]], stop: asyncio.Event):
+    started = time.monotonic()
+    while not stop.is_set():
+        rss = read_rss_mb(pid)
+        if rss is not None:
+            timeline.append([round(time.monotonic() - started, 2), round(rss, 2)])
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+def memory_summary(timeline: List[List[float]]) -> Dict[str, Any]:
+    if not timeline:
+        return {}
+    values = [rss for _, rss in timeline]
+    return {
+        "start_mb": values[0],
+        "end_mb": values[-1],
+        "peak_mb": max(values),
+        "growth_mb": round(values[-1] - values[0], 2),
+        "timeline": timeline,
+    }
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    fake_server = api_server = None
+    try:
+        base_url = args.target
+        if base_url is None:
+            llm_base_url = args.llm_base_url
+            if llm_base_url is None:
+                fake_server = FakeLLMServer(
+                    FakeLLMConfig(
+                        latency=args.llm_latency,
+                        token_rate=args.llm_token_rate,
+                        error_429=args.llm_error_429,
+                        error_5xx=args.llm_error_5xx,
+                        seed=args.seed
+                    )
+                )
+                fake_server.start()
+                llm_base_url = fake_server.base_url
+            api_server = ApiServer(free_port(), llm_base_url, workers=args.workers)
+            await api_server.wait_ready()
+            base_url = api_server.url
+
+        if args.warmup:
+            await LoadBenchmark(base_url, args.endpoints, args.concurrency, duration=3600, max_requests=args.warmup).run()
+
+        timeline: List[List[float]] = []
+        stop = asyncio.Event()
+        sampler = None
+        if api_server is not None:
+            sampler = asyncio.create_task(sample_memory(api_server.process.pid, args.memory_interval, timeline, stop))
+
+        benchmark = LoadBenchmark(
+            base_url, args.endpoints, args.concurrency, args.duration,
+            max_requests=args.requests, repeat_queries=args.repeat_queries
+        )
+        results = await benchmark.run()
+        if sampler is not None:
+            stop.set()
+            await sampler
+            results["server_memory"] = memory_summary(timeline)
+        return results
+    finally:
+        if api_server is not None:
+            api_server.stop()
+        if fake_server is not None:
+            fake_server.stop()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rightify 端到端压测")
+    parser.add_argument("--endpoints", type=lambda value: value.split(","), default=list(ENDPOINTS),
+                        help=f"逗号分隔，可选 {','.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发连接数")
+    parser.add_argument("--duration", type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument("--requests", type=int, default=None, help="最多发送的请求数（先到者为准）")
+    parser.add_argument("--warmup", type=int, default=0, help="正式压测前的预热请求数")
+    parser.add_argument("--repeat-queries", action="store_true", help="在少量问题之间循环（缓存可以命中）")
+    parser.add_argument("--workers", type=int, default=1, help="API服务进程的uvicorn worker数")
+    parser.add_argument("--target", default=None, help="已运行的服务地址，如 http://127.0.0.1:8000")
+    parser.add_argument("--llm-base-url", default=None, help="使用已运行的LLM服务，不启动模拟服务")
+    parser.add_argument("--llm-latency", default="lognormal:300:0.4", help="模拟LLM首个token前的延迟分布（毫秒）")
+    parser.add_argument("--llm-token-rate", type=float, default=200.0, help="模拟LLM每秒输出的token数")
+    parser.add_argument("--llm-error-429", type=float, default=0.0)
+    parser.add_argument("--llm-error-5xx", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--memory-interval", type=float, default=1.0, help="服务进程内存采样间隔（秒）")
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/results/load.json"))
+    parser.add_argument("--compare", type=Path, default=None, help="与之前保存的结果对比")
+    args = parser.parse_args(argv)
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    return args
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    results = asyncio.run(run_benchmark(args))
+    config = {
+        key: value for key, value in vars(args).items()
+        if key not in ("output", "compare") and not isinstance(value, Path)
+    }
+    payload = save_results(args.output, "load", config, results)
+
+    printable = json.loads(json.dumps(results))
+    printable.get("server_memory", {}).pop("timeline", None)
+    json.dump(printable, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write(f"\nResults written to {args.output}\n")
+    if args.compare:
+        baseline = load_results(args.compare)
+        sys.stdout.write(format_comparison(compare_results(baseline, payload), baseline, payload) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""组件微基准测试
+
+单独测量请求路径上的CPU热点，不经过HTTP和LLM：
+
+- tools.case_search / tools.lawyer_rank：案例关键词匹配和律师评分排序，在1k到1M条
+  合成数据上测量（工具目前用内置样例数据，数据量增长后这两处是线性扫描）
+- agent.extract_json：解析规划器的JSON回复（纯JSON、代码块、前后有说明文字）
+- agent.format_results：总结和报告提示词中执行结果的JSON序列化
+- sse.encode：SSE事件编码（json/compact格式，json/orjson实现）
+- logger.log_async_calls：装饰器相对裸协程的额外开销（请求外和请求追踪内）
+
+每项自动确定循环次数（单轮至少 --min-time 秒），重复 --repeat 轮，报告每次操作
+耗时的中位数和最小值（微秒）。结果与 backend.devtools.load_benchmark 使用相同的
+格式，可与仓库中跟踪的基线对比，有回退时退出码为1：
+
+    OPENAI_API_KEY=fake python -m backend.devtools.micro_benchmark --compare benchmarks/baselines/micro.json
+    OPENAI_API_KEY=fake python -m backend.devtools.micro_benchmark --full --only tools.
+    OPENAI_API_KEY=fake python -m backend.devtools.micro_benchmark --update-baseline
+
+默认数据规模为1k/10k/100k，--full 增加1M（约需1GB内存）。基线只在同一台机器上
+比较才有意义，更新基线时请在提交说明中注明机器。
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+from backend.devtools.results import compare_results, format_comparison, load_results, save_results
+from backend.tools.legal_tools import LawyerRecommendationTool, LegalCaseSearchTool
+from backend.utils.event_codec import EventEncoder, orjson
+from backend.utils.json_utils import extract_json, format_for_prompt
+from backend.utils.logger import log_async_calls
+from backend.utils.tracing import Span, current_span
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+FULL_SIZES = DEFAULT_SIZES + (1_000_000,)
+
+BASELINE_PATH = Path("benchmarks/baselines/micro.json")
+
+# 合成数据的字符串池，记录之间共享字符串对象，1M条数据的内存主要是字典本身
+CITIES = ("北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "南京", "西安", "重庆")
+DISTRICTS = ("朝阳区", "浦东新区", "天河区", "南山区", "西湖区", "武侯区", "江汉区", "鼓楼区")
+CASE_TOPICS = (
+    ("劳动纠纷", "劳动合同", ["违法解除", "经济补偿", "加班费", "工伤认定"]),
+    ("合同纠纷", "房屋买卖合同", ["信息披露", "合同解除", "违约金", "定金"]),
+    ("侵权纠纷", "交通事故人身损害", ["责任认定", "损害赔偿", "保险理赔", "误工费"]),
+    ("婚姻家庭", "离婚财产分割", ["共同财产", "婚前财产", "抚养权", "彩礼返还"]),
+    ("借贷纠纷", "民间借贷", ["借条", "利息约定", "诉讼时效", "担保责任"]),
+    ("消费纠纷", "网购商品质量", ["七日无理由退货", "虚假宣传", "惩罚性赔偿", "举证责任"]),
+    ("房屋租赁", "房屋租赁合同", ["押金返还", "提前解约", "维修责任", "转租"]),
+)
+RESULTS = ("支持原告请求", "部分支持", "驳回诉讼请求", "调解结案")
+SPECIALTIES = ("劳动法", "合同法", "公司法", "房地产法", "婚姻家庭法", "交通事故", "知识产权", "刑事辩护", "消费者权益")
+SURNAMES = ("张", "李", "王", "刘", "陈", "杨", "赵", "黄", "周", "吴")
+EDUCATIONS = ("中国政法大学法学硕士", "华东政法大学法学博士", "北京大学法学学士", "西南政法大学法学硕士")
+
+def synthetic_cases(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    titles = [f"{city}{topic[1]}纠纷案" for city in CITIES for topic in CASE_TOPICS]
+    summaries = [
+        f"当事人因{topic[1]}发生争议，围绕{point}等问题诉至法院。"
+        for topic in CASE_TOPICS for point in topic[2]
+    ]
+    courts = [f"{city}市{district}人民法院" for city in CITIES for district in DISTRICTS]
+    cases = []
+    for index in range(count):
+        topic = rng.choice(CASE_TOPICS)
+        cases.append({
+            "id": f"case_{index:07d}",
+            "title": rng.choice(titles),
+            "court": rng.choice(courts),
+            "date": "2023-05-15",
+            "case_type": topic[0],
+            "summary": rng.choice(summaries),
+            "key_points": rng.sample(topic[2], 3),
+            "result": rng.choice(RESULTS),
+        })
+    return cases
+
+def synthetic_lawyers(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    specialty_sets = [list(rng.sample(SPECIALTIES, 3)) for _ in range(64)]
+    lawyers = []
+    for index in range(count):
+        city = rng.choice(CITIES)
+        lawyers.append({
+            "id": f"lawyer_{index:07d}",
+            "name": f"{rng.choice(SURNAMES)}律师",
+            "firm": f"{city}某某律师事务所",
+            "specialties": rng.choice(specialty_sets),
+            "experience_years": rng.randint(1, 30),
+            "education": rng.choice(EDUCATIONS),
+            "location": city,
+            "rating": round(rng.uniform(3.5, 5.0), 1),
+            "cases_handled": rng.randint(10, 500),
+            "contact": f"lawyer{index}@law.com",
+            "description": "专注于诉讼和仲裁业务。",
+        })
+    return lawyers
+
+def synthetic_execution_results(steps: int) -> List[Dict[str, Any]]:
+    """与 _execute_step 返回结构相同的执行结果"""
+    results = []
+    for index in range(steps):
+        topic = CASE_TOPICS[index % len(CASE_TOPICS)]
+        results.append({
+            "step": f"步骤{index + 1}：检索{topic[1]}相关案例",
+            "tool": "case_search",
+            "result": {
+                "success": True,
+                "data": {
+                    "cases": synthetic_cases(3, seed=index),
+                    "total": 3,
+                    "search_keywords": topic[1],
+                    "analysis": f"根据{topic[1]}相关判例，" + "法院通常会综合考虑证据和过错程度。" * 8,
+                },
+            },
+        })
+    return results
+
+PLAN_JSON = (
+    '{"plan": ['
+    '{"step": "分析案情", "tool": "legal_analysis", "args": {"case_description": "公司违法解除劳动合同"}}, '
+    '{"step": "检索案例", "tool": "case_search", "args": {"keywords": "违法解除", "case_type": "劳动纠纷"}}, '
+    '{"step": "推荐律师", "tool": "lawyer_recommendation", "args": {"case_type": "劳动法", "location": "北京"}}'
+    '], "reasoning": "先分析案情，再检索类似案例，最后推荐专业律师。"}'
+)
+
+EXECUTION_EVENT = {
+    "type": "execution",
+    "content": "正在执行：检索案例",
+    "data": {"step": "检索案例", "tool": "case_search", "result": synthetic_execution_results(1)[0]["result"]},
+    "timestamp": "2025-01-01T12:00:00",
+}
+
+def run_coroutine(coro: Any) -> Any:
+    """不经过事件循环驱动不挂起的协程，只测量调用本身的开销"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("Benchmarked coroutine must not suspend")
+
+async def _plain_call(value: int) -> int:
+    return value + 1
+
+_decorated_call = log_async_calls("benchmark")(_plain_call)
+
+class _InTrace:
+    """在一个请求的追踪内执行，与真实请求中的装饰器开销一致"""
+
+    def __init__(self, func: Callable[[], Any]):
+        self.func = func
+
+    def __call__(self) -> Any:
+        token = current_span.set(Span("benchmark", trace_id="0" * 32))
+        try:
+            return self.func()
+        finally:
+            current_span.reset(token)
+
+Case = Tuple[str, Optional[int], Callable[[], Any]]
+
+def tool_cases(sizes: Tuple[int, ...]) -> Iterator[Case]:
+    search_tool = LegalCaseSearchTool()
+    lawyer_tool = LawyerRecommendationTool()
+    for size in sizes:
+        search_tool.mock_cases = synthetic_cases(size)
+        yield "tools.case_search", size, lambda: search_tool._match_cases("公司违法解除劳动合同怎么办")
+        yield "tools.case_search_filtered", size, lambda: search_tool._match_cases("违法解除", "劳动纠纷")
+        search_tool.mock_cases = []
+        lawyer_tool.mock_lawyers = synthetic_lawyers(size)
+        yield "tools.lawyer_rank", size, lambda: lawyer_tool._rank_lawyers("劳动法", "北京")
+        lawyer_tool.mock_lawyers = []
+
+def agent_cases(sizes: Tuple[int, ...]) -> Iterator[Case]:
+    fenced = f"```json\n{PLAN_JSON}\n```"
+    prose = f"好的，以下是执行计划：\n{PLAN_JSON}\n请确认。"
+    yield "agent.extract_json.plain", None, lambda: extract_json(PLAN_JSON)
+    yield "agent.extract_json.fenced", None, lambda: extract_json(fenced)
+    yield "agent.extract_json.prose", None, lambda: extract_json(prose)
+    for steps in (3, 10, 30):
+        execution_results = synthetic_execution_results(steps)
+        yield "agent.format_results", steps, lambda: format_for_prompt(execution_results)
+
+def sse_cases(sizes: Tuple[int, ...]) -> Iterator[Case]:
+    for event_format in ("json", "compact"):
+        for backend in ("json", "orjson"):
+            if backend == "orjson" and orjson is None:
+                continue
+            encoder = EventEncoder(event_format, backend)
+            yield f"sse.encode.{event_format}.{backend}", None, lambda: encoder.encode(EXECUTION_EVENT)
+
+def logger_cases(sizes: Tuple[int, ...]) -> Iterator[Case]:
+    yield "logger.log_async_calls.plain", None, lambda: run_coroutine(_plain_call(1))
+    yield "logger.log_async_calls.decorated", None, lambda: run_coroutine(_decorated_call(1))
+    yield "logger.log_async_calls.decorated_in_trace", None, _InTrace(lambda: run_coroutine(_decorated_call(1)))
+
+# 用例按顺序生成并立即测量，下一规模的合成数据在上一规模测量完后才生成
+GROUPS: Tuple[Callable[[Tuple[int, ...]], Iterator[Case]], ...] = (tool_cases, agent_cases, sse_cases, logger_cases)
+
+def measure(func: Callable[[], Any], min_time: float = 0.2, repeat: int = 5) -> Dict[str, Any]:
+    """自动确定循环次数后重复测量，返回每次操作耗时（微秒）"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.1))
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - started) / loops)
+    return {
+        "per_op_us": round(statistics.median(timings) * 1e6, 3),
+        "min_us": round(min(timings) * 1e6, 3),
+        "loops": loops,
+    }
+
+def run_suite(
+    sizes: Tuple[int, ...] = DEFAULT_SIZES,
+    only: Optional[List[str]] = None,
+    min_time: float = 0.2,
+    repeat: int = 5,
+    progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    results = {}
+    for group in GROUPS:
+        for name, size, func in group(sizes):
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            key = f"{name}[{size}]" if size is not None else name
+            result = measure(func, min_time=min_time, repeat=repeat)
+            if size is not None:
+                result["size"] = size
+            results[key] = result
+            if progress is not None:
+                progress(key, result)
+    return results
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rightify 组件微基准测试")
+    parser.add_argument("--sizes", type=lambda value: tuple(int(size) for size in value.split(",")),
+                        default=None, help="逗号分隔的合成数据规模，默认 1000,10000,100000")
+    parser.add_argument("--full", action="store_true", help="数据规模增加到1M")
+    parser.add_argument("--only", type=lambda value: value.split(","), default=None,
+                        help="逗号分隔的名称前缀，如 tools.,sse.")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮最短测量时间（秒）")
+    parser.add_argument("--repeat", type=int, default=5, help="重复轮数")
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/results/micro.json"))
+    parser.add_argument("--compare", type=Path, default=None, help="与之前保存的结果或基线对比")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="视为变化的相对幅度（微秒级测量受机器负载影响较大，默认比压测宽松）")
+    parser.add_argument("--update-baseline", action="store_true", help=f"同时写入 {BASELINE_PATH}")
+    args = parser.parse_args(argv)
+    if args.sizes is None:
+        args.sizes = FULL_SIZES if args.full else DEFAULT_SIZES
+    return args
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    width = 48
+
+    def progress(key: str, result: Dict[str, Any]):
+        sys.stdout.write(f"{key:<{width}} {result['per_op_us']:>14.3f} us/op  (min {result['min_us']:.3f})\n")
+        sys.stdout.flush()
+
+    results = run_suite(args.sizes, args.only, args.min_time, args.repeat, progress)
+    config = {"sizes": list(args.sizes), "only": args.only, "min_time": args.min_time, "repeat": args.repeat}
+    payload = save_results(args.output, "micro", config, results)
+    sys.stdout.write(f"Results written to {args.output}\n")
+    if args.update_baseline:
+        save_results(BASELINE_PATH, "micro", config, results)
+        sys.stdout.write(f"Baseline updated: {BASELINE_PATH}\n")
+    if args.compare:
+        baseline = load_results(args.compare)
+        rows = compare_results(baseline, payload, args.threshold)
+        sys.stdout.write(format_comparison(rows, baseline, payload) + "\n")
+        sys.exit(1 if any(row["verdict"] == "regressed" for row in rows) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""基准测试结果的保存和比较
+
+结果保存为JSON，包含git提交和运行环境，便于在不同提交之间对比：
+
+    python -m backend.devtools.results compare old.json new.json
+
+比较时按指标名判断方向：延迟、耗时、内存类指标越小越好，吞吐量越大越好，
+变化超过阈值（默认10%）的指标标记为回退或改进。
+"""
+
+import argparse
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# 越大越好的指标名关键字，其余数值指标视为越小越好
+HIGHER_IS_BETTER = ("throughput", "rps", "ops_per_sec")
+
+# 不参与比较的字段
+IGNORED_KEYS = ("count", "requests", "samples", "statuses", "events", "elapsed_s", "size", "timeline", "loops")
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位数（与 backend.bulk_runner 相同的算法，本模块不加载服务配置）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    """毫秒延迟统计"""
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "max_ms": round(max(values) * 1000, 3) if values else 0.0,
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+        return f"{output}-dirty" if dirty else output
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+def save_results(path: Path, kind: str, config: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {
+        "kind": kind,
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "config": config,
+        "results": results,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return payload
+
+def load_results(path: Path) -> Dict[str, Any]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def _numeric_leaves(value: Any, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if key in IGNORED_KEYS:
+                continue
+            yield from _numeric_leaves(child, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+def compare_results(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.10
+) -> List[Dict[str, Any]]:
+    """逐项比较两次结果的数值指标"""
+    baseline_values = dict(_numeric_leaves(baseline["results"]))
+    rows = []
+    for name, value in _numeric_leaves(current["results"]):
+        previous = baseline_values.get(name)
+        if previous is None:
+            continue
+        if previous:
+            change = (value - previous) / previous
+        else:
+            # 基线为0（如错误率）时任何增长都视为超过阈值
+            change = math.inf if value > 0 else 0.0
+        higher_is_better = any(keyword in name for keyword in HIGHER_IS_BETTER)
+        improvement = change > 0 if higher_is_better else change < 0
+        if abs(change) < threshold:
+            verdict = "same"
+        else:
+            verdict = "improved" if improvement else "regressed"
+        rows.append({"metric": name, "baseline": previous, "current": value, "change": round(change, 4), "verdict": verdict})
+    return rows
+
+def format_comparison(rows: List[Dict[str, Any]], baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    lines = [f"{baseline.get('revision') or 'baseline'} -> {current.get('revision') or 'current'}"]
+    width = max((len(row["metric"]) for row in rows), default=10)
+    for row in rows:
+        marker = {"regressed": "!!", "improved": "++"}.get(row["verdict"], "  ")
+        lines.append(
+            f"{marker} {row['metric']:<{width}}  {row['baseline']:>12.3f}  {row['current']:>12.3f}  {row['change']:>+8.1%}"
+        )
+    regressions = sum(1 for row in rows if row["verdict"] == "regressed")
+    lines.append(f"{len(rows)} metrics, {regressions} regressed")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="比较两次基准测试结果")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compare = subparsers.add_parser("compare", help="比较两次结果，有回退时退出码为1")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("current", type=Path)
+    compare.add_argument("--threshold", type=float, default=0.10, help="视为变化的相对幅度")
+    args = parser.parse_args(argv)
+
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    rows = compare_results(baseline, current, args.threshold)
+    sys.stdout.write(format_comparison(rows, baseline, current) + "\n")
+    sys.exit(1 if any(row["verdict"] == "regressed" for row in rows) else 0)
+
+if __name__ == "__main__":
+    main()
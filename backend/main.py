@@ -1,18 +1,44 @@
+import time
+
+# 启动耗时报告最先导入，记录本模块（及其依赖）的导入耗时
+from backend.utils.startup import startup_report
+_import_started = time.perf_counter()
+
 # Apply Pydantic v2 compatibility patch first
 from backend.pydantic_patch import patch_secret_str
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sse_starlette.sse import EventSourceResponse
+from starlette.background import BackgroundTask
 import asyncio
+import importlib
 import json
-from typing import Dict, Any, AsyncGenerator
+import uuid
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Dict, Any, AsyncGenerator, AsyncIterator, List, Optional
 from datetime import datetime
 
-from backend.agents.legal_agent import LegalPlanExecuteAgent
+from backend.tools.legal_tools import create_tools, initialize_tools
 from backend.config import settings
-from backend.utils.logger import get_logger
+from backend.utils.logger import get_logger, get_logging_stats
+from backend.utils.metrics import MetricFamily, registry as metrics_registry
+from backend.utils.admission import AdmissionController, AdmissionRejected
+from backend.utils.answer_store import AnswerStore
+from backend.utils.compression import StreamCompressionMiddleware, compression_stats
+from backend.utils.documents import DocumentStore, DocumentError, DocumentTooLarge, UnsupportedDocumentType
+from backend.utils.rate_limit import RateLimitMiddleware
+from backend.utils.loop_monitor import create_loop_monitor
+from backend.utils.job_queue import JobManager, QueueFullError, TERMINAL_STATUSES, create_job_backend
+from backend.utils.event_codec import EVENT_FORMATS, EventEncoder
+from backend.utils.shared_state import get_shared_state
+from backend.utils.sse_replay import ConsultationRun, ConsultationRunRegistry
+from backend.utils.tracing import OTLPExporter, TracingMiddleware, tracer
+from backend.utils.profiling import ProfilingMiddleware, profile_store
+
+if TYPE_CHECKING:
+    from backend.agents.legal_agent import LegalPlanExecuteAgent
 
 logger = get_logger(__name__)
 
@@ -22,6 +48,18 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# 流式响应压缩（最内层，只处理SSE和NDJSON响应）
+app.add_middleware(StreamCompressionMiddleware)
+
+# 按客户端限流（位于CORS中间件内层，429响应同样带有CORS头）
+app.add_middleware(RateLimitMiddleware)
+
+# 按请求采样分析（位于追踪中间件内层，分析结果ID与trace ID相同）
+app.add_middleware(ProfilingMiddleware)
+
+# 请求追踪（限流拒绝的请求同样记录trace）
+app.add_middleware(TracingMiddleware)
+
 # CORS配置
 app.add_middleware(
     CORSMiddleware,
@@ -31,20 +69,285 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 全局agent实例
-legal_agent = None
+# 全局agent实例（Agent依赖langchain/langgraph，导入较慢，在启动事件中加载）
+legal_agent: Optional["LegalPlanExecuteAgent"] = None
 
-@app.on_event("startup")
-async def startup_event():
-    """应用启动时初始化agent"""
+# 后台初始化Agent的任务，完成前需要Agent的接口等待
+agent_init_task: Optional[asyncio.Task] = None
+
+# 工具在启动时创建并与Agent共享，案例检索和律师推荐不需要等待Agent初始化
+tools: Dict[str, Any] = {}
+
+# 异步任务管理器
+job_manager = None
+
+# 事件循环延迟监控
+loop_monitor = create_loop_monitor()
+
+# 咨询事件回放注册表
+consultation_runs = ConsultationRunRegistry(
+    max_runs=settings.sse_max_runs,
+    buffer_size=settings.sse_replay_buffer_size,
+    finished_ttl=settings.sse_run_ttl
+)
+
+# 上传文档存储
+document_store = DocumentStore(
+    settings.upload_dir,
+    max_file_size=settings.max_file_size,
+    allowed_types=settings.allowed_file_types,
+    extract_workers=settings.document_extract_workers
+)
+
+async def attach_document(text: str, document_id: str) -> str:
+    """将已上传文档的文本附加到用户输入之后"""
+    document_text = await document_store.get_text(document_id)
+    if document_text is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not text:
+        return document_text
+    return f"{text}\n\n附件文档内容：\n{document_text}"
+
+# 预计算回答库
+answer_store = AnswerStore(settings.answer_store_path)
+
+async def precomputed_events(
+    record: Dict[str, Any], consultation_id: str
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """以与实时咨询相同的事件序列返回预计算回答"""
+    session_id = str(uuid.uuid4())
+    yield {
+        "type": "start",
+        "content": "开始分析您的法律问题...",
+        "data": {"consultation_id": consultation_id, "session_id": session_id, "precomputed": True},
+        "timestamp": datetime.now().isoformat()
+    }
+    if record["plan"]:
+        yield {
+            "type": "planning",
+            "content": "制定执行计划：" + ', '.join(record["plan"]),
+            "data": {"plan": record["plan"]},
+            "timestamp": datetime.now().isoformat()
+        }
+    yield {
+        "type": "final_answer",
+        "content": record["answer"],
+        "data": {
+            "result_id": None,
+            "steps": [],
+            "session_id": session_id,
+            "precomputed": True,
+            "build_version": answer_store.build_version
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+    yield {
+        "type": "complete",
+        "content": "咨询完成",
+        "timestamp": datetime.now().isoformat()
+    }
+
+# 准入控制
+admission = AdmissionController(
+    settings.admission_budgets,
+    endpoint_limits=settings.admission_endpoint_concurrency,
+    enabled=settings.enable_admission_control
+)
+
+async def admit(endpoint: str):
+    """获取接口执行名额，繁忙时返回503"""
+    try:
+        await admission.acquire(endpoint)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(settings.admission_retry_after)}
+        )
+
+@asynccontextmanager
+async def admitted(endpoint: str) -> AsyncIterator[None]:
+    await admit(endpoint)
+    try:
+        yield
+    finally:
+        admission.release(endpoint)
+
+def event_encoder(request: Request) -> EventEncoder:
+    """按 ?format= 或 X-Event-Format 请求头选择事件格式"""
+    event_format = (
+        request.query_params.get("format") or
+        request.headers.get("x-event-format") or
+        settings.sse_event_format
+    )
+    if event_format not in EVENT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EVENT_FORMATS)}")
+    return EventEncoder(event_format)
+
+async def replay_events(
+    run: ConsultationRun, encoder: EventEncoder, last_event_id: int = 0
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """将咨询事件转换为带ID的SSE消息"""
+    first = True
+    try:
+        async for event_id, data in run.subscribe(last_event_id, encoder):
+            message = {"id": str(event_id), "data": data}
+            if first:
+                message["retry"] = settings.sse_retry_ms
+                first = False
+            yield message
+    finally:
+        consultation_runs.record_stream(encoder)
+
+def consultation_response(run: ConsultationRun, encoder: EventEncoder, last_event_id: int = 0) -> EventSourceResponse:
+    return EventSourceResponse(
+        replay_events(run, encoder, last_event_id),
+        headers={"X-Consultation-ID": run.run_id, "X-Event-Format": encoder.format}
+    )
+
+async def run_consultation_job(payload: Dict[str, Any], emit) -> Dict[str, Any]:
+    """任务处理：流式咨询，事件作为任务进度上报"""
+    if not payload.get("query"):
+        raise ValueError("Query is required")
+    
+    agent = await get_agent()
+    result: Dict[str, Any] = {}
+    async for event in agent.stream_consultation(
+        payload["query"],
+        payload.get("case_type", "general"),
+        session_id=payload.get("session_id"),
+        follow_up=payload.get("follow_up")
+    ):
+        await emit(event)
+        if event["type"] == "start":
+            result["session_id"] = event["data"]["session_id"]
+        elif event["type"] == "final_answer":
+            result["final_answer"] = event["content"]
+            result["execution_results"] = await agent.get_execution_results(event["data"]["result_id"])
+        elif event["type"] == "error":
+            raise RuntimeError(event["content"])
+    return result
+
+async def run_report_job(payload: Dict[str, Any], emit) -> Dict[str, Any]:
+    """任务处理：生成法律分析报告"""
+    case_data = payload.get("case_data", {})
+    if not case_data:
+        raise ValueError("Case data is required")
+    agent = await get_agent()
+    return await agent.generate_report(case_data)
+
+async def initialize_agent() -> "LegalPlanExecuteAgent":
+    """导入并初始化Agent
+
+    langchain、langgraph 和 langchain_openai 的导入约占冷启动时间的一半以上，
+    在线程中进行，事件循环可以同时处理不需要Agent的请求（健康检查、指标、预计算回答等）。
+    """
     global legal_agent
     try:
-        legal_agent = LegalPlanExecuteAgent()
-        await legal_agent.initialize()
-        logger.info("Legal agent initialized successfully")
+        with startup_report.phase("agent.import"):
+            module = await asyncio.to_thread(importlib.import_module, "backend.agents.legal_agent")
+        agent = module.LegalPlanExecuteAgent(tools=tools)
+        await agent.initialize()
     except Exception as e:
         logger.error(f"Failed to initialize legal agent: {e}")
         raise
+    legal_agent = agent
+    startup_report.mark("agent_ready")
+    logger.info("Legal agent initialized successfully")
+    if "serving" in startup_report.milestones:
+        startup_report.log_summary()
+    return agent
+
+async def get_agent() -> "LegalPlanExecuteAgent":
+    """获取Agent，后台初始化尚未完成时等待，初始化失败时返回503"""
+    if legal_agent is not None:
+        return legal_agent
+    if agent_init_task is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    try:
+        # 等待的请求被取消时不取消初始化任务
+        return await asyncio.shield(agent_init_task)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Agent initialization failed")
+
+def agent_state() -> str:
+    if legal_agent is not None:
+        return "ready"
+    if agent_init_task is None:
+        return "not_initialized"
+    if agent_init_task.done():
+        return "failed"
+    return "initializing"
+
+@app.on_event("startup")
+async def startup_event():
+    """应用启动时初始化agent（默认在后台进行，不阻塞服务启动）"""
+    global agent_init_task, job_manager
+    if settings.enable_loop_monitor:
+        loop_monitor.start()
+    consultation_runs.start_sweeper(settings.sse_sweep_interval)
+    try:
+        with startup_report.phase("config"):
+            settings.check_required()
+            settings.create_directories()
+        
+        with startup_report.phase("tools"):
+            tools.update(create_tools())
+            await initialize_tools(tools)
+        
+        if settings.agent_background_init:
+            agent_init_task = asyncio.create_task(initialize_agent())
+            # 初始化失败已记录日志，请求通过 get_agent 得到503
+            agent_init_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        else:
+            await initialize_agent()
+        
+        job_manager = JobManager(
+            create_job_backend(
+                settings.redis_url,
+                job_ttl=settings.job_ttl,
+                max_events=settings.job_max_events
+            ),
+            handlers={
+                "consultation": run_consultation_job,
+                "report": run_report_job
+            },
+            workers=settings.job_workers,
+            max_queue_size=settings.job_max_queue_size
+        )
+        job_manager.start()
+        
+        if settings.enable_tracing and settings.otlp_endpoint:
+            tracer.exporter = OTLPExporter(
+                settings.otlp_endpoint,
+                settings.otlp_service_name,
+                interval=settings.otlp_export_interval
+            )
+            tracer.exporter.start()
+    except Exception as e:
+        logger.error(f"Failed to start application: {e}")
+        raise
+    startup_report.mark("serving")
+    if legal_agent is not None:
+        startup_report.log_summary()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放agent资源"""
+    await consultation_runs.shutdown()
+    if job_manager:
+        await job_manager.stop()
+    if agent_init_task is not None and not agent_init_task.done():
+        agent_init_task.cancel()
+        await asyncio.gather(agent_init_task, return_exceptions=True)
+    if legal_agent:
+        await legal_agent.close()
+    document_store.shutdown()
+    answer_store.close()
+    if tracer.exporter:
+        await tracer.exporter.stop()
+    # 严格模式下有阻塞事件循环的处理函数时在这里抛出 BlockingCallError
+    await loop_monitor.stop()
 
 @app.post("/api/legal/consult")
 async def legal_consultation(request: Request):
@@ -53,32 +356,81 @@ async def legal_consultation(request: Request):
         data = await request.json()
         query = data.get("query", "")
         case_type = data.get("case_type", "general")
+        session_id = data.get("session_id")
+        follow_up = data.get("follow_up")
+        resume = bool(data.get("resume", False))
+        document_id = data.get("document_id")
         
-        if not query:
+        if resume and not session_id:
+            raise HTTPException(status_code=400, detail="session_id is required to resume")
+        if document_id:
+            query = await attach_document(query, document_id)
+        if not query and not resume:
             raise HTTPException(status_code=400, detail="Query is required")
         
         logger.info(f"Received consultation request: {query[:100]}...")
         
-        async def generate_response() -> AsyncGenerator[str, None]:
+        encoder = event_encoder(request)
+        consultation_id = str(uuid.uuid4())
+        
+        # 无会话上下文和附件的新咨询优先使用预计算回答，不占用准入名额
+        if settings.enable_answer_store and not (resume or session_id or document_id):
+            record = answer_store.lookup(query, case_type)
+            if record is not None:
+                logger.info(f"Serving precomputed answer for consultation {consultation_id}")
+                run = consultation_runs.start(consultation_id, precomputed_events(record, consultation_id))
+                return consultation_response(run, encoder)
+        
+        agent = await get_agent()
+        
+        # 名额在整个咨询运行期间保持占用，运行结束后释放
+        await admit("consult")
+        
+        async def consultation_events() -> AsyncGenerator[Dict[str, Any], None]:
             try:
-                consultation_stream = legal_agent.stream_consultation(query, case_type)
+                consultation_stream = agent.stream_consultation(
+                    query, case_type, session_id=session_id,
+                    follow_up=follow_up, resume=resume
+                )
                 async for event in consultation_stream:
-                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
-            except Exception as e:
-                logger.error(f"Error in consultation: {e}")
-                error_event = {
-                    "type": "error",
-                    "content": "处理咨询时发生错误，请稍后重试",
-                    "timestamp": datetime.now().isoformat()
-                }
-                yield f"data: {json.dumps(error_event, ensure_ascii=False)}\n\n"
+                    if event.get("type") == "start":
+                        event.setdefault("data", {})["consultation_id"] = consultation_id
+                    yield event
+            finally:
+                admission.release("consult")
         
-        return EventSourceResponse(generate_response())
+        run = consultation_runs.start(consultation_id, consultation_events())
+        return consultation_response(run, encoder)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Consultation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/legal/consult/{consultation_id}/events")
+async def reattach_consultation(consultation_id: str, request: Request, last_event_id: int = 0):
+    """重新连接正在运行或刚结束的咨询，只推送 Last-Event-ID 之后的事件"""
+    run = consultation_runs.get(consultation_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Consultation not found or expired")
+    
+    header_value = request.headers.get("last-event-id", "")
+    if header_value.isdigit():
+        last_event_id = int(header_value)
+    
+    return consultation_response(run, event_encoder(request), last_event_id)
+
+@app.get("/api/legal/results/{result_id}")
+async def get_execution_results(result_id: str, response: Response):
+    """获取咨询的完整执行结果（final_answer事件中的result_id），结果生成后不再变化"""
+    agent = await get_agent()
+    execution_results = await agent.get_execution_results(result_id)
+    if execution_results is None:
+        raise HTTPException(status_code=404, detail="Results not found or expired")
+    response.headers["Cache-Control"] = f"private, max-age={settings.execution_results_ttl}"
+    return {"status": "success", "data": {"result_id": result_id, "execution_results": execution_results}}
+
 @app.post("/api/legal/analyze")
 async def legal_analysis(request: Request):
     """法律案情分析接口"""
@@ -86,16 +438,66 @@ async def legal_analysis(request: Request):
         data = await request.json()
         case_description = data.get("case_description", "")
         
+        if data.get("document_id"):
+            case_description = await attach_document(case_description, data["document_id"])
         if not case_description:
             raise HTTPException(status_code=400, detail="Case description is required")
         
-        result = await legal_agent.analyze_case(case_description)
+        agent = await get_agent()
+        async with admitted("analyze"):
+            result = await agent.analyze_case(case_description)
         return {"status": "success", "data": result}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/legal/analyze/batch")
+async def batch_legal_analysis(request: Request):
+    """批量案情分析接口 - 以NDJSON流式返回，每行一个结果（按完成顺序），最后一行为批次统计"""
+    data = await request.json()
+    case_descriptions = data.get("case_descriptions", [])
+    
+    if not isinstance(case_descriptions, list) or not case_descriptions:
+        raise HTTPException(status_code=400, detail="case_descriptions must be a non-empty list")
+    if len(case_descriptions) > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {settings.batch_max_items} items per batch")
+    if not all(isinstance(item, str) for item in case_descriptions):
+        raise HTTPException(status_code=400, detail="case_descriptions must be strings")
+    
+    concurrency = data.get("concurrency")
+    if concurrency is not None:
+        try:
+            concurrency = max(1, min(int(concurrency), settings.batch_analysis_concurrency))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="concurrency must be an integer")
+    
+    agent = await get_agent()
+    
+    # 整个批次占用一个expensive名额，批次内的并发由 concurrency 控制
+    await admit("batch_analyze")
+    released = False
+    
+    def release_slot():
+        # 客户端在响应体开始前断开时生成器不会执行，由后台任务兜底释放名额
+        nonlocal released
+        if not released:
+            released = True
+            admission.release("batch_analyze")
+    
+    async def batch_lines() -> AsyncGenerator[str, None]:
+        try:
+            async for item in agent.analyze_cases(case_descriptions, concurrency):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            release_slot()
+    
+    return StreamingResponse(
+        batch_lines(), media_type="application/x-ndjson", background=BackgroundTask(release_slot)
+    )
+
 @app.post("/api/legal/search-cases")
 async def search_legal_cases(request: Request):
     """案例检索接口"""
@@ -107,9 +509,12 @@ async def search_legal_cases(request: Request):
         if not keywords:
             raise HTTPException(status_code=400, detail="Keywords are required")
         
-        result = await legal_agent.search_cases(keywords, case_type)
+        async with admitted("search"):
+            result = await tools["case_search"].search(keywords, case_type)
         return {"status": "success", "data": result}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Case search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -122,9 +527,12 @@ async def recommend_lawyers(request: Request):
         case_type = data.get("case_type", "")
         location = data.get("location", "")
         
-        result = await legal_agent.recommend_lawyers(case_type, location)
+        async with admitted("recommend"):
+            result = await tools["lawyer_recommendation"].recommend(case_type, location)
         return {"status": "success", "data": result}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Lawyer recommendation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -139,13 +547,276 @@ async def generate_legal_report(request: Request):
         if not case_data:
             raise HTTPException(status_code=400, detail="Case data is required")
         
-        result = await legal_agent.generate_report(case_data)
+        agent = await get_agent()
+        async with admitted("report"):
+            result = await agent.generate_report(case_data)
         return {"status": "success", "data": result}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Report generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/documents")
+async def upload_document(request: Request, filename: str = ""):
+    """流式上传文档（请求体为文件原始内容），提取文本后返回文档ID
+    
+    文件名通过 filename 查询参数或 X-Filename 请求头传入。
+    """
+    filename = filename or request.headers.get("x-filename", "")
+    if not filename:
+        raise HTTPException(status_code=400, detail="filename is required")
+    
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.max_file_size:
+        raise HTTPException(status_code=413, detail="File too large")
+    
+    try:
+        metadata = await document_store.save_stream(filename, request.stream())
+    except UnsupportedDocumentType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except DocumentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except DocumentError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    return {"status": "success", "data": metadata}
+
+@app.get("/api/documents/{document_id}")
+async def get_document(document_id: str):
+    """查询已上传文档的元数据和文本预览"""
+    metadata = await document_store.get_metadata(document_id)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    text = await document_store.get_text(document_id)
+    return {"status": "success", "data": {**metadata, "preview": text[:500]}}
+
+@app.delete("/api/legal/sessions/{session_id}")
+async def clear_session(session_id: str):
+    """清除会话记忆"""
+    agent = await get_agent()
+    cleared = await agent.clear_session(session_id)
+    if not cleared:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"status": "success", "data": {"session_id": session_id}}
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: Request):
+    """提交异步任务（consultation / report），立即返回任务ID"""
+    data = await request.json()
+    kind = data.get("kind", "consultation")
+    payload = data.get("payload", {})
+    priority = data.get("priority", "normal")
+    
+    try:
+        job = await job_manager.submit(kind, payload, priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(settings.job_retry_after)}
+        )
+    
+    return {"status": "success", "data": {"job_id": job["job_id"], "status": job["status"]}}
+
+@app.get("/api/jobs/metrics")
+async def job_metrics():
+    """任务队列深度和执行统计"""
+    return {"status": "success", "data": await job_manager.metrics()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查询任务状态和结果"""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "success", "data": job}
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request, last_event_id: int = 0):
+    """以SSE方式订阅任务进度，支持 Last-Event-ID 断点续传"""
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    header_value = request.headers.get("last-event-id", "")
+    if header_value.isdigit():
+        last_event_id = int(header_value)
+    
+    async def job_events() -> AsyncGenerator[Dict[str, Any], None]:
+        # 以事件序号作为SSE事件ID，旧事件被裁剪后续传位置不变
+        cursor = last_event_id
+        while True:
+            for event in await job_manager.events(job_id, cursor):
+                cursor = event["seq"]
+                data = {key: value for key, value in event.items() if key != "seq"}
+                yield {"id": str(cursor), "data": json.dumps(data, ensure_ascii=False)}
+            
+            job = await job_manager.get(job_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                remaining = await job_manager.events(job_id, cursor)
+                if not remaining:
+                    status_event = {"type": "job_status", "content": job["status"] if job else "expired"}
+                    yield {"id": str(cursor + 1), "data": json.dumps(status_event, ensure_ascii=False)}
+                    return
+                continue
+            await asyncio.sleep(settings.job_poll_interval)
+    
+    return EventSourceResponse(job_events())
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """取消排队中的任务"""
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not queued")
+    return {"status": "success", "data": {"job_id": job_id, "status": "cancelled"}}
+
+@app.get("/api/admission/metrics")
+async def admission_metrics():
+    """各接口预算的并发、排队深度和拒绝统计"""
+    return {"status": "success", "data": admission.metrics()}
+
+@app.get("/api/sse/metrics")
+async def sse_metrics():
+    """咨询事件流统计：按格式的每次咨询字符数和编码耗时，以及压缩率"""
+    return {
+        "status": "success",
+        "data": {
+            "runs": consultation_runs.stats(),
+            "compression": {
+                encoding: {
+                    **stats,
+                    "ratio": round(stats["compressed_bytes"] / stats["raw_bytes"], 4) if stats["raw_bytes"] else None
+                }
+                for encoding, stats in compression_stats.items()
+            }
+        }
+    }
+
+@app.get("/api/answers/metrics")
+async def answer_store_metrics():
+    """预计算回答库的命中率和版本信息"""
+    return {"status": "success", "data": answer_store.metrics()}
+
+def require_admin(request: Request):
+    """校验 X-Admin-Token 请求头，未配置 admin_token 时管理接口不可用"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled, set ADMIN_TOKEN to enable them")
+    if request.headers.get("X-Admin-Token") != settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/api/admin/traces")
+async def list_traces(request: Request, limit: int = 50, min_duration_ms: float = 0.0):
+    """最近请求的trace摘要，可按最短耗时过滤"""
+    require_admin(request)
+    return {
+        "status": "success",
+        "data": {
+            "traces": tracer.traces(limit=limit, min_duration_ms=min_duration_ms),
+            "export": tracer.exporter.stats if tracer.exporter else None
+        }
+    }
+
+@app.get("/api/admin/traces/{trace_id}")
+async def get_trace(trace_id: str, request: Request):
+    """单个trace的全部span"""
+    require_admin(request)
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"status": "success", "data": trace}
+
+@app.get("/api/admin/profiles")
+async def list_profiles(request: Request):
+    """最近的请求分析结果"""
+    require_admin(request)
+    return {"status": "success", "data": await profile_store.list()}
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    """折叠栈格式的分析结果，可直接用于 flamegraph.pl 或 speedscope"""
+    require_admin(request)
+    collapsed = await profile_store.get(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(collapsed)
+
+async def collect_service_metrics() -> List[MetricFamily]:
+    """导出时读取各组件已有的统计：缓存命中、队列深度、准入和日志队列"""
+    cache = get_shared_state().stats
+    cache_lookups = cache["cache_hits"] + cache["cache_misses"]
+    answers = answer_store.stats
+    admission_stats = admission.metrics()
+    limiters = {**admission_stats["budgets"], **admission_stats["endpoints"]}
+    runs = consultation_runs.stats()
+    logging_stats = get_logging_stats()
+    
+    families: List[MetricFamily] = [
+        ("rightify_tool_cache_events_total", "counter", "Shared tool cache lookups by result", [
+            ({"result": "hit"}, cache["cache_hits"]),
+            ({"result": "miss"}, cache["cache_misses"]),
+            ({"result": "single_flight_join"}, cache["single_flight_joins"]),
+        ]),
+        ("rightify_tool_cache_hit_ratio", "gauge", "Shared tool cache hit ratio", [
+            ({}, cache["cache_hits"] / cache_lookups if cache_lookups else 0.0),
+        ]),
+        ("rightify_answer_store_lookups_total", "counter", "Precomputed answer lookups by result", [
+            ({"result": "hit"}, answers["hits"]),
+            ({"result": "miss"}, answers["misses"]),
+        ]),
+        ("rightify_admission_active", "gauge", "Requests holding an admission slot", [
+            ({"limiter": name}, stats["active"]) for name, stats in limiters.items()
+        ]),
+        ("rightify_admission_queued", "gauge", "Requests waiting for an admission slot", [
+            ({"limiter": name}, stats["queued"]) for name, stats in limiters.items()
+        ]),
+        ("rightify_admission_shed_total", "counter", "Requests rejected by admission control", [
+            ({"limiter": name, "reason": reason}, stats[f"shed_{reason}"])
+            for name, stats in limiters.items() for reason in ("queue_full", "timeout")
+        ]),
+        ("rightify_sse_runs", "gauge", "Consultation runs held in the replay registry", [
+            ({"state": "running"}, runs["running"]),
+            ({"state": "finished"}, runs["runs"] - runs["running"]),
+        ]),
+        ("rightify_sse_subscribers", "gauge", "Connected consultation event streams", [({}, runs["subscribers"])]),
+        ("rightify_log_queue_depth", "gauge", "Log records waiting for the background writer", [
+            ({}, logging_stats["queued"]),
+        ]),
+        ("rightify_log_records_dropped_total", "counter", "Log records dropped on queue overflow", [
+            ({}, logging_stats["dropped"]),
+        ]),
+        ("rightify_startup_seconds", "gauge", "Seconds since process start at each startup milestone", [
+            ({"milestone": name}, seconds) for name, seconds in startup_report.milestones.items()
+        ]),
+    ]
+    if job_manager:
+        jobs = await job_manager.metrics()
+        families.append(("rightify_job_queue_depth", "gauge", "Queued async jobs by priority", [
+            ({"priority": priority}, depth) for priority, depth in jobs["queue_depth"].items()
+        ]))
+        families.append(("rightify_jobs_running", "gauge", "Async jobs currently running", [({}, jobs["running"])]))
+    if legal_agent:
+        speculation = legal_agent.speculation_stats
+        families.append(("rightify_speculation_total", "counter", "Speculative tool calls by outcome", [
+            ({"outcome": "adopted"}, speculation["adopted"]),
+            ({"outcome": "wasted"}, speculation["wasted"]),
+        ]))
+    return families
+
+metrics_registry.register_collector(collect_service_metrics)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus格式指标"""
+    if not settings.enable_metrics:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(
+        await metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 @app.get("/api/health")
 async def health_check():
     """健康检查接口"""
@@ -153,7 +824,7 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "version": "2.0.0",
-        "agent_status": "ready" if legal_agent else "not_initialized"
+        "agent_status": agent_state()
     }
 
 @app.get("/api/agent/status")
@@ -163,8 +834,13 @@ async def agent_status():
         raise HTTPException(status_code=503, detail="Agent not initialized")
     
     status = await legal_agent.get_status()
+    status["event_loop"] = loop_monitor.metrics()
+    status["startup"] = startup_report.to_dict()
     return {"status": "success", "data": status}
 
+startup_report.record("import.main", time.perf_counter() - _import_started)
+startup_report.mark("imported")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
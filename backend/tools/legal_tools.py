@@ -1,30 +1,58 @@
 import asyncio
+import hashlib
 import json
 import random
+from collections import Counter
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from abc import ABC, abstractmethod
 
 import httpx
-from langchain.tools import BaseTool
-from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage
 
 from backend.config import settings
+from backend.utils.json_utils import extract_json, format_for_prompt
+from backend.utils.llm import create_llm
 from backend.utils.logger import logger, log_async_calls
+from backend.utils.shared_state import get_shared_state
+from backend.utils.text_chunks import split_text
+from backend.utils.tokens import estimate_tokens
+
+# 长文本分块分析时需要合并的列表字段
+MERGED_LIST_FIELDS = ("legal_relations", "applicable_laws", "key_issues", "evidence_requirements")
+
+RISK_LEVELS = {"低": 0, "中": 1, "高": 2}
 
 class BaseLegalTool(ABC):
     """法律工具基类"""
     
+    # 使用LLM的工具设置温度，LLM客户端在首次使用时创建
+    llm_temperature: Optional[float] = None
+    
     def __init__(self):
         self.name = self.__class__.__name__
         self.initialized = False
+        self._llm = None
     
     async def initialize(self):
         """初始化工具"""
         self.initialized = True
         logger.debug(f"Tool {self.name} initialized")
     
+    @property
+    def llm(self):
+        if self._llm is None and self.llm_temperature is not None:
+            self._llm = create_llm(temperature=self.llm_temperature)
+        return self._llm
+    
+    @llm.setter
+    def llm(self, value):
+        self._llm = value
+    
+    async def _invoke_llm(self, prompt: str) -> Any:
+        """以系统消息调用LLM（langchain在首次调用时才导入）"""
+        from langchain.schema import SystemMessage
+        return await self.llm.ainvoke([SystemMessage(content=prompt)])
+    
     @abstractmethod
     async def execute(self, *args, **kwargs) -> Dict[str, Any]:
         """执行工具功能"""
@@ -33,24 +61,14 @@ class BaseLegalTool(ABC):
 class LegalAnalysisTool(BaseLegalTool):
     """法律案情分析工具"""
     
-    def __init__(self):
-        super().__init__()
-        self.llm = None
-    
-    async def initialize(self):
-        """初始化LLM"""
-        await super().initialize()
-        llm_config = settings.llm_config
-        self.llm = ChatOpenAI(
-            api_key=llm_config["api_key"],
-            base_url=llm_config["base_url"],
-            model=llm_config["model"],
-            temperature=0.1
-        )
+    llm_temperature = 0.1
     
     @log_async_calls("tools")
     async def analyze(self, case_description: str) -> Dict[str, Any]:
-        """分析法律案情"""
+        """分析法律案情，超长输入按分块map-reduce方式分析"""
+        if estimate_tokens(case_description) > settings.analysis_long_input_tokens:
+            return await self.analyze_long(case_description)
+        
         try:
             analysis_prompt = f"""
             作为专业的法律分析师，请对以下案情进行详细分析：
@@ -82,11 +100,10 @@ class LegalAnalysisTool(BaseLegalTool):
             }}
             """
             
-            response = await self.llm.ainvoke([SystemMessage(content=analysis_prompt)])
+            response = await self._invoke_llm(analysis_prompt)
             
-            try:
-                result = json.loads(response.content)
-            except json.JSONDecodeError:
+            result = extract_json(response.content)
+            if not isinstance(result, dict):
                 # 如果JSON解析失败，返回文本结果
                 result = {
                     "summary": response.content,
@@ -109,6 +126,116 @@ class LegalAnalysisTool(BaseLegalTool):
                 "tool": "legal_analysis"
             }
     
+    async def analyze_long(self, case_description: str) -> Dict[str, Any]:
+        """长文本分析：分块并发分析后合并结果"""
+        chunks = split_text(
+            case_description,
+            chunk_chars=settings.analysis_chunk_chars,
+            overlap_chars=settings.analysis_chunk_overlap
+        )
+        semaphore = asyncio.Semaphore(settings.analysis_chunk_concurrency)
+        
+        async def analyze_chunk(index: int, chunk: str) -> Dict[str, Any]:
+            async with semaphore:
+                # 按分块内容缓存，修改文档后只重新分析变化的分块
+                digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+                return await get_shared_state().single_flight(
+                    f"analysis_chunk:{digest}",
+                    lambda: self._analyze_chunk(index + 1, len(chunks), chunk),
+                    ttl=settings.analysis_chunk_cache_ttl,
+                    should_cache=lambda value: "error" not in value
+                )
+        
+        partials = await asyncio.gather(*[
+            analyze_chunk(index, chunk) for index, chunk in enumerate(chunks)
+        ])
+        result = self._merge_partials(partials)
+        result["chunks"] = len(chunks)
+        result["timestamp"] = datetime.now().isoformat()
+        result["tool"] = "legal_analysis"
+        
+        logger.info(
+            f"Long-input legal analysis completed: {len(chunks)} chunks, "
+            f"{result.get('failed_chunks', 0)} failed"
+        )
+        return result
+    
+    async def _analyze_chunk(self, number: int, total: int, chunk: str) -> Dict[str, Any]:
+        """分析单个分块，只提取本段中出现的信息"""
+        chunk_prompt = f"""
+        作为专业的法律分析师，下面是一份较长案情材料的第{number}/{total}部分。
+        请只根据这一部分的内容提取信息，没有涉及的字段返回空列表或空字符串。
+        
+        材料内容：{chunk}
+        
+        请以JSON格式返回：
+        {{
+            "case_type": "案件类型",
+            "legal_relations": ["法律关系"],
+            "applicable_laws": ["相关法条"],
+            "key_issues": ["争议点"],
+            "evidence_requirements": ["证据要求"],
+            "risk_level": "高/中/低",
+            "time_limitations": "时效说明",
+            "summary": "本部分要点"
+        }}
+        """
+        try:
+            response = await self._invoke_llm(chunk_prompt)
+        except Exception as e:
+            logger.warning(f"Chunk {number}/{total} analysis failed: {e}")
+            return {"error": str(e)}
+        
+        partial = extract_json(response.content)
+        if not isinstance(partial, dict):
+            return {"error": "invalid_json", "summary": response.content}
+        return partial
+    
+    @staticmethod
+    def _merge_partials(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """合并各分块的分析结果：列表字段按出现顺序去重，案件类型取多数，风险取最高"""
+        succeeded = [partial for partial in partials if "error" not in partial]
+        if not succeeded:
+            return {
+                "error": "all chunks failed",
+                "summary": "分析过程中出现错误",
+                "failed_chunks": len(partials)
+            }
+        
+        result: Dict[str, Any] = {}
+        for field in MERGED_LIST_FIELDS:
+            merged: List[str] = []
+            seen = set()
+            for partial in succeeded:
+                values = partial.get(field) or []
+                for value in values if isinstance(values, list) else [values]:
+                    key = " ".join(str(value).split())
+                    if key and key not in seen:
+                        seen.add(key)
+                        merged.append(str(value).strip())
+            result[field] = merged
+        
+        case_types = Counter(
+            partial["case_type"] for partial in succeeded
+            if isinstance(partial.get("case_type"), str) and partial["case_type"] not in ("", "待分析")
+        )
+        result["case_type"] = case_types.most_common(1)[0][0] if case_types else "待分析"
+        
+        levels = [partial.get("risk_level") for partial in succeeded if partial.get("risk_level") in RISK_LEVELS]
+        level = max(levels, key=RISK_LEVELS.get) if levels else "中"
+        result["risk_assessment"] = {
+            "level": level,
+            "description": f"综合{len(succeeded)}个部分的分析，最高风险等级为{level}"
+        }
+        result["time_limitations"] = next(
+            (partial["time_limitations"] for partial in succeeded if partial.get("time_limitations")), ""
+        )
+        result["summary"] = "\n".join(
+            partial["summary"] for partial in succeeded if partial.get("summary")
+        )
+        result["failed_chunks"] = len(partials) - len(succeeded)
+        return result
+    
     async def execute(self, case_description: str) -> Dict[str, Any]:
         return await self.analyze(case_description)
 
@@ -150,6 +277,22 @@ class LegalCaseSearchTool(BaseLegalTool):
             }
         ]
     
+    def _match_cases(self, keywords: str, case_type: str = "") -> List[Dict[str, Any]]:
+        """简单的关键词匹配"""
+        relevant_cases = []
+        keywords_lower = keywords.lower()
+        
+        for case in self.mock_cases:
+            # 检查关键词是否在案例中
+            if (keywords_lower in case["title"].lower() or 
+                keywords_lower in case["summary"].lower() or
+                any(kw in keywords_lower for kw in case["key_points"])):
+                
+                # 如果指定了案例类型，进行过滤
+                if not case_type or case_type in case["case_type"]:
+                    relevant_cases.append(case)
+        return relevant_cases
+    
     @log_async_calls("tools")
     async def search(self, keywords: str, case_type: str = "") -> Dict[str, Any]:
         """搜索相关案例"""
@@ -157,19 +300,7 @@ class LegalCaseSearchTool(BaseLegalTool):
             # 模拟搜索延迟
             await asyncio.sleep(0.5)
             
-            # 简单的关键词匹配
-            relevant_cases = []
-            keywords_lower = keywords.lower()
-            
-            for case in self.mock_cases:
-                # 检查关键词是否在案例中
-                if (keywords_lower in case["title"].lower() or 
-                    keywords_lower in case["summary"].lower() or
-                    any(kw in keywords_lower for kw in case["key_points"])):
-                    
-                    # 如果指定了案例类型，进行过滤
-                    if not case_type or case_type in case["case_type"]:
-                        relevant_cases.append(case)
+            relevant_cases = self._match_cases(keywords, case_type)
             
             # 如果没有找到相关案例，返回随机案例作为示例
             if not relevant_cases:
@@ -253,6 +384,39 @@ class LawyerRecommendationTool(BaseLegalTool):
             }
         ]
     
+    def _rank_lawyers(self, case_type: str, location: str = "") -> List[Dict[str, Any]]:
+        """按专业领域、地理位置、评分和执业年限计算匹配分数并排序"""
+        suitable_lawyers = []
+        case_type_lower = case_type.lower()
+        
+        for lawyer in self.mock_lawyers:
+            # 检查专业领域匹配
+            specialty_match = any(
+                specialty.lower() in case_type_lower or 
+                case_type_lower in specialty.lower()
+                for specialty in lawyer["specialties"]
+            )
+            
+            # 检查地理位置匹配
+            location_match = not location or location in lawyer["location"]
+            
+            if specialty_match or not case_type:
+                score = 0
+                if specialty_match:
+                    score += 50
+                if location_match:
+                    score += 30
+                score += lawyer["rating"] * 10
+                score += min(lawyer["experience_years"], 15) * 2
+                
+                lawyer_copy = lawyer.copy()
+                lawyer_copy["match_score"] = score
+                suitable_lawyers.append(lawyer_copy)
+        
+        # 按匹配分数排序
+        suitable_lawyers.sort(key=lambda x: x["match_score"], reverse=True)
+        return suitable_lawyers
+    
     @log_async_calls("tools")
     async def recommend(self, case_type: str, location: str = "") -> Dict[str, Any]:
         """推荐律师"""
@@ -260,35 +424,7 @@ class LawyerRecommendationTool(BaseLegalTool):
             # 模拟推荐延迟
             await asyncio.sleep(0.3)
             
-            suitable_lawyers = []
-            case_type_lower = case_type.lower()
-            
-            for lawyer in self.mock_lawyers:
-                # 检查专业领域匹配
-                specialty_match = any(
-                    specialty.lower() in case_type_lower or 
-                    case_type_lower in specialty.lower()
-                    for specialty in lawyer["specialties"]
-                )
-                
-                # 检查地理位置匹配
-                location_match = not location or location in lawyer["location"]
-                
-                if specialty_match or not case_type:
-                    score = 0
-                    if specialty_match:
-                        score += 50
-                    if location_match:
-                        score += 30
-                    score += lawyer["rating"] * 10
-                    score += min(lawyer["experience_years"], 15) * 2
-                    
-                    lawyer_copy = lawyer.copy()
-                    lawyer_copy["match_score"] = score
-                    suitable_lawyers.append(lawyer_copy)
-            
-            # 按匹配分数排序
-            suitable_lawyers.sort(key=lambda x: x["match_score"], reverse=True)
+            suitable_lawyers = self._rank_lawyers(case_type, location)
             
             # 如果没有找到合适的律师，返回评分最高的律师
             if not suitable_lawyers:
@@ -416,19 +552,7 @@ class WebSearchTool(BaseLegalTool):
 class ReportGeneratorTool(BaseLegalTool):
     """法律分析报告生成工具"""
     
-    def __init__(self):
-        super().__init__()
-        self.llm = None
-    
-    async def initialize(self):
-        await super().initialize()
-        llm_config = settings.llm_config
-        self.llm = ChatOpenAI(
-            api_key=llm_config["api_key"],
-            base_url=llm_config["base_url"],
-            model=llm_config["model"],
-            temperature=0.2
-        )
+    llm_temperature = 0.2
     
     @log_async_calls("tools")
     async def generate(self, execution_results: Dict[str, Any]) -> Dict[str, Any]:
@@ -438,7 +562,7 @@ class ReportGeneratorTool(BaseLegalTool):
             基于以下执行结果，生成一份专业的法律分析报告：
             
             执行结果：
-            {json.dumps(execution_results, ensure_ascii=False, indent=2)}
+            {format_for_prompt(execution_results)}
             
             请生成一份结构化的法律分析报告，包含以下部分：
             
@@ -467,7 +591,7 @@ class ReportGeneratorTool(BaseLegalTool):
             }}
             """
             
-            response = await self.llm.ainvoke([SystemMessage(content=report_prompt)])
+            response = await self._invoke_llm(report_prompt)
             
             try:
                 report_data = json.loads(response.content)
@@ -503,4 +627,27 @@ class ReportGeneratorTool(BaseLegalTool):
             }
     
     async def execute(self, execution_results: Dict[str, Any]) -> Dict[str, Any]:
-        return await self.generate(execution_results)
\ No newline at end of file
+        return await self.generate(execution_results)
+
+def create_tools() -> Dict[str, BaseLegalTool]:
+    """创建全部工具（使用LLM的工具在首次调用时才创建客户端，创建本身很快）"""
+    return {
+        "case_search": LegalCaseSearchTool(),
+        "lawyer_recommendation": LawyerRecommendationTool(),
+        "legal_analysis": LegalAnalysisTool(),
+        "web_search": WebSearchTool(),
+        "report_generator": ReportGeneratorTool()
+    }
+
+async def initialize_tools(tools: Dict[str, BaseLegalTool]):
+    """并发初始化尚未初始化的工具，单个工具失败不影响其他工具"""
+    async def initialize_tool(tool_name: str, tool: BaseLegalTool):
+        try:
+            await tool.initialize()
+            logger.debug(f"Tool {tool_name} initialized")
+        except Exception as e:
+            logger.warning(f"Failed to initialize tool {tool_name}: {e}")
+    
+    await asyncio.gather(*(
+        initialize_tool(tool_name, tool) for tool_name, tool in tools.items() if not tool.initialized
+    ))
@@ -0,0 +1,178 @@
+"""准入控制
+
+为每类接口设置并发上限和有界等待队列：
+- 并发未满时立即放行
+- 并发已满时进入FIFO等待队列，超过最长等待时间仍未获得名额则拒绝
+- 等待队列已满时立即拒绝，由接口返回 503 + Retry-After
+
+接口按开销分为 expensive（咨询、分析、报告）和 cheap（检索、推荐）两个预算，
+单个接口还可以在所属预算之内再设置更小的并发上限。接口名额和预算名额共用
+同一个等待截止时间，一个请求的总等待时间不超过 max_wait。
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, Deque, List, Optional
+
+from backend.utils.logger import logger
+
+# 接口名称 -> 所属预算
+ENDPOINT_BUDGETS = {
+    "consult": "expensive",
+    "analyze": "expensive",
+    "batch_analyze": "expensive",
+    "report": "expensive",
+    "search": "cheap",
+    "recommend": "cheap",
+}
+
+class AdmissionRejected(Exception):
+    """请求被准入控制拒绝"""
+
+    def __init__(self, limiter: str, reason: str):
+        super().__init__(f"Server busy ({limiter}: {reason}), please retry later")
+        self.limiter = limiter
+        self.reason = reason
+
+class AdmissionLimiter:
+    """带有界等待队列的并发限制器"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self._total_wait = 0.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self, timeout: Optional[float] = None):
+        """获取执行名额，队列已满或等待超时时抛出 AdmissionRejected
+
+        timeout为本次最多等待的秒数，默认为 max_wait。
+        """
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if self.queued >= self.max_queue:
+            self.shed_queue_full += 1
+            raise AdmissionRejected(self.name, "queue_full")
+
+        timeout = self.max_wait if timeout is None else timeout
+        if timeout <= 0:
+            self.shed_timeout += 1
+            raise AdmissionRejected(self.name, "wait_timeout")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已经移交给本请求，但请求被取消，归还名额
+                self.release()
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed_timeout += 1
+                raise AdmissionRejected(self.name, "wait_timeout") from None
+            raise
+
+        self.admitted += 1
+        self._total_wait += time.monotonic() - started
+
+    def release(self):
+        """释放名额，优先直接移交给等待最久的请求"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "avg_wait_ms": round(self._total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+        }
+
+class AdmissionController:
+    """按接口和预算进行准入控制"""
+
+    def __init__(
+        self,
+        budgets: Dict[str, Dict[str, Any]],
+        endpoint_limits: Optional[Dict[str, int]] = None,
+        endpoint_budgets: Optional[Dict[str, str]] = None,
+        enabled: bool = True
+    ):
+        self.enabled = enabled
+        self.endpoint_budgets = endpoint_budgets or ENDPOINT_BUDGETS
+        self.budgets = {
+            name: AdmissionLimiter(name, config["concurrency"], config["queue"], config["max_wait"])
+            for name, config in budgets.items()
+        }
+        self.endpoints: Dict[str, AdmissionLimiter] = {}
+        for endpoint, limit in (endpoint_limits or {}).items():
+            budget = budgets[self.endpoint_budgets[endpoint]]
+            self.endpoints[endpoint] = AdmissionLimiter(endpoint, limit, budget["queue"], budget["max_wait"])
+
+    def _limiters(self, endpoint: str) -> List[AdmissionLimiter]:
+        limiters = [self.budgets[self.endpoint_budgets[endpoint]]]
+        if endpoint in self.endpoints:
+            limiters.insert(0, self.endpoints[endpoint])
+        return limiters
+
+    async def acquire(self, endpoint: str):
+        """依次获取接口名额和预算名额，两者共用所属预算的等待截止时间"""
+        if not self.enabled:
+            return
+        limiters = self._limiters(endpoint)
+        deadline = time.monotonic() + limiters[-1].max_wait
+        acquired = []
+        try:
+            for limiter in limiters:
+                await limiter.acquire(timeout=deadline - time.monotonic())
+                acquired.append(limiter)
+        except BaseException as e:
+            for limiter in reversed(acquired):
+                limiter.release()
+            if isinstance(e, AdmissionRejected):
+                logger.warning(f"Request to {endpoint} shed: {e.limiter} {e.reason}")
+            raise
+
+    def release(self, endpoint: str):
+        if not self.enabled:
+            return
+        for limiter in reversed(self._limiters(endpoint)):
+            limiter.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "budgets": {name: limiter.stats() for name, limiter in self.budgets.items()},
+            "endpoints": {name: limiter.stats() for name, limiter in self.endpoints.items()},
+        }
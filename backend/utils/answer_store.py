@@ -0,0 +1,217 @@
+"""预计算回答库
+
+高频标准问题（如劳动合同解除补偿、交通事故赔偿标准）的回答离线生成后写入
+一个只读二进制文件，在线咨询命中时直接以合成的SSE事件流返回，不经过
+planner/executor/finalizer。
+
+文件格式（小端）：
+    头部   magic(8) | 格式版本 u32 | 条目数 u32 | 构建版本长度 u32 | 构建版本(utf-8)
+    索引   条目数 × (键哈希 u64 | 数据偏移 u64 | 数据长度 u32 | 保留 u32)，按哈希排序
+    数据   每条记录为 UTF-8 JSON
+
+服务端通过mmap按需加载，查找为索引上的二分查找，不需要把整个文件读入内存。
+构建版本由 answer_store_version 和模型名组成，提示词或模型变化时提升版本号，
+旧文件会被视为过期而不再使用，直到重新构建。
+
+构建：
+    python -m backend.utils.answer_store build results.jsonl data/answers.bin
+其中 results.jsonl 为 backend.bulk_runner 的输出。
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from backend.config import settings
+from backend.utils.logger import logger
+
+MAGIC = b"RFYANS01"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIII")
+INDEX_ENTRY = struct.Struct("<QQII")
+
+# 归一化时去除的空白和标点
+PUNCTUATION = re.compile(r"[\s\W_]+", re.UNICODE)
+
+def normalize_query(query: str) -> str:
+    """问题归一化：全半角统一、小写、去除空白和标点"""
+    return PUNCTUATION.sub("", unicodedata.normalize("NFKC", query).lower())
+
+def answer_key(query: str, case_type: str) -> int:
+    """按 (案件类型, 归一化问题) 计算64位键"""
+    payload = f"{case_type or 'general'}\x1f{normalize_query(query)}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), "little")
+
+def expected_build_version() -> str:
+    return f"{settings.answer_store_version}:{settings.default_model}"
+
+def build_store(records: Iterable[Dict[str, Any]], path: Path, build_version: str) -> int:
+    """写入回答库文件（先写临时文件再原子替换），返回条目数"""
+    entries: Dict[int, bytes] = {}
+    for record in records:
+        key = answer_key(record["query"], record.get("case_type", "general"))
+        entries[key] = json.dumps({
+            "query": record["query"],
+            "normalized": normalize_query(record["query"]),
+            "case_type": record.get("case_type", "general") or "general",
+            "answer": record["answer"],
+            "plan": record.get("plan") or [],
+            "built_at": time.time(),
+        }, ensure_ascii=False).encode("utf-8")
+
+    version_bytes = build_version.encode("utf-8")
+    header_size = HEADER.size + len(version_bytes)
+    data_offset = header_size + INDEX_ENTRY.size * len(entries)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + ".tmp")
+    with temp_path.open("wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(entries), len(version_bytes)))
+        f.write(version_bytes)
+        offset = data_offset
+        keys = sorted(entries)
+        for key in keys:
+            f.write(INDEX_ENTRY.pack(key, offset, len(entries[key]), 0))
+            offset += len(entries[key])
+        for key in keys:
+            f.write(entries[key])
+    os.replace(temp_path, path)
+    return len(entries)
+
+class AnswerStore:
+    """mmap加载的只读回答库，文件被重新构建后自动切换到新文件"""
+
+    RELOAD_CHECK_INTERVAL = 5.0
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._mmap: Optional[mmap.mmap] = None
+        self._file_id: Optional[Tuple[int, int, float]] = None
+        self._last_check = 0.0
+        self.count = 0
+        self.build_version = ""
+        self.stale = False
+        self._index_offset = 0
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0}
+
+    def _file_identity(self) -> Optional[Tuple[int, int, float]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime
+
+    def _ensure_loaded(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_check < self.RELOAD_CHECK_INTERVAL:
+            return self._mmap is not None and not self.stale
+        self._last_check = now
+
+        file_id = self._file_identity()
+        if file_id == self._file_id:
+            return self._mmap is not None and not self.stale
+        self.close()
+        self._file_id = file_id
+        if file_id is None or file_id[1] < HEADER.size:
+            return False
+
+        with self.path.open("rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, count, version_length = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            mapped.close()
+            logger.warning(f"Ignoring answer store {self.path}: unknown format")
+            return False
+
+        self._mmap = mapped
+        self.count = count
+        self.build_version = mapped[HEADER.size:HEADER.size + version_length].decode("utf-8")
+        self._index_offset = HEADER.size + version_length
+        self.stale = self.build_version != expected_build_version()
+        if self.stale:
+            logger.warning(
+                f"Answer store {self.path} was built for {self.build_version}, "
+                f"expected {expected_build_version()}; precomputed answers disabled until rebuilt"
+            )
+        else:
+            logger.info(f"Loaded answer store {self.path} with {count} entries")
+        return not self.stale
+
+    def lookup(self, query: str, case_type: str = "general") -> Optional[Dict[str, Any]]:
+        """查找预计算回答，未命中时返回None"""
+        self.stats["lookups"] += 1
+        record = self._lookup(query, case_type) if self._ensure_loaded() else None
+        self.stats["hits" if record is not None else "misses"] += 1
+        return record
+
+    def _lookup(self, query: str, case_type: str) -> Optional[Dict[str, Any]]:
+        key = answer_key(query, case_type)
+        low, high = 0, self.count - 1
+        while low <= high:
+            middle = (low + high) // 2
+            entry_key, offset, length, _ = INDEX_ENTRY.unpack_from(
+                self._mmap, self._index_offset + middle * INDEX_ENTRY.size
+            )
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle - 1
+            else:
+                record = json.loads(self._mmap[offset:offset + length])
+                # 排除哈希碰撞
+                if record["normalized"] == normalize_query(query) and record["case_type"] == (case_type or "general"):
+                    return record
+                return None
+        return None
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": self.count,
+            "build_version": self.build_version,
+            "expected_version": expected_build_version(),
+            "stale": self.stale,
+            "loaded": self._mmap is not None,
+        }
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self.count = 0
+
+def read_results(path: Path) -> List[Dict[str, Any]]:
+    """读取批量咨询结果，只保留成功的回答"""
+    records = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("status") == "success" and record.get("answer"):
+                    records.append(record)
+    return records
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Rightify 预计算回答库")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="由批量咨询结果构建回答库")
+    build.add_argument("results", type=Path, help="backend.bulk_runner 输出的JSONL文件")
+    build.add_argument("output", type=Path, nargs="?", default=Path(settings.answer_store_path))
+    args = parser.parse_args(argv)
+
+    count = build_store(read_results(args.results), args.output, expected_build_version())
+    sys.stdout.write(f"Wrote {count} answers to {args.output} ({expected_build_version()})\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""流式响应压缩
+
+根据 Accept-Encoding 为SSE和NDJSON流式响应协商 br（需要安装brotli）或 gzip 压缩。
+每个响应分块压缩后立即同步刷新（gzip使用Z_SYNC_FLUSH），客户端可以逐个事件解压，
+不会因为压缩缓冲而延迟事件到达。非流式响应不经过该中间件处理。
+"""
+
+import zlib
+from typing import Dict, Any, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from backend.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+STREAMING_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+
+# 压缩统计（按编码）
+compression_stats: Dict[str, Dict[str, int]] = {}
+
+class GzipStreamCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class BrotliStreamCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+def supported_encodings() -> List[str]:
+    """按优先级排列的可用编码"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """从 Accept-Encoding 中选择服务端支持且客户端接受的编码"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    candidates = [
+        encoding for encoding in supported_encodings()
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda encoding: accepted.get(encoding, accepted.get("*", 0.0)))
+
+def create_compressor(encoding: str):
+    if encoding == "br":
+        return BrotliStreamCompressor(settings.sse_brotli_quality)
+    return GzipStreamCompressor(settings.sse_gzip_level)
+
+class StreamCompressionMiddleware:
+    """流式响应压缩（ASGI中间件）"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        if scope["type"] != "http" or not settings.enable_sse_compression:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        compressor = None
+        stats: Dict[str, int] = {}
+
+        async def send_compressed(message: Dict[str, Any]):
+            nonlocal compressor, stats
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message.get("headers", [])))
+                message["headers"] = headers.raw
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if content_type in STREAMING_CONTENT_TYPES and "content-encoding" not in headers:
+                    compressor = create_compressor(encoding)
+                    stats = compression_stats.setdefault(
+                        encoding, {"streams": 0, "raw_bytes": 0, "compressed_bytes": 0}
+                    )
+                    stats["streams"] += 1
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                await send(message)
+            elif message["type"] == "http.response.body" and compressor is not None:
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                chunk = compressor.compress(body) if body else b""
+                if not more_body:
+                    chunk += compressor.finish()
+                stats["raw_bytes"] += len(body)
+                stats["compressed_bytes"] += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            else:
+                await send(message)
+
+        await self.app(scope, receive, send_compressed)
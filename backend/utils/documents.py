@@ -0,0 +1,230 @@
+"""文档上传与文本提取
+
+上传内容按块写入 upload_dir，边写边计算SHA-256，不在内存中缓存整个文件。
+文本提取在进程池中执行，不阻塞事件循环。提取结果以内容哈希为键保存，
+同一文件重复上传时直接返回已有结果。
+
+- .txt：按 UTF-8 / GB18030 解码
+- .docx：直接解析 word/document.xml（仅依赖标准库）
+- .doc：从二进制中提取连续的UTF-16文本片段（尽力而为）
+- .pdf：需要安装可选依赖 pypdf（pip install rightify[documents]）
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, AsyncIterator, Optional
+from xml.etree import ElementTree
+
+import aiofiles
+
+from backend.utils.logger import logger
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+class DocumentError(Exception):
+    """文档处理失败"""
+
+class UnsupportedDocumentType(DocumentError):
+    """不支持的文件类型"""
+
+class DocumentTooLarge(DocumentError):
+    """文件超过大小限制"""
+
+def _extract_txt(path: str) -> str:
+    raw = Path(path).read_bytes()
+    for encoding in ("utf-8-sig", "gb18030"):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("utf-8", errors="replace")
+
+def _extract_docx(path: str) -> str:
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    for paragraph in root.iter(f"{WORD_NAMESPACE}p"):
+        text = "".join(node.text or "" for node in paragraph.iter(f"{WORD_NAMESPACE}t"))
+        if text.strip():
+            paragraphs.append(text)
+    return "\n".join(paragraphs)
+
+def _extract_doc(path: str) -> str:
+    raw = Path(path).read_bytes()
+    # Word 97-2003 正文通常以UTF-16LE保存，提取足够长的可读片段
+    text = raw.decode("utf-16-le", errors="ignore")
+    runs = re.findall(r"[\u4e00-\u9fff\u3000-\u303f\uff00-\uffefA-Za-z0-9\s“”《》,.;:()\-]{8,}", text)
+    return "\n".join(run.strip() for run in runs if run.strip())
+
+def _extract_pdf(path: str) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise DocumentError("PDF extraction requires the 'pypdf' package")
+    reader = PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+EXTRACTORS = {
+    ".txt": _extract_txt,
+    ".docx": _extract_docx,
+    ".doc": _extract_doc,
+    ".pdf": _extract_pdf,
+}
+
+def extract_text(path: str, extension: str) -> str:
+    """提取文档文本（在进程池中执行）"""
+    text = EXTRACTORS[extension](path)
+    # 合并多余的空白行
+    return re.sub(r"\n\s*\n+", "\n\n", text).strip()
+
+class DocumentStore:
+    """按内容哈希保存上传文件和提取的文本"""
+
+    def __init__(
+        self,
+        upload_dir: str,
+        max_file_size: int,
+        allowed_types: list,
+        extract_workers: int = 2
+    ):
+        self.upload_dir = Path(upload_dir)
+        self.text_dir = self.upload_dir / "text"
+        self.max_file_size = max_file_size
+        self.allowed_types = [ext.lower() for ext in allowed_types]
+        self.extract_workers = extract_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._extracting: Dict[str, asyncio.Future] = {}
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.extract_workers)
+        return self._pool
+
+    def _meta_path(self, document_id: str) -> Path:
+        return self.text_dir / f"{document_id}.json"
+
+    def _text_path(self, document_id: str) -> Path:
+        return self.text_dir / f"{document_id}.txt"
+
+    @staticmethod
+    def _valid_id(document_id: str) -> bool:
+        return bool(re.fullmatch(r"[0-9a-f]{64}", document_id))
+
+    def _read_metadata(self, document_id: str) -> Optional[Dict[str, Any]]:
+        path = self._meta_path(document_id)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    async def get_metadata(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """获取文档元数据，文档不存在或尚未提取完成时返回None"""
+        if not self._valid_id(document_id):
+            return None
+        return await asyncio.to_thread(self._read_metadata, document_id)
+
+    async def get_text(self, document_id: str) -> Optional[str]:
+        """获取已提取的文档文本"""
+        if not self._valid_id(document_id):
+            return None
+        path = self._text_path(document_id)
+        if not path.exists():
+            return None
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            return await f.read()
+
+    async def save_stream(self, filename: str, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """流式保存上传内容并提取文本，返回文档元数据"""
+        extension = Path(filename).suffix.lower()
+        if extension not in self.allowed_types:
+            raise UnsupportedDocumentType(f"Unsupported file type: {extension or filename}")
+
+        # 目录在首次上传时创建，创建存储对象（导入应用模块）时不写磁盘
+        self.text_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        temp_path = self.upload_dir / f".upload-{uuid.uuid4().hex}"
+        try:
+            async with aiofiles.open(temp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_file_size:
+                        raise DocumentTooLarge(f"File exceeds {self.max_file_size} bytes")
+                    digest.update(chunk)
+                    await f.write(chunk)
+
+            document_id = digest.hexdigest()
+            metadata = await self.get_metadata(document_id)
+            if metadata is not None:
+                return {**metadata, "reused": True}
+
+            file_path = self.upload_dir / f"{document_id}{extension}"
+            os.replace(temp_path, file_path)
+            # 同一文件同时上传时只提取一次
+            extracting = self._extracting.get(document_id)
+            if extracting is None:
+                extracting = asyncio.ensure_future(
+                    self._extract(document_id, filename, extension, size, file_path)
+                )
+                self._extracting[document_id] = extracting
+                extracting.add_done_callback(lambda _: self._extracting.pop(document_id, None))
+            metadata = await asyncio.shield(extracting)
+            return {**metadata, "reused": False}
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    async def _extract(
+        self,
+        document_id: str,
+        filename: str,
+        extension: str,
+        size: int,
+        file_path: Path
+    ) -> Dict[str, Any]:
+        metadata = await self.get_metadata(document_id)
+        if metadata is not None:
+            return metadata
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            text = await loop.run_in_executor(self.pool, extract_text, str(file_path), extension)
+            if not text:
+                raise DocumentError(f"No text could be extracted from {filename}")
+        except Exception as e:
+            # 提取失败时删除上传文件，不在上传目录中留下无法使用的文件
+            await asyncio.to_thread(file_path.unlink, True)
+            if isinstance(e, DocumentError):
+                raise
+            raise DocumentError(f"Failed to extract text from {filename}: {e}")
+
+        async with aiofiles.open(self._text_path(document_id), "w", encoding="utf-8") as f:
+            await f.write(text)
+        metadata = {
+            "document_id": document_id,
+            "filename": filename,
+            "size": size,
+            "chars": len(text),
+            "created_at": time.time(),
+        }
+        # 元数据最后写入，作为提取完成的标记
+        async with aiofiles.open(self._meta_path(document_id), "w", encoding="utf-8") as f:
+            await f.write(json.dumps(metadata, ensure_ascii=False))
+        logger.info(
+            f"Extracted {len(text)} chars from {filename} in {time.perf_counter() - started:.2f}s"
+        )
+        return metadata
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,103 @@
+"""SSE事件编码
+
+事件序列化方式可插拔：安装orjson时默认使用orjson，否则使用标准库json。
+compact格式使用短键名、数字事件类型和毫秒时间戳，并省略可以由事件类型和
+data推导出的固定提示文本，适合带宽敏感的客户端：
+
+    {"t": 3, "d": {"step": "案例检索", ...}, "ts": 1760000000000}
+
+键名对照：t=type, c=content, d=data, ts=timestamp。
+"""
+
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional
+
+from backend.config import settings
+from backend.utils.logger import logger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+EVENT_FORMATS = ("json", "compact")
+
+# compact格式中的事件类型编号
+EVENT_TYPE_CODES = {
+    "start": 1,
+    "planning": 2,
+    "execution": 3,
+    "final_answer": 4,
+    "complete": 5,
+    "error": 6,
+    "reset": 7,
+}
+
+COMPACT_KEYS = {"type": "t", "content": "c", "data": "d", "timestamp": "ts"}
+
+# compact格式中保留content的事件类型，其余事件的content为固定提示或可由data推导
+CONTENT_EVENT_TYPES = {"final_answer", "error"}
+
+def _json_dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def _orjson_dumps(value: Any) -> str:
+    return orjson.dumps(value, default=str).decode("utf-8")
+
+def get_dumps(backend: str = "auto") -> Callable[[Any], str]:
+    """按配置选择JSON序列化实现"""
+    if backend == "json":
+        return _json_dumps
+    if orjson is None:
+        if backend == "orjson":
+            logger.warning("orjson is not installed, falling back to json for SSE encoding")
+        return _json_dumps
+    return _orjson_dumps
+
+def to_epoch_ms(timestamp: Any) -> Any:
+    """ISO时间转换为毫秒时间戳，无法解析时原样返回"""
+    if not isinstance(timestamp, str):
+        return timestamp
+    try:
+        return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+    except ValueError:
+        return timestamp
+
+def compact_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """转换为compact格式"""
+    event_type = event.get("type")
+    compact: Dict[str, Any] = {"t": EVENT_TYPE_CODES.get(event_type, event_type)}
+    for key, value in event.items():
+        if key == "type":
+            continue
+        if key == "content" and event_type in EVENT_TYPE_CODES and event_type not in CONTENT_EVENT_TYPES:
+            continue
+        if key == "timestamp":
+            value = to_epoch_ms(value)
+        compact[COMPACT_KEYS.get(key, key)] = value
+    return compact
+
+class EventEncoder:
+    """事件编码器，统计一次SSE订阅的事件数、字符数和编码耗时
+
+    按字符计数，避免在热路径上为统计再编码一次；实际传输字节数见压缩中间件的统计。
+    """
+
+    def __init__(self, event_format: Optional[str] = None, backend: Optional[str] = None):
+        self.format = event_format or settings.sse_event_format
+        if self.format not in EVENT_FORMATS:
+            raise ValueError(f"Unknown event format: {self.format}")
+        self._dumps = get_dumps(backend or settings.sse_json_backend)
+        self.events = 0
+        self.chars = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, event: Dict[str, Any]) -> str:
+        started = time.perf_counter()
+        payload = self._dumps(compact_event(event) if self.format == "compact" else event)
+        self.encode_seconds += time.perf_counter() - started
+        self.events += 1
+        self.chars += len(payload)
+        return payload
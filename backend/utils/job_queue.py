@@ -0,0 +1,404 @@
+"""异步任务队列
+
+长时间运行的咨询和报告生成以任务方式提交：接口立即返回任务ID，
+由有界的worker池按优先级执行，客户端可轮询状态或以SSE方式订阅进度。
+
+队列后端默认使用进程内实现；配置 redis_url 时使用Redis实现，
+测试中可以用 LocalRedis 替换真实的Redis客户端。
+
+排队中的任务只能被认领一次：worker开始执行（running）和取消（cancelled）通过
+backend.claim 原子地竞争，任务最终只会处于其中一种状态。
+
+提交任务时记录当前请求的客户端标识和LLM降级状态，worker执行任务时恢复，
+任务中的LLM调用同样扣减该客户端的token额度。
+
+每个进度事件带有单调递增的序号 seq（从1开始），只保留最近 max_events 个事件，
+订阅方按序号而不是列表位置续传，旧事件被裁剪后不会重复或跳过。
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+
+from backend.utils.logger import logger
+from backend.utils.rate_limit import current_client, llm_degraded
+from backend.utils.shared_state import create_redis_client
+
+# 优先级名称 -> 数值（越小越优先）
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+# 任务处理函数：(任务参数, 进度上报函数) -> 任务结果
+EmitFn = Callable[[Dict[str, Any]], Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], EmitFn], Awaitable[Any]]
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+class JobQueueBackend(ABC):
+    """任务队列后端接口"""
+
+    @abstractmethod
+    async def enqueue(self, job: Dict[str, Any]):
+        """保存任务记录并加入队列"""
+
+    @abstractmethod
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        """取出优先级最高的任务ID，超时返回None"""
+
+    @abstractmethod
+    async def remove(self, job_id: str) -> bool:
+        """从队列中移除尚未被取出的任务，返回是否移除"""
+
+    @abstractmethod
+    async def claim(self, job_id: str, status: str) -> bool:
+        """原子地认领排队中的任务（running 或 cancelled），只有第一个认领者成功"""
+
+    @abstractmethod
+    async def save_job(self, job: Dict[str, Any]):
+        """保存任务记录"""
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取任务记录"""
+
+    @abstractmethod
+    async def append_event(self, job_id: str, event: Dict[str, Any]):
+        """追加进度事件并分配序号 seq"""
+
+    @abstractmethod
+    async def get_events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """序号大于 after 的进度事件"""
+
+    @abstractmethod
+    async def depth(self) -> Dict[str, int]:
+        """各优先级的排队任务数"""
+
+class InMemoryJobBackend(JobQueueBackend):
+    """进程内任务队列后端"""
+
+    def __init__(self, job_ttl: int = 3600, max_events: int = 500):
+        self.job_ttl = job_ttl
+        self.max_events = max_events
+        self._heap: List[Tuple[int, int, str]] = []
+        self._counter = itertools.count()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._event_seq: Dict[str, int] = {}
+        self._available = asyncio.Condition()
+
+    async def enqueue(self, job: Dict[str, Any]):
+        await self.save_job(job)
+        heapq.heappush(self._heap, (PRIORITIES[job["priority"]], next(self._counter), job["job_id"]))
+        async with self._available:
+            self._available.notify()
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        async with self._available:
+            if not self._heap:
+                try:
+                    await asyncio.wait_for(self._available.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    return None
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)[2]
+
+    async def remove(self, job_id: str) -> bool:
+        for index, entry in enumerate(self._heap):
+            if entry[2] == job_id:
+                self._heap[index] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                return True
+        return False
+
+    async def claim(self, job_id: str, status: str) -> bool:
+        # 检查和修改之间没有await，在事件循环中是原子的
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] != "queued":
+            return False
+        job["status"] = status
+        return True
+
+    async def save_job(self, job: Dict[str, Any]):
+        self._jobs[job["job_id"]] = job
+        self._expire()
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    async def append_event(self, job_id: str, event: Dict[str, Any]):
+        seq = self._event_seq[job_id] = self._event_seq.get(job_id, 0) + 1
+        events = self._events.setdefault(job_id, [])
+        events.append({**event, "seq": seq})
+        if len(events) > self.max_events:
+            del events[:len(events) - self.max_events]
+
+    async def get_events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        return [event for event in self._events.get(job_id, []) if event["seq"] > after]
+
+    async def depth(self) -> Dict[str, int]:
+        counts = {name: 0 for name in PRIORITIES}
+        names = {value: name for name, value in PRIORITIES.items()}
+        for priority, _, _ in self._heap:
+            counts[names[priority]] += 1
+        return counts
+
+    def _expire(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.get("finished_at") and now - job["finished_at"] > self.job_ttl
+        ]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._events.pop(job_id, None)
+            self._event_seq.pop(job_id, None)
+
+class RedisJobBackend(JobQueueBackend):
+    """基于Redis的任务队列后端，多个worker进程可共享同一队列
+
+    队列使用有序集合（score = 优先级 * 1e13 + 入队毫秒时间），任务记录和进度事件
+    分别存放在带过期时间的字符串和列表中。
+    """
+
+    PRIORITY_SPAN = 10 ** 13
+
+    def __init__(self, client: Any, prefix: str = "rightify:jobs", job_ttl: int = 3600, max_events: int = 500):
+        self.client = client
+        self.prefix = prefix
+        self.job_ttl = job_ttl
+        self.max_events = max_events
+        self.queue_key = f"{prefix}:queue"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _events_key(self, job_id: str) -> str:
+        return f"{self.prefix}:events:{job_id}"
+
+    def _seq_key(self, job_id: str) -> str:
+        return f"{self.prefix}:seq:{job_id}"
+
+    def _claim_key(self, job_id: str) -> str:
+        return f"{self.prefix}:claim:{job_id}"
+
+    async def enqueue(self, job: Dict[str, Any]):
+        score = PRIORITIES[job["priority"]] * self.PRIORITY_SPAN + int(time.time() * 1000)
+        pipe = self.client.pipeline()
+        pipe.set(self._job_key(job["job_id"]), json.dumps(job, ensure_ascii=False), ex=self.job_ttl)
+        pipe.zadd(self.queue_key, {job["job_id"]: score})
+        await pipe.execute()
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        popped = await self.client.bzpopmin(self.queue_key, timeout=timeout)
+        if not popped:
+            return None
+        return popped[1]
+
+    async def remove(self, job_id: str) -> bool:
+        return bool(await self.client.zrem(self.queue_key, job_id))
+
+    async def claim(self, job_id: str, status: str) -> bool:
+        # SET NX 保证多个进程中只有一个认领成功
+        return bool(await self.client.set(self._claim_key(job_id), status, nx=True, ex=self.job_ttl))
+
+    async def save_job(self, job: Dict[str, Any]):
+        await self.client.set(
+            self._job_key(job["job_id"]), json.dumps(job, ensure_ascii=False), ex=self.job_ttl
+        )
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self.client.get(self._job_key(job_id))
+        return json.loads(raw) if raw else None
+
+    async def append_event(self, job_id: str, event: Dict[str, Any]):
+        key, seq_key = self._events_key(job_id), self._seq_key(job_id)
+        seq = await self.client.incr(seq_key)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps({**event, "seq": seq}, ensure_ascii=False))
+        pipe.ltrim(key, -self.max_events, -1)
+        pipe.expire(key, self.job_ttl)
+        pipe.expire(seq_key, self.job_ttl)
+        await pipe.execute()
+
+    async def get_events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        # 列表最多 max_events 个事件，整体读取后按序号过滤
+        raw_events = await self.client.lrange(self._events_key(job_id), 0, -1)
+        events = [json.loads(raw) for raw in raw_events]
+        return [event for event in events if event["seq"] > after]
+
+    async def depth(self) -> Dict[str, int]:
+        pipe = self.client.pipeline()
+        for value in PRIORITIES.values():
+            low = value * self.PRIORITY_SPAN
+            pipe.zcount(self.queue_key, low, low + self.PRIORITY_SPAN - 1)
+        counts = await pipe.execute()
+        return dict(zip(PRIORITIES.keys(), counts))
+
+def create_job_backend(redis_url: Optional[str], job_ttl: int = 3600, max_events: int = 500) -> JobQueueBackend:
+    """根据配置创建任务队列后端，Redis不可用时回退到进程内实现"""
+    client = create_redis_client(redis_url) if redis_url else None
+    if client is not None:
+        logger.info("Using Redis job queue backend")
+        return RedisJobBackend(client, job_ttl=job_ttl, max_events=max_events)
+    return InMemoryJobBackend(job_ttl=job_ttl, max_events=max_events)
+
+class JobManager:
+    """任务管理器 - 接收任务并由固定数量的worker执行"""
+
+    def __init__(
+        self,
+        backend: JobQueueBackend,
+        handlers: Dict[str, JobHandler],
+        workers: int = 4,
+        max_queue_size: int = 1000
+    ):
+        self.backend = backend
+        self.handlers = handlers
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        self.counters = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def start(self):
+        """启动worker池"""
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(index), name=f"job-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"Job manager started with {self.workers} workers")
+
+    async def stop(self):
+        """停止worker池"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, payload: Dict[str, Any], priority: str = "normal") -> Dict[str, Any]:
+        """提交任务，返回任务记录"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        depth = await self.backend.depth()
+        if sum(depth.values()) >= self.max_queue_size:
+            self.counters["rejected"] += 1
+            raise QueueFullError("Job queue is full")
+
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "kind": kind,
+            "payload": payload,
+            "priority": priority,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "client": current_client.get(),
+            "degraded": llm_degraded.get(),
+        }
+        await self.backend.enqueue(job)
+        self.counters["submitted"] += 1
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.get_job(job_id)
+
+    async def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """序号大于 after 的进度事件"""
+        return await self.backend.get_events(job_id, after)
+
+    async def cancel(self, job_id: str) -> bool:
+        """取消尚未开始执行的任务，并从队列中移除，不再占用队列容量
+
+        任务已被worker取出（即使记录中仍为queued）时返回False。
+        """
+        job = await self.backend.get_job(job_id)
+        if job is None or job["status"] != "queued":
+            return False
+        if not await self.backend.remove(job_id) or not await self.backend.claim(job_id, "cancelled"):
+            return False
+        job["status"] = "cancelled"
+        job["finished_at"] = time.time()
+        await self.backend.save_job(job)
+        self.counters["cancelled"] += 1
+        return True
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job_id = await self.backend.dequeue(timeout=1.0)
+                if job_id is None:
+                    continue
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {index} error: {e}")
+                await asyncio.sleep(1.0)
+
+    async def _run_job(self, job_id: str):
+        job = await self.backend.get_job(job_id)
+        if job is None or job["status"] != "queued" or not await self.backend.claim(job_id, "running"):
+            return
+
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        await self.backend.save_job(job)
+        self._running += 1
+        self._total_wait += job["started_at"] - job["created_at"]
+
+        async def emit(event: Dict[str, Any]):
+            await self.backend.append_event(job_id, event)
+
+        # worker任务的上下文中没有请求信息，恢复提交任务时的客户端和降级状态
+        client_token = current_client.set(job.get("client"))
+        degraded_token = llm_degraded.set(job.get("degraded", False))
+        try:
+            job["result"] = await self.handlers[job["kind"]](job["payload"], emit)
+            job["status"] = "succeeded"
+            self.counters["succeeded"] += 1
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+            self.counters["failed"] += 1
+        finally:
+            current_client.reset(client_token)
+            llm_degraded.reset(degraded_token)
+            self._running -= 1
+            job["finished_at"] = time.time()
+            self._total_run += job["finished_at"] - job["started_at"]
+            await self.backend.save_job(job)
+
+    async def metrics(self) -> Dict[str, Any]:
+        """队列深度和执行统计"""
+        depth = await self.backend.depth()
+        finished = self.counters["succeeded"] + self.counters["failed"]
+        started = finished + self._running
+        return {
+            "queue_depth": depth,
+            "queue_depth_total": sum(depth.values()),
+            "running": self._running,
+            "workers": self.workers,
+            "counters": dict(self.counters),
+            "avg_wait_seconds": round(self._total_wait / started, 3) if started else 0.0,
+            "avg_run_seconds": round(self._total_run / finished, 3) if finished else 0.0,
+        }
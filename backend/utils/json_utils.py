@@ -0,0 +1,25 @@
+"""LLM输出中的JSON解析和提示词中的JSON格式化"""
+
+import json
+from typing import Any, Optional
+
+def extract_json(text: str) -> Optional[Any]:
+    """从LLM回复中提取JSON对象（兼容 ```json 代码块和前后说明文字），失败时返回None"""
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+def format_for_prompt(value: Any) -> str:
+    """将执行结果等数据格式化为提示词中的JSON文本"""
+    return json.dumps(value, ensure_ascii=False, indent=2)
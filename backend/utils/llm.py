@@ -0,0 +1,127 @@
+"""LLM客户端
+
+Agent和工具统一通过 create_llm 创建模型客户端。每次调用后按响应中的
+usage_metadata 扣减当前客户端的token额度；客户端超出额度时改用低成本模型
+（DEGRADED_MODEL，未配置时使用默认模型并限制输出长度）。
+
+所有LLM调用共享一个进程级并发上限（llm_max_concurrency），批量任务和在线请求
+不会因为同时发起过多上游请求而触发服务商限流。
+
+langchain_openai 在创建第一个客户端时才导入（约1秒），导入本模块不加载它。
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
+
+from backend.config import settings
+from backend.utils.metrics import LLM_QUEUE_WAIT, LLM_REQUEST_DURATION, LLM_TOKENS
+from backend.utils.rate_limit import debit_tokens, llm_degraded
+from backend.utils.tracing import tracer
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# 调用方可设置一个计数字典，统计当前任务（如一次咨询）内的LLM token用量
+usage_scope: ContextVar[Optional[Dict[str, int]]] = ContextVar("llm_usage_scope", default=None)
+
+_queue_wait = LLM_QUEUE_WAIT.labels()
+_request_durations = {
+    (tier, status): LLM_REQUEST_DURATION.labels(tier, status)
+    for tier in ("primary", "degraded") for status in ("success", "error")
+}
+_prompt_tokens = LLM_TOKENS.labels("prompt")
+_completion_tokens = LLM_TOKENS.labels("completion")
+
+_semaphore: Optional[asyncio.Semaphore] = None
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """获取当前事件循环中所有LLM调用共享的并发限制"""
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+        _semaphore_loop = loop
+    return _semaphore
+
+class MeteredLLM:
+    """带token计量和降级路由的LLM客户端"""
+
+    def __init__(self, temperature: float = 0.1, streaming: bool = False):
+        self.temperature = temperature
+        self.streaming = streaming
+        self.primary = self._build(settings.default_model)
+        self._degraded: Optional["ChatOpenAI"] = None
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "degraded_calls": 0}
+
+    def _build(self, model: str, **kwargs) -> "ChatOpenAI":
+        from langchain_openai import ChatOpenAI
+
+        llm_config = settings.llm_config
+        return ChatOpenAI(
+            api_key=llm_config["api_key"],
+            base_url=llm_config["base_url"],
+            model=model,
+            temperature=self.temperature,
+            streaming=self.streaming,
+            # 流式响应默认不返回usage，不开启时流式客户端的token无法计量和扣减额度
+            stream_usage=self.streaming,
+            **kwargs
+        )
+
+    @property
+    def degraded(self) -> "ChatOpenAI":
+        if self._degraded is None:
+            self._degraded = self._build(
+                settings.degraded_model or settings.default_model,
+                max_tokens=settings.degraded_max_tokens
+            )
+        return self._degraded
+
+    async def ainvoke(self, messages: List[Any], **kwargs) -> Any:
+        degraded = llm_degraded.get()
+        llm = self.degraded if degraded else self.primary
+        tier = "degraded" if degraded else "primary"
+        model = (settings.degraded_model or settings.default_model) if degraded else settings.default_model
+        with tracer.span("llm", tier=tier, model=model) as span:
+            queued_at = time.perf_counter()
+            async with get_llm_semaphore():
+                started = time.perf_counter()
+                _queue_wait.observe(started - queued_at)
+                try:
+                    response = await llm.ainvoke(messages, **kwargs)
+                except Exception:
+                    _request_durations[(tier, "error")].observe(time.perf_counter() - started)
+                    raise
+                _request_durations[(tier, "success")].observe(time.perf_counter() - started)
+
+            usage: Dict[str, Any] = getattr(response, "usage_metadata", None) or {}
+            prompt_tokens = usage.get("input_tokens", 0)
+            completion_tokens = usage.get("output_tokens", 0)
+            if span is not None:
+                span.attributes.update(
+                    queue_wait_ms=round((started - queued_at) * 1000, 3),
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens
+                )
+
+        _prompt_tokens.inc(prompt_tokens)
+        _completion_tokens.inc(completion_tokens)
+        self.usage["calls"] += 1
+        self.usage["prompt_tokens"] += prompt_tokens
+        self.usage["completion_tokens"] += completion_tokens
+        if degraded:
+            self.usage["degraded_calls"] += 1
+        scope = usage_scope.get()
+        if scope is not None:
+            scope["calls"] = scope.get("calls", 0) + 1
+            scope["prompt_tokens"] = scope.get("prompt_tokens", 0) + prompt_tokens
+            scope["completion_tokens"] = scope.get("completion_tokens", 0) + completion_tokens
+        await debit_tokens(prompt_tokens, completion_tokens)
+        return response
+
+def create_llm(temperature: float = 0.1, streaming: bool = False) -> MeteredLLM:
+    """创建LLM客户端"""
+    return MeteredLLM(temperature=temperature, streaming=streaming)
@@ -0,0 +1,232 @@
+"""进程内Redis替身
+
+实现了本项目用到的 redis.asyncio 命令子集（返回值与 decode_responses=True 时一致），
+用于测试以及未配置 redis_url 时的单机运行，不依赖任何外部服务。
+"""
+
+import asyncio
+import fnmatch
+import time
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+Number = Union[int, float]
+
+class LocalRedis:
+    """redis.asyncio.Redis 的进程内替身"""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._changed = asyncio.Condition()
+
+    # ------------------------------------------------------------------
+    # 内部工具
+    # ------------------------------------------------------------------
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            return False
+        return key in self._data
+
+    def _get(self, key: str, default: Any = None) -> Any:
+        return self._data[key] if self._alive(key) else default
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    # ------------------------------------------------------------------
+    # 通用命令
+    # ------------------------------------------------------------------
+
+    async def ping(self) -> bool:
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return removed
+
+    async def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    async def expire(self, key: str, seconds: Number) -> bool:
+        if not self._alive(key):
+            return False
+        self._expires[key] = time.time() + seconds
+        return True
+
+    async def ttl(self, key: str) -> int:
+        if not self._alive(key):
+            return -2
+        expires_at = self._expires.get(key)
+        return -1 if expires_at is None else max(int(expires_at - time.time()), 0)
+
+    async def keys(self, pattern: str = "*") -> List[str]:
+        return [key for key in list(self._data) if self._alive(key) and fnmatch.fnmatchcase(key, pattern)]
+
+    async def flushall(self) -> bool:
+        self._data.clear()
+        self._expires.clear()
+        return True
+
+    # ------------------------------------------------------------------
+    # 字符串
+    # ------------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._get(key)
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ex: Optional[Number] = None,
+        px: Optional[int] = None,
+        nx: bool = False
+    ) -> Optional[bool]:
+        if nx and self._alive(key):
+            return None
+        self._data[key] = str(value)
+        self._expires.pop(key, None)
+        if ex is not None:
+            self._expires[key] = time.time() + ex
+        elif px is not None:
+            self._expires[key] = time.time() + px / 1000
+        return True
+
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return [self._get(key) for key in keys]
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        value = int(self._get(key, 0)) + amount
+        self._data[key] = str(value)
+        return value
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self.incrby(key, amount)
+
+    # ------------------------------------------------------------------
+    # 列表
+    # ------------------------------------------------------------------
+
+    async def rpush(self, key: str, *values: Any) -> int:
+        items = self._get(key)
+        if items is None:
+            items = []
+            self._data[key] = items
+        items.extend(str(value) for value in values)
+        await self._notify()
+        return len(items)
+
+    async def lrange(self, key: str, start: int, end: int) -> List[str]:
+        items = self._get(key, [])
+        end = len(items) if end == -1 else end + 1
+        return items[start:end]
+
+    async def ltrim(self, key: str, start: int, end: int) -> bool:
+        items = self._get(key)
+        if items is not None:
+            end = len(items) if end == -1 else end + 1
+            self._data[key] = items[start:end]
+        return True
+
+    async def llen(self, key: str) -> int:
+        return len(self._get(key, []))
+
+    # ------------------------------------------------------------------
+    # 有序集合
+    # ------------------------------------------------------------------
+
+    async def zadd(self, key: str, mapping: Dict[str, Number]) -> int:
+        zset = self._get(key)
+        if zset is None:
+            zset = {}
+            self._data[key] = zset
+        added = sum(1 for member in mapping if member not in zset)
+        zset.update({str(member): float(score) for member, score in mapping.items()})
+        await self._notify()
+        return added
+
+    async def zrem(self, key: str, *members: str) -> int:
+        zset = self._get(key, {})
+        return sum(1 for member in members if zset.pop(member, None) is not None)
+
+    async def zcard(self, key: str) -> int:
+        return len(self._get(key, {}))
+
+    async def zcount(self, key: str, min: Number, max: Number) -> int:
+        return sum(1 for score in self._get(key, {}).values() if min <= score <= max)
+
+    async def zpopmin(self, key: str, count: int = 1) -> List[Tuple[str, float]]:
+        zset = self._get(key, {})
+        popped = sorted(zset.items(), key=lambda item: (item[1], item[0]))[:count]
+        for member, _ in popped:
+            del zset[member]
+        return popped
+
+    async def bzpopmin(self, keys: Union[str, List[str]], timeout: Number = 0) -> Optional[Tuple[str, str, float]]:
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        deadline = None if not timeout else time.monotonic() + timeout
+        while True:
+            for key in keys:
+                popped = await self.zpopmin(key)
+                if popped:
+                    member, score = popped[0]
+                    return key, member, score
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return None
+
+    # ------------------------------------------------------------------
+    # 管道
+    # ------------------------------------------------------------------
+
+    def pipeline(self, transaction: bool = True) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+    async def aclose(self):
+        pass
+
+    async def close(self):
+        pass
+
+class LocalPipeline:
+    """批量命令管道，execute时按顺序执行并返回结果列表"""
+
+    def __init__(self, client: LocalRedis):
+        self._client = client
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if not hasattr(self._client, name):
+            raise AttributeError(name)
+
+        def queue_command(*args, **kwargs) -> "LocalPipeline":
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue_command
+
+    async def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        return [await getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+    async def __aenter__(self) -> "LocalPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._commands = []
@@ -1,10 +1,147 @@
+"""日志
+
+默认情况下处理器（控制台、滚动文件）运行在后台监听线程中，事件循环线程上的日志调用
+只负责把记录放入有界队列，磁盘写入和文件滚动不会阻塞请求。队列满时按
+log_queue_overflow 丢弃最早或最新的记录，或阻塞等待。
+
+log_format=json 时每行输出一个JSON对象，extra中的字段作为顶层键输出。
+log_sample_rates 可以对高频路径的DEBUG日志按日志记录器采样。
+请求追踪中产生的日志带有 trace_id 字段，可以与 /api/admin/traces 中的trace对应。
+"""
+
+import asyncio
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Any, List, Optional
 
 from backend.config import settings
+from backend.utils.metrics import FUNCTION_DURATION, STREAM_DURATION, STREAM_FIRST_EVENT
+from backend.utils.tracing import current_span, tracer
+
+# LogRecord的标准属性，其余属性视为extra字段
+RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """结构化JSON日志格式"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": f"{record.filename}:{record.lineno}",
+            "function": record.funcName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """按日志记录器名称前缀对DEBUG日志采样"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # 最长前缀优先匹配
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+class TraceContextFilter(logging.Filter):
+    """为追踪中的日志记录添加 trace_id 和 span_id"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_span.get()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return True
+
+class BoundedQueueHandler(QueueHandler):
+    """写入有界队列的处理器，队列满时按策略处理"""
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "drop_oldest"):
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只在调用线程中合并消息参数和异常堆栈，格式化交给监听线程
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """首次写入日志时才创建目录和打开文件，导入模块时不写磁盘"""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+# 后台日志监听器，进程退出时停止并写出剩余记录
+_listeners: Dict[str, QueueListener] = {}
+_queue_handlers: List[BoundedQueueHandler] = []
+
+def stop_logging(name: Optional[str] = None):
+    """停止后台监听线程（默认全部），写出队列中剩余的日志"""
+    for listener_name in [name] if name else list(_listeners):
+        listener = _listeners.pop(listener_name, None)
+        if listener is not None:
+            listener.stop()
+
+atexit.register(stop_logging)
+
+def get_logging_stats() -> Dict[str, Any]:
+    """异步日志队列的积压和丢弃统计"""
+    return {
+        "async": bool(_queue_handlers),
+        "queued": sum(handler.queue.qsize() for handler in _queue_handlers),
+        "dropped": sum(handler.dropped for handler in _queue_handlers),
+    }
 
 def setup_logger(
     name: str = "rightify",
@@ -12,7 +149,12 @@ def setup_logger(
     log_file: Optional[str] = None,
     max_size: int = 10 * 1024 * 1024,
     backup_count: int = 5,
-    format_string: Optional[str] = None
+    format_string: Optional[str] = None,
+    log_format: str = "text",
+    use_queue: bool = False,
+    queue_size: int = 10000,
+    overflow: str = "drop_oldest",
+    sample_rates: Optional[Dict[str, float]] = None
 ) -> logging.Logger:
     """设置日志记录器
     
@@ -23,6 +165,11 @@ def setup_logger(
         max_size: 日志文件最大大小（字节）
         backup_count: 备份文件数量
         format_string: 日志格式字符串
+        log_format: text 或 json
+        use_queue: 处理器是否在后台监听线程中运行
+        queue_size: 日志队列容量
+        overflow: 队列满时的处理策略（drop_oldest、drop_new、block）
+        sample_rates: 按日志记录器名称前缀的DEBUG日志采样率
     
     Returns:
         配置好的日志记录器
@@ -44,29 +191,42 @@ def setup_logger(
             "%(filename)s:%(lineno)d - %(funcName)s - %(message)s"
         )
     
-    formatter = logging.Formatter(format_string)
+    formatter = JsonFormatter() if log_format == "json" else logging.Formatter(format_string)
+    handlers: List[logging.Handler] = []
     
     # 控制台处理器
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(log_level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     # 文件处理器（如果指定了日志文件）
     if log_file:
-        # 确保日志目录存在
-        log_path = Path(log_file)
-        log_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        file_handler = RotatingFileHandler(
-            log_file,
-            maxBytes=max_size,
-            backupCount=backup_count,
-            encoding="utf-8"
-        )
+        file_handler = LazyRotatingFileHandler(log_file, max_size, backup_count)
         file_handler.setLevel(log_level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    sampling_filter = SamplingFilter(sample_rates) if sample_rates else None
+    trace_filter = TraceContextFilter()
+    if use_queue:
+        # 调用线程只负责入队，格式化和写入在监听线程中进行
+        # 追踪上下文保存在ContextVar中，必须在调用线程中读取
+        queue_handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size), overflow)
+        if sampling_filter:
+            queue_handler.addFilter(sampling_filter)
+        queue_handler.addFilter(trace_filter)
+        listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+        _queue_handlers.append(queue_handler)
+        logger.addHandler(queue_handler)
+    else:
+        for handler in handlers:
+            if sampling_filter:
+                handler.addFilter(sampling_filter)
+            handler.addFilter(trace_filter)
+            logger.addHandler(handler)
     
     return logger
 
@@ -76,13 +236,18 @@ logger = setup_logger(
     level=settings.log_level,
     log_file=settings.log_file,
     max_size=settings.log_max_size,
-    backup_count=settings.log_backup_count
+    backup_count=settings.log_backup_count,
+    log_format=settings.log_format,
+    use_queue=settings.log_async,
+    queue_size=settings.log_queue_size,
+    overflow=settings.log_queue_overflow,
+    sample_rates=settings.log_sample_rates
 )
 
-# 为不同模块创建专用日志记录器
-agent_logger = setup_logger("rightify.agent")
-api_logger = setup_logger("rightify.api")
-tools_logger = setup_logger("rightify.tools")
+# 模块专用日志记录器，记录传递给 rightify 的处理器输出
+agent_logger = logging.getLogger("rightify.agent")
+api_logger = logging.getLogger("rightify.api")
+tools_logger = logging.getLogger("rightify.tools")
 
 # 导出常用函数
 def get_logger(name: str) -> logging.Logger:
@@ -91,10 +256,12 @@ def get_logger(name: str) -> logging.Logger:
 
 def log_function_call(func_name: str, args: dict = None, kwargs: dict = None):
     """记录函数调用"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     args_str = f"args={args}" if args else ""
     kwargs_str = f"kwargs={kwargs}" if kwargs else ""
     params = ", ".join(filter(None, [args_str, kwargs_str]))
-    logger.debug(f"Calling {func_name}({params})")
+    logger.debug("Calling %s(%s)", func_name, params)
 
 def log_error(error: Exception, context: str = ""):
     """记录错误信息"""
@@ -104,7 +271,8 @@ def log_error(error: Exception, context: str = ""):
 def log_performance(func_name: str, duration: float, success: bool = True):
     """记录性能信息"""
     status = "SUCCESS" if success else "FAILED"
-    logger.info(f"Performance - {func_name}: {duration:.3f}s [{status}]")
+    FUNCTION_DURATION.labels("app", func_name, "success" if success else "error").observe(duration)
+    logger.info("Performance - %s: %.3fs [%s]", func_name, duration, status)
 
 # 装饰器：自动记录函数调用和性能
 def log_calls(logger_name: str = None):
@@ -119,15 +287,13 @@ def log_calls(logger_name: str = None):
             start_time = time.time()
             
             try:
-                func_logger.debug(f"Calling {func.__name__}")
+                func_logger.debug("Calling %s", func.__name__)
                 result = func(*args, **kwargs)
-                duration = time.time() - start_time
-                func_logger.debug(f"{func.__name__} completed in {duration:.3f}s")
+                func_logger.debug("%s completed in %.3fs", func.__name__, time.time() - start_time)
                 return result
             except Exception as e:
-                duration = time.time() - start_time
                 func_logger.error(
-                    f"{func.__name__} failed after {duration:.3f}s: {str(e)}",
+                    "%s failed after %.3fs: %s", func.__name__, time.time() - start_time, e,
                     exc_info=True
                 )
                 raise
@@ -137,40 +303,79 @@ def log_calls(logger_name: str = None):
 
 # 异步版本的装饰器
 def log_async_calls(logger_name: str = None):
-    """装饰器：自动记录异步函数调用和执行时间"""
+    """装饰器：自动记录异步函数调用和执行时间
+
+    执行时间同时写入指标直方图；异步生成器记录首个结果的等待时间和总时长。
+    普通异步函数在请求追踪中记录为子span。
+    """
     import functools
     import time
-    import asyncio
     import inspect
     
     def decorator(func):
+        labels = (logger_name or "app", func.__qualname__)
+        is_generator = inspect.isasyncgenfunction(func)
+        # 按状态缓存子指标，只创建实际出现过的标签组合
+        durations = {}
+        
+        def observe(status: str, duration: float):
+            child = durations.get(status)
+            if child is None:
+                child = durations[status] = (STREAM_DURATION if is_generator else FUNCTION_DURATION).labels(*labels, status)
+            child.observe(duration)
+        
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             func_logger = get_logger(logger_name) if logger_name else logger
             
             # 检查函数是否是异步生成器
-            if inspect.isasyncgenfunction(func):
-                # 对于异步生成器，直接返回生成器对象
-                func_logger.debug(f"Calling async generator {func.__name__}")
-                return func(*args, **kwargs)
+            if is_generator:
+                func_logger.debug("Calling async generator %s", func.__name__)
+                
+                async def generator_wrapper():
+                    start_time = time.perf_counter()
+                    status = "error"
+                    waiting_first = True
+                    generator = func(*args, **kwargs)
+                    try:
+                        async for item in generator:
+                            if waiting_first:
+                                STREAM_FIRST_EVENT.labels(*labels).observe(time.perf_counter() - start_time)
+                                waiting_first = False
+                            yield item
+                        status = "success"
+                    except (GeneratorExit, asyncio.CancelledError):
+                        status = "cancelled"
+                        raise
+                    finally:
+                        # 调用方提前关闭时同步关闭被包装的生成器，使其清理逻辑立即执行
+                        await generator.aclose()
+                        observe(status, time.perf_counter() - start_time)
+                return generator_wrapper()
             else:
                 # 对于普通异步函数，使用原来的逻辑
                 async def async_wrapper():
-                    start_time = time.time()
+                    start_time = time.perf_counter()
+                    status = "error"
                     try:
-                        func_logger.debug(f"Calling async {func.__name__}")
-                        result = await func(*args, **kwargs)
-                        duration = time.time() - start_time
-                        func_logger.debug(f"Async {func.__name__} completed in {duration:.3f}s")
+                        func_logger.debug("Calling async %s", func.__name__)
+                        with tracer.span(func.__qualname__, component=labels[0]):
+                            result = await func(*args, **kwargs)
+                        status = "success"
+                        func_logger.debug("Async %s completed in %.3fs", func.__name__, time.perf_counter() - start_time)
                         return result
+                    except asyncio.CancelledError:
+                        status = "cancelled"
+                        raise
                     except Exception as e:
-                        duration = time.time() - start_time
                         func_logger.error(
-                            f"Async {func.__name__} failed after {duration:.3f}s: {str(e)}",
+                            "Async %s failed after %.3fs: %s", func.__name__, time.perf_counter() - start_time, e,
                             exc_info=True
                         )
                         raise
+                    finally:
+                        observe(status, time.perf_counter() - start_time)
                 return async_wrapper()
         
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
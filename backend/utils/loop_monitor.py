@@ -0,0 +1,184 @@
+"""事件循环延迟监控
+
+所有SSE流共用一个asyncio事件循环，任何同步阻塞（大对象的json.dumps、同步文件IO、
+CPU密集的检索）都会让全部连接同时卡顿。监控由两部分组成：
+
+- 心跳协程：每 interval 秒醒来一次，实际醒来时间与预期时间之差即为循环延迟，
+  记录到指标直方图
+- 看门狗线程：心跳超过阈值没有更新时，读取事件循环线程当前的调用栈，
+  即正在阻塞循环的代码位置
+
+阻塞代码持有GIL且不释放时（如单次调用的C扩展），看门狗线程只能在阻塞结束后
+运行，此时记录到的栈可能已经不是阻塞位置，阻塞时长仍然准确。
+
+严格模式（loop_block_fail_ms）下，超过阈值的阻塞在监控停止时以 BlockingCallError
+抛出，测试中可以用来发现阻塞事件循环的处理函数。
+"""
+
+import asyncio
+import os
+import selectors
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from backend.config import settings
+from backend.utils.logger import logger
+from backend.utils.metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+# 栈采样中省略的事件循环内部帧
+INTERNAL_PATHS = (os.path.dirname(asyncio.__file__) + os.sep, selectors.__file__, threading.__file__, __file__)
+
+class BlockingCallError(RuntimeError):
+    """严格模式下事件循环被阻塞超过阈值"""
+
+    def __init__(self, stalls: List[Dict[str, Any]]):
+        self.stalls = stalls
+        worst = max(stalls, key=lambda stall: stall["blocked_ms"] or 0)
+        super().__init__(
+            f"Event loop blocked {len(stalls)} time(s), worst {worst['blocked_ms']}ms at:\n"
+            + "\n".join(worst["stack"])
+        )
+
+def sample_stack(thread_id: int, limit: int = 20) -> List[str]:
+    """读取指定线程当前的调用栈（不含事件循环内部帧）"""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return []
+    stack = [
+        f"{entry.filename}:{entry.lineno} in {entry.name}"
+        for entry in traceback.extract_stack(frame)
+        if not entry.filename.startswith(INTERNAL_PATHS)
+    ]
+    return stack[-limit:]
+
+class LoopMonitor:
+    """事件循环延迟和阻塞检测"""
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold_ms: float = 100.0,
+        max_samples: int = 50,
+        fail_ms: Optional[float] = None
+    ):
+        self.interval = interval
+        # 严格模式的阈值低于告警阈值时按严格阈值检测
+        self.threshold = min(threshold_ms, fail_ms if fail_ms is not None else threshold_ms) / 1000
+        self.fail_ms = fail_ms
+        self.samples: deque = deque(maxlen=max_samples)
+        self.stats = {"ticks": 0, "stalls": 0, "max_lag_ms": 0.0, "last_lag_ms": 0.0, "total_lag_ms": 0.0}
+        self.violations: List[Dict[str, Any]] = []
+        self._last_tick = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id = 0
+        # 看门狗线程为当前这次阻塞记录的采样
+        self._pending_sample: Optional[Dict[str, Any]] = None
+        self._lag = EVENT_LOOP_LAG.labels()
+        self._stall_counter = EVENT_LOOP_STALLS.labels()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在当前事件循环中启动监控"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        """停止监控；严格模式下有超过阈值的阻塞时抛出 BlockingCallError"""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+        if self.violations:
+            violations, self.violations = self.violations, []
+            raise BlockingCallError(violations)
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._last_tick = now
+            self._record(lag)
+
+    def _record(self, lag: float):
+        lag_ms = round(lag * 1000, 3)
+        stats = self.stats
+        stats["ticks"] += 1
+        stats["last_lag_ms"] = lag_ms
+        stats["total_lag_ms"] += lag_ms
+        stats["max_lag_ms"] = max(stats["max_lag_ms"], lag_ms)
+        self._lag.observe(lag)
+        if lag < self.threshold:
+            self._pending_sample = None
+            return
+
+        stats["stalls"] += 1
+        self._stall_counter.inc()
+        sample = self._pending_sample
+        self._pending_sample = None
+        if sample is None:
+            # 看门狗没有来得及采样（阻塞期间一直持有GIL）
+            sample = {"detected_at": time.time(), "stack": []}
+        sample["blocked_ms"] = lag_ms
+        self.samples.append(sample)
+        logger.warning(
+            "Event loop blocked for %.1fms%s", lag_ms,
+            (" at " + sample["stack"][-1]) if sample["stack"] else ""
+        )
+        if self.fail_ms is not None and lag_ms >= self.fail_ms:
+            self.violations.append(sample)
+
+    def _watch(self):
+        poll = min(self.threshold / 4, 0.05)
+        sampled_tick = None
+        while not self._stopped.wait(poll):
+            last_tick = self._last_tick
+            if last_tick == sampled_tick:
+                continue
+            if time.monotonic() - last_tick > self.interval + self.threshold:
+                # 同一次阻塞只采样一次
+                sampled_tick = last_tick
+                self._pending_sample = {
+                    "detected_at": time.time(),
+                    "stack": sample_stack(self._loop_thread_id),
+                }
+
+    def metrics(self) -> Dict[str, Any]:
+        stats = self.stats
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            **stats,
+            "total_lag_ms": round(stats["total_lag_ms"], 3),
+            "avg_lag_ms": round(stats["total_lag_ms"] / stats["ticks"], 3) if stats["ticks"] else 0.0,
+            "recent_stalls": list(self.samples)[-10:],
+        }
+
+def create_loop_monitor() -> LoopMonitor:
+    return LoopMonitor(
+        interval=settings.loop_monitor_interval,
+        threshold_ms=settings.loop_block_threshold_ms,
+        max_samples=settings.loop_block_samples,
+        fail_ms=settings.loop_block_fail_ms
+    )
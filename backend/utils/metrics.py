@@ -0,0 +1,240 @@
+"""进程内指标
+
+固定分桶的直方图和计数器，以Prometheus文本格式导出（GET /metrics）。
+记录一次观测只需要一次二分查找和几次加法；调用方应在模块加载或装饰时通过
+labels() 取得子指标并缓存，避免在热路径上重复查找标签。
+
+队列深度、缓存命中率等已有统计不在热路径上重复计数，而是通过
+register_collector 注册的回调在导出时读取。
+"""
+
+import functools
+import inspect
+import math
+import time
+from bisect import bisect_left
+from typing import Dict, Any, Callable, List, Sequence, Tuple
+
+# 默认延迟分桶（秒），覆盖本地工具到LLM调用的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 回调导出的指标：(名称, 类型, 说明, [(标签, 值), ...])
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class _Metric:
+    kind = ""
+    child_class: Any = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values: str):
+        """按标签值取得子指标（同一组标签值始终返回同一个对象）"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _labels_dict(self, values: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._children.items():
+            lines.append(f"{self.name}{_format_labels(self._labels_dict(values))} {_format_value(child.value)}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+    child_class = _CounterChild
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+class Gauge(_Metric):
+    kind = "gauge"
+    child_class = _GaugeChild
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._children.items():
+            labels = self._labels_dict(values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Any]] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Any]):
+        """注册导出时调用的回调，返回（或异步返回）MetricFamily列表"""
+        self._collectors.append(collector)
+
+    async def render(self) -> str:
+        """Prometheus文本格式（0.0.4）"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            families = collector()
+            if inspect.isawaitable(families):
+                families = await families
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+FUNCTION_DURATION = registry.histogram(
+    "rightify_function_duration_seconds", "Duration of instrumented async functions",
+    ("component", "function", "status")
+)
+STREAM_FIRST_EVENT = registry.histogram(
+    "rightify_stream_first_event_seconds", "Time until an async generator yields its first item",
+    ("component", "function")
+)
+STREAM_DURATION = registry.histogram(
+    "rightify_stream_duration_seconds", "Total lifetime of an async generator",
+    ("component", "function", "status")
+)
+GRAPH_NODE_DURATION = registry.histogram(
+    "rightify_graph_node_duration_seconds", "Duration of agent graph nodes", ("node", "status")
+)
+LLM_REQUEST_DURATION = registry.histogram(
+    "rightify_llm_request_duration_seconds", "Duration of upstream LLM calls", ("tier", "status")
+)
+LLM_QUEUE_WAIT = registry.histogram(
+    "rightify_llm_queue_wait_seconds", "Time spent waiting for the process-wide LLM concurrency limit"
+)
+LLM_TOKENS = registry.counter("rightify_llm_tokens_total", "LLM tokens consumed", ("kind",))
+EVENT_LOOP_LAG = registry.histogram(
+    "rightify_event_loop_lag_seconds", "Delay between scheduled and actual event loop heartbeats",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+EVENT_LOOP_STALLS = registry.counter(
+    "rightify_event_loop_stalls_total", "Heartbeats delayed beyond the blocking threshold"
+)
+
+def timed(histogram: Histogram, *label_values: str) -> Callable:
+    """异步函数计时装饰器，最后一个标签为 status（success/error/cancelled）"""
+    children: Dict[str, _HistogramChild] = {}
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = "error"
+            try:
+                result = await func(*args, **kwargs)
+                status = "success"
+                return result
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    status = "cancelled"
+                raise
+            finally:
+                child = children.get(status)
+                if child is None:
+                    child = children[status] = histogram.labels(*label_values, status)
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
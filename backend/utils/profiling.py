@@ -0,0 +1,264 @@
+"""按请求采样分析
+
+/api/legal/* 请求带有 X-Profile: 1 请求头或 ?profile=1 参数以及与 admin_token 相同的
+X-Admin-Token 请求头时（未配置 admin_token 时拒绝分析请求），对这一个请求采样分析，结果以折叠栈格式保存到磁盘，可直接用于
+flamegraph.pl / speedscope：
+
+    curl -H "X-Profile: 1" ... /api/legal/consult       # 响应头 X-Profile-ID
+    curl /api/admin/profiles/<id> > profile.folded
+
+采样线程每隔 profile_interval_ms 读取一次事件循环线程的调用栈，只有当栈中包含属于该
+请求的任务（请求本身以及在它内部创建的任务，包括图执行、工具调用和投机执行）的
+协程帧时才计入，同时进行的其他请求不会混入结果。任务归属通过临时安装的任务工厂
+记录，没有请求被分析时不安装任务工厂也不启动采样线程，没有额外开销。
+
+采样只能看到在事件循环线程上运行的代码（CPU耗时），等待LLM和IO的时间见请求追踪。
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from urllib.parse import parse_qs
+
+from starlette.responses import JSONResponse
+
+from backend.config import settings
+from backend.utils.logger import logger
+from backend.utils.tracing import current_trace_id
+
+class ProfileSession:
+    """一个被分析请求的任务集合和采样结果"""
+
+    def __init__(self, profile_id: str, name: str):
+        self.profile_id = profile_id
+        self.name = name
+        self.tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = 0.0
+
+    def task_frames(self) -> set:
+        """当前属于该请求的任务的最外层协程帧"""
+        frames = set()
+        for task in list(self.tasks):
+            coro = task.get_coro()
+            frame = getattr(coro, "cr_frame", None)
+            if frame is not None:
+                frames.add(frame)
+        return frames
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "profile_id": self.profile_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "interval_ms": settings.profile_interval_ms,
+            "unique_stacks": len(self.stacks),
+        }
+
+    def collapsed(self) -> str:
+        """折叠栈格式：每行 "帧1;帧2;... 次数"，根帧在前"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+# 创建任务时所在请求的分析会话，由任务工厂读取
+profile_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    for marker in ("/site-packages/", "/backend/"):
+        index = filename.rfind(marker)
+        if index >= 0:
+            filename = filename[index + 1:]
+            break
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+class RequestProfiler:
+    """管理分析会话、任务工厂和采样线程"""
+
+    def __init__(self, interval_ms: float = 5.0, max_stack_depth: int = 128):
+        self.interval = interval_ms / 1000
+        self.max_stack_depth = max_stack_depth
+        self.sessions: List[ProfileSession] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+        self._previous_factory: Any = None
+        self._sampler: Optional[threading.Thread] = None
+        # 每个采样线程使用自己的停止事件，紧接着开始的新分析不会让未退出的旧线程继续采样
+        self._stopped: Optional[threading.Event] = None
+
+    def _task_factory(self, loop: asyncio.AbstractEventLoop, coro: Any, **kwargs) -> asyncio.Task:
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        session = profile_session.get()
+        if session is not None:
+            session.tasks.add(task)
+        return task
+
+    def start(self, name: str, profile_id: Optional[str] = None) -> ProfileSession:
+        """开始分析当前任务，返回会话（调用方负责设置 profile_session 和调用 stop）"""
+        session = ProfileSession(profile_id or uuid.uuid4().hex, name)
+        session.tasks.add(asyncio.current_task())
+        if not self.sessions:
+            loop = asyncio.get_running_loop()
+            self._loop = loop
+            self._loop_thread_id = threading.get_ident()
+            self._previous_factory = loop.get_task_factory()
+            loop.set_task_factory(self._task_factory)
+            self._stopped = threading.Event()
+            self._sampler = threading.Thread(
+                target=self._sample_loop, args=(self._stopped,), name="request-profiler", daemon=True
+            )
+            self._sampler.start()
+        self.sessions.append(session)
+        return session
+
+    def stop(self, session: ProfileSession):
+        session.finish()
+        self.sessions.remove(session)
+        if not self.sessions:
+            # 最后一个会话结束后恢复原任务工厂并停止采样
+            self._loop.set_task_factory(self._previous_factory)
+            self._previous_factory = None
+            self._stopped.set()
+            self._stopped = None
+            self._sampler = None
+
+    def _sample_loop(self, stopped: threading.Event):
+        while not stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_stack_depth:
+                stack.append(frame)
+                frame = frame.f_back
+            stack_frames = set(stack)
+            for session in list(self.sessions):
+                try:
+                    roots = session.task_frames() & stack_frames
+                except RuntimeError:
+                    # 事件循环线程正在向任务集合添加任务，跳过这次采样
+                    continue
+                if not roots:
+                    continue
+                # 从任务的最外层协程帧开始记录，省略事件循环内部帧
+                depth = max(index for index, frame in enumerate(stack) if frame in roots)
+                session.stacks[";".join(_frame_label(frame) for frame in reversed(stack[:depth + 1]))] += 1
+                session.samples += 1
+
+class ProfileStore:
+    """磁盘上的分析结果，保留最近 max_profiles 个"""
+
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+
+    def _save(self, session: ProfileSession):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{session.profile_id}.folded").write_text(session.collapsed(), encoding="utf-8")
+        (self.directory / f"{session.profile_id}.json").write_text(
+            json.dumps(session.metadata(), ensure_ascii=False), encoding="utf-8"
+        )
+        metadata_files = sorted(self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        for path in metadata_files[:-self.max_profiles]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".folded").unlink(missing_ok=True)
+
+    async def save(self, session: ProfileSession):
+        await asyncio.to_thread(self._save, session)
+
+    def _list(self) -> List[Dict[str, Any]]:
+        if not self.directory.exists():
+            return []
+        profiles = [json.loads(path.read_text(encoding="utf-8")) for path in self.directory.glob("*.json")]
+        return sorted(profiles, key=lambda profile: profile["started_at"], reverse=True)
+
+    async def list(self) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._list)
+
+    def _get(self, profile_id: str) -> Optional[str]:
+        path = self.directory / f"{profile_id}.folded"
+        if not profile_id.isalnum() or not path.exists():
+            return None
+        return path.read_text(encoding="utf-8")
+
+    async def get(self, profile_id: str) -> Optional[str]:
+        """折叠栈文本，不存在时返回None"""
+        return await asyncio.to_thread(self._get, profile_id)
+
+profiler = RequestProfiler(interval_ms=settings.profile_interval_ms)
+profile_store = ProfileStore(settings.profile_dir, max_profiles=settings.profile_max_files)
+
+def profiling_requested(scope: Dict[str, Any], headers: Dict[bytes, bytes]) -> bool:
+    if headers.get(b"x-profile", b"").lower() in (b"1", b"true"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [""])[-1].lower() in ("1", "true")
+
+class ProfilingMiddleware:
+    """按请求启用采样分析（ASGI中间件），响应头返回 X-Profile-ID"""
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.prefix = f"{settings.api_prefix}/legal/"
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        if (
+            scope["type"] != "http"
+            or not settings.enable_profiling
+            or not scope["path"].startswith(self.prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if not profiling_requested(scope, headers):
+            await self.app(scope, receive, send)
+            return
+        # 分析会启动采样线程并写入磁盘，只允许管理员使用；未配置 admin_token 时一律拒绝
+        if not settings.admin_token or headers.get(b"x-admin-token", b"").decode("latin-1") != settings.admin_token:
+            await JSONResponse({"detail": "Admin token required for profiling"}, status_code=403)(scope, receive, send)
+            return
+        if len(profiler.sessions) >= settings.profile_max_concurrent:
+            logger.warning(f"Profiling skipped for {scope['path']}: {len(profiler.sessions)} profiles in progress")
+            await self.app(scope, receive, send)
+            return
+
+        session = profiler.start(f"{scope['method']} {scope['path']}", profile_id=current_trace_id())
+        token = profile_session.set(session)
+
+        async def send_with_profile(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", session.profile_id.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profile_session.reset(token)
+            profiler.stop(session)
+            logger.info(
+                f"Profiled {session.name} in {session.duration_ms:.1f}ms "
+                f"({session.samples} samples, id {session.profile_id})"
+            )
+            await profile_store.save(session)
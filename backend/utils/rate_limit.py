@@ -0,0 +1,158 @@
+"""按客户端限流
+
+- 请求速率：每个客户端（API Key 或 IP）在滑动窗口内的请求数，超出时返回 429
+- LLM token 额度：每次 LLM 调用后按实际的 prompt/completion token 扣减，
+  超出额度的请求不会被拒绝，而是降级为缓存结果或低成本模型
+
+滑动窗口使用“上一固定窗口按比例加权 + 当前固定窗口”的近似算法，每次检查
+只需读取两个计数器、写入一个计数器。计数器存放在共享状态层中：进程内实现
+与结果缓存分开保存、按TTL过期，Redis实现同样按TTL过期，多个worker共享同一额度。
+"""
+
+import hashlib
+import json
+import math
+import time
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Tuple
+
+from backend.config import settings
+from backend.utils.logger import logger
+from backend.utils.shared_state import SharedState, get_shared_state
+
+# 当前请求的客户端标识和是否处于降级模式，由中间件设置（异步任务由 JobManager 恢复），LLM调用时读取
+current_client: ContextVar[Optional[str]] = ContextVar("current_client", default=None)
+llm_degraded: ContextVar[bool] = ContextVar("llm_degraded", default=False)
+
+class SlidingWindowLimiter:
+    """基于共享计数器的滑动窗口限流器"""
+
+    def __init__(self, name: str, limit: int, window: float, state: Optional[SharedState] = None):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self._state = state
+
+    @property
+    def state(self) -> SharedState:
+        return self._state or get_shared_state()
+
+    def _keys(self, client: str, now: float) -> Tuple[str, str, float]:
+        index = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+        return f"rl:{self.name}:{client}:{index - 1}", f"rl:{self.name}:{client}:{index}", elapsed
+
+    async def usage(self, client: str, now: Optional[float] = None) -> float:
+        """当前滑动窗口内的估算用量"""
+        previous_key, current_key, elapsed = self._keys(client, now or time.time())
+        previous, current = await self.state.get_many([previous_key, current_key])
+        return (previous or 0) * (1 - elapsed) + (current or 0)
+
+    async def hit(self, client: str, cost: int = 1, now: Optional[float] = None) -> Tuple[bool, int]:
+        """检查并计入一次用量，返回 (是否允许, 建议重试秒数)"""
+        now = now or time.time()
+        if await self.usage(client, now) + cost > self.limit:
+            return False, max(1, math.ceil(self.window - now % self.window))
+        await self.add(client, cost, now)
+        return True, 0
+
+    async def add(self, client: str, amount: int, now: Optional[float] = None):
+        """无条件计入用量（用于事后扣减token）"""
+        _, current_key, _ = self._keys(client, now or time.time())
+        await self.state.incr(current_key, amount, ttl=self.window * 2)
+
+    async def exceeded(self, client: str) -> bool:
+        return await self.usage(client) >= self.limit
+
+_request_limiter: Optional[SlidingWindowLimiter] = None
+_token_budget: Optional[SlidingWindowLimiter] = None
+
+def get_request_limiter() -> SlidingWindowLimiter:
+    global _request_limiter
+    if _request_limiter is None:
+        _request_limiter = SlidingWindowLimiter("req", settings.rate_limit_requests, settings.rate_limit_window)
+    return _request_limiter
+
+def get_token_budget() -> SlidingWindowLimiter:
+    global _token_budget
+    if _token_budget is None:
+        _token_budget = SlidingWindowLimiter("tok", settings.llm_token_budget, settings.llm_token_window)
+    return _token_budget
+
+async def debit_tokens(prompt_tokens: int, completion_tokens: int):
+    """按当前请求的客户端扣减LLM token额度"""
+    client = current_client.get()
+    total = prompt_tokens + completion_tokens
+    if client is None or total <= 0 or not settings.enable_rate_limit:
+        return
+    try:
+        await get_token_budget().add(client, total)
+    except Exception as e:
+        logger.warning(f"Failed to debit LLM tokens for {client}: {e}")
+
+def client_identity(headers: Dict[str, str], client_host: Optional[str]) -> str:
+    """从请求中提取客户端标识：优先使用API Key（只保存摘要），否则使用IP"""
+    api_key = headers.get("x-api-key")
+    authorization = headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    if api_key:
+        return "key:" + hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:16]
+    return f"ip:{client_host or 'unknown'}"
+
+class RateLimitMiddleware:
+    """请求速率限制和LLM token额度检查（ASGI中间件）"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        if (
+            scope["type"] != "http" or
+            not settings.enable_rate_limit or
+            not scope["path"].startswith(settings.api_prefix) or
+            scope["path"] in settings.rate_limit_exempt_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        client = client_identity(headers, scope["client"][0] if scope.get("client") else None)
+
+        try:
+            allowed, retry_after = await get_request_limiter().hit(client)
+            degraded = await get_token_budget().exceeded(client)
+        except Exception as e:
+            # 限流存储不可用时放行，避免影响正常服务
+            logger.warning(f"Rate limit check failed: {e}")
+            allowed, retry_after, degraded = True, 0, False
+
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for {client}")
+            await self._reject(send, retry_after)
+            return
+
+        if degraded:
+            logger.info(f"LLM token budget exhausted for {client}, serving degraded answers")
+
+        client_token = current_client.set(client)
+        degraded_token = llm_degraded.set(degraded)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_client.reset(client_token)
+            llm_degraded.reset(degraded_token)
+
+    @staticmethod
+    async def _reject(send: Any, retry_after: int):
+        body = json.dumps({"detail": "Too many requests, please retry later"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
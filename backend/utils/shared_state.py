@@ -0,0 +1,355 @@
+"""共享状态层
+
+为缓存、会话记忆、single-flight锁和限流计数器提供统一接口：
+- InMemorySharedState：单进程实现，值以Python对象保存，无序列化开销
+- RedisSharedState：多worker共享实现，批量操作使用pipeline，
+  测试中可以用 LocalRedis 替换真实的Redis客户端
+
+多个uvicorn/gunicorn worker配置同一个 redis_url 后即可共享缓存和会话，
+相同输入的LLM工作只会在一个worker中执行一次。
+"""
+
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+
+from backend.config import settings
+from backend.utils.logger import logger
+from backend.utils.tracing import annotate
+
+CACHE_PREFIX = "sf:result:"
+
+# 非缓存状态超出上限时清理到的比例
+DURABLE_LOW_WATER = 0.9
+
+class SharedState(ABC):
+    """共享状态接口"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"cache_hits": 0, "cache_misses": 0, "single_flight_joins": 0}
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_many(self, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """计数器自增，首次创建时设置过期时间"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def incr_many(self, increments: Dict[str, int], ttl: Optional[float] = None) -> List[int]:
+        """批量自增多个计数器"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _try_lock(self, key: str, token: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _unlock(self, key: str, token: str):
+        raise NotImplementedError
+
+    async def single_flight(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        ttl: float,
+        should_cache: Optional[Callable[[Any], bool]] = None,
+        wait_timeout: Optional[float] = None
+    ) -> Any:
+        """相同key的计算在所有worker中只执行一次，结果缓存ttl秒
+
+        - 结果已缓存时直接返回
+        - 本进程内已有相同key在计算时等待其结果
+        - 其他worker持有锁时轮询等待其写入结果，超时后自行计算
+        """
+        cache_key = f"{CACHE_PREFIX}{key}"
+        cached = await self.get(cache_key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            annotate(cache="hit")
+            return cached
+        self.stats["cache_misses"] += 1
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["single_flight_joins"] += 1
+            annotate(cache="join")
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                # 发起计算的请求被取消，由当前请求重新计算
+                return await self.single_flight(key, factory, ttl, should_cache, wait_timeout)
+
+        annotate(cache="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._compute_once(
+                key, cache_key, factory, ttl, should_cache,
+                wait_timeout or settings.single_flight_timeout
+            )
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _compute_once(
+        self,
+        key: str,
+        cache_key: str,
+        factory: Callable[[], Awaitable[Any]],
+        ttl: float,
+        should_cache: Optional[Callable[[Any], bool]],
+        wait_timeout: float
+    ) -> Any:
+        lock_key = f"sf:lock:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait_timeout
+        while not await self._try_lock(lock_key, token, wait_timeout):
+            # 其他worker正在计算，等待结果
+            await asyncio.sleep(0.05)
+            cached = await self.get(cache_key)
+            if cached is not None:
+                self.stats["single_flight_joins"] += 1
+                annotate(cache="join")
+                return cached
+            if time.monotonic() > deadline:
+                logger.warning(f"Single-flight wait timed out for {key}, computing locally")
+                return await factory()
+
+        try:
+            result = await factory()
+            if result is not None and (should_cache is None or should_cache(result)):
+                await self.set(cache_key, result, ttl)
+            return result
+        finally:
+            await self._unlock(lock_key, token)
+
+    async def close(self):
+        pass
+
+class InMemorySharedState(SharedState):
+    """进程内共享状态
+
+    single-flight结果缓存（sf:result: 前缀）容量有界，按LRU淘汰；限流计数器、
+    会话快照和执行结果等其余状态单独保存，只按TTL过期，不会因缓存写入过多被挤出。
+    后者超过 max_durable_entries 时先清理过期条目，仍然超出容量的90%时淘汰最早写入的条目。
+
+    值按引用保存，调用方应将取出的对象视为只读。
+    """
+
+    def __init__(self, max_entries: int = 10000, max_durable_entries: int = 100000):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_durable_entries = max_durable_entries
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._durable: Dict[str, Tuple[Any, Optional[float]]] = {}
+
+    def _bucket(self, key: str) -> Dict[str, Tuple[Any, Optional[float]]]:
+        return self._data if key.startswith(CACHE_PREFIX) else self._durable
+
+    def _lookup(self, key: str) -> Optional[Any]:
+        bucket = self._bucket(key)
+        entry = bucket.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del bucket[key]
+            return None
+        if bucket is self._data:
+            self._data.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value: Any, ttl: Optional[float]):
+        entry = (value, time.time() + ttl if ttl else None)
+        if key.startswith(CACHE_PREFIX):
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            return
+        self._durable.pop(key, None)
+        self._durable[key] = entry
+        if len(self._durable) > self.max_durable_entries:
+            self._trim_durable()
+
+    def _trim_durable(self):
+        """一次清理到容量的90%，之后的写入不需要每次扫描全部条目（均摊O(1)）"""
+        low_water = int(self.max_durable_entries * DURABLE_LOW_WATER)
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self._durable.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._durable[key]
+        overflow = len(self._durable) - low_water
+        if overflow > 0:
+            logger.warning(f"In-memory shared state over {self.max_durable_entries} entries, dropping {overflow} oldest")
+            for key in list(itertools.islice(self._durable, overflow)):
+                del self._durable[key]
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._lookup(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._store(key, value, ttl)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return [self._lookup(key) for key in keys]
+
+    async def set_many(self, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        for key, value in mapping.items():
+            self._store(key, value, ttl)
+
+    async def delete(self, key: str):
+        self._bucket(key).pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        bucket = self._bucket(key)
+        entry = bucket.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > time.time()):
+            value = entry[0] + amount
+            bucket[key] = (value, entry[1])
+            return value
+        self._store(key, amount, ttl)
+        return amount
+
+    async def incr_many(self, increments: Dict[str, int], ttl: Optional[float] = None) -> List[int]:
+        return [await self.incr(key, amount, ttl) for key, amount in increments.items()]
+
+    async def _try_lock(self, key: str, token: str, ttl: float) -> bool:
+        # 单进程内的去重已由 _inflight 完成
+        return True
+
+    async def _unlock(self, key: str, token: str):
+        pass
+
+class RedisSharedState(SharedState):
+    """基于Redis的共享状态，值以JSON保存"""
+
+    def __init__(self, client: Any, prefix: str = "rightify"):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    @staticmethod
+    def _dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _loads(raw: Optional[str]) -> Optional[Any]:
+        return json.loads(raw) if raw is not None else None
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._loads(await self.client.get(self._key(key)))
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.client.set(self._key(key), self._dumps(value), ex=int(ttl) if ttl else None)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        raw_values = await self.client.mget([self._key(key) for key in keys])
+        return [self._loads(raw) for raw in raw_values]
+
+    async def set_many(self, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        if not mapping:
+            return
+        pipe = self.client.pipeline()
+        for key, value in mapping.items():
+            pipe.set(self._key(key), self._dumps(value), ex=int(ttl) if ttl else None)
+        await pipe.execute()
+
+    async def delete(self, key: str):
+        await self.client.delete(self._key(key))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return (await self.incr_many({key: amount}, ttl))[0]
+
+    async def incr_many(self, increments: Dict[str, int], ttl: Optional[float] = None) -> List[int]:
+        pipe = self.client.pipeline()
+        for key, amount in increments.items():
+            pipe.incrby(self._key(key), amount)
+            if ttl:
+                pipe.expire(self._key(key), int(ttl))
+        results = await pipe.execute()
+        step = 2 if ttl else 1
+        return [int(value) for value in results[::step]]
+
+    async def _try_lock(self, key: str, token: str, ttl: float) -> bool:
+        return bool(await self.client.set(self._key(key), token, px=int(ttl * 1000), nx=True))
+
+    async def _unlock(self, key: str, token: str):
+        # 只释放自己持有的锁；锁本身带有过期时间，极端情况下的竞争由TTL兜底
+        if await self.client.get(self._key(key)) == token:
+            await self.client.delete(self._key(key))
+
+    async def close(self):
+        await self.client.aclose()
+
+def create_redis_client(redis_url: str) -> Optional[Any]:
+    """创建Redis客户端，未安装redis包时返回None"""
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        logger.warning("redis package not installed, falling back to in-process state")
+        return None
+    return redis.from_url(redis_url, decode_responses=True)
+
+_shared_state: Optional[SharedState] = None
+
+def get_shared_state() -> SharedState:
+    """获取进程级共享状态实例（首次调用时按配置创建）"""
+    global _shared_state
+    if _shared_state is None:
+        client = create_redis_client(settings.redis_url) if settings.redis_url else None
+        if client is not None:
+            logger.info("Using Redis shared state")
+            _shared_state = RedisSharedState(client, prefix=settings.shared_state_prefix)
+        else:
+            _shared_state = InMemorySharedState(
+                max_entries=settings.shared_state_max_entries,
+                max_durable_entries=settings.shared_state_max_durable_entries
+            )
+    return _shared_state
+
+def set_shared_state(state: Optional[SharedState]):
+    """替换进程级共享状态实例（用于测试）"""
+    global _shared_state
+    _shared_state = state
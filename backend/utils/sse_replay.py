@@ -0,0 +1,198 @@
+"""SSE事件回放
+
+每次咨询在后台任务中运行，产生的事件带有单调递增的ID并写入有界回放缓冲区。
+客户端断线后可携带 Last-Event-ID 重新连接，只会收到错过的事件，
+不会重新触发整个咨询流程。
+
+缓冲区保存原始事件，订阅时按客户端协商的格式编码（见 event_codec）。
+客户端错过的事件已被挤出缓冲区时，先收到一个 reset 事件（data中为丢失的事件ID范围），
+客户端据此决定是否通过结果接口重新获取完整结果。
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from collections import OrderedDict, deque
+from typing import Dict, Any, AsyncGenerator, AsyncIterator, Deque, Optional, Tuple
+
+from backend.utils.event_codec import EventEncoder
+from backend.utils.logger import logger
+
+# (事件ID, 事件)
+BufferedEvent = Tuple[int, Dict[str, Any]]
+
+class ConsultationRun:
+    """一次咨询的事件流和回放缓冲区"""
+
+    def __init__(self, run_id: str, buffer_size: int = 512):
+        self.run_id = run_id
+        self.events: Deque[BufferedEvent] = deque(maxlen=buffer_size)
+        self.next_id = 1
+        self.done = False
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._condition = asyncio.Condition()
+
+    @property
+    def last_event_id(self) -> int:
+        return self.next_id - 1
+
+    async def append(self, event: Dict[str, Any]) -> int:
+        """追加事件并唤醒所有订阅者"""
+        event_id = self.next_id
+        self.next_id += 1
+        self.events.append((event_id, event))
+        async with self._condition:
+            self._condition.notify_all()
+        return event_id
+
+    async def finish(self):
+        self.done = True
+        self.finished_at = time.time()
+        async with self._condition:
+            self._condition.notify_all()
+
+    async def subscribe(
+        self, last_event_id: int = 0, encoder: Optional[EventEncoder] = None
+    ) -> AsyncGenerator[Tuple[int, str], None]:
+        """从 last_event_id 之后开始订阅事件，直到咨询结束，返回 (事件ID, 编码后的数据)"""
+        encoder = encoder or EventEncoder()
+        self.subscribers += 1
+        try:
+            cursor = last_event_id
+            while True:
+                pending = [item for item in self.events if item[0] > cursor]
+                if pending and pending[0][0] > cursor + 1:
+                    # 缓冲区已经丢弃了 cursor 之后的部分事件，通知客户端存在缺口
+                    gap_end = pending[0][0] - 1
+                    yield gap_end, encoder.encode({
+                        "type": "reset",
+                        "content": "部分事件已过期，无法回放",
+                        "data": {"missed_from": cursor + 1, "missed_to": gap_end},
+                        "timestamp": datetime.now().isoformat()
+                    })
+                for event_id, event in pending:
+                    cursor = event_id
+                    yield event_id, encoder.encode(event)
+
+                if self.done and cursor >= self.last_event_id:
+                    return
+
+                async with self._condition:
+                    if cursor >= self.last_event_id and not self.done:
+                        await self._condition.wait()
+        finally:
+            self.subscribers -= 1
+
+class ConsultationRunRegistry:
+    """进程内咨询运行注册表
+
+    - 正在运行的咨询始终保留
+    - 已结束的咨询在TTL内保留回放缓冲区，超出数量上限时优先淘汰最早结束的
+    - 过期的咨询在创建新咨询时清理，start_sweeper 启动后也由后台任务定期清理
+    """
+
+    def __init__(self, max_runs: int = 1000, buffer_size: int = 512, finished_ttl: int = 600):
+        self.max_runs = max_runs
+        self.buffer_size = buffer_size
+        self.finished_ttl = finished_ttl
+        self._runs: "OrderedDict[str, ConsultationRun]" = OrderedDict()
+        # 按事件格式统计已结束的SSE订阅
+        self._encoding: Dict[str, Dict[str, float]] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def get(self, run_id: str) -> Optional[ConsultationRun]:
+        return self._runs.get(run_id)
+
+    def start(self, run_id: str, source: AsyncIterator[Dict[str, Any]]) -> ConsultationRun:
+        """在后台任务中消费事件源，事件写入回放缓冲区"""
+        self._cleanup()
+        run = ConsultationRun(run_id, self.buffer_size)
+        self._runs[run_id] = run
+        run.task = asyncio.create_task(self._pump(run, source))
+        return run
+
+    async def _pump(self, run: ConsultationRun, source: AsyncIterator[Dict[str, Any]]):
+        try:
+            async for event in source:
+                await run.append(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Consultation run {run.run_id} failed: {e}")
+            await run.append({
+                "type": "error",
+                "content": "处理咨询时发生错误，请稍后重试",
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            await run.finish()
+
+    def start_sweeper(self, interval: float = 60.0):
+        """启动定期清理已过期咨询的后台任务"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep(interval), name="sse-run-sweeper")
+
+    async def _sweep(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self._cleanup()
+
+    def _cleanup(self):
+        now = time.time()
+        expired = [
+            run_id for run_id, run in self._runs.items()
+            if run.done and now - run.finished_at > self.finished_ttl
+        ]
+        for run_id in expired:
+            del self._runs[run_id]
+
+        if len(self._runs) >= self.max_runs:
+            finished = sorted(
+                (run for run in self._runs.values() if run.done),
+                key=lambda run: run.finished_at
+            )
+            for run in finished[:len(self._runs) - self.max_runs + 1]:
+                del self._runs[run.run_id]
+
+    def record_stream(self, encoder: EventEncoder):
+        """记录一次订阅的编码统计"""
+        totals = self._encoding.setdefault(
+            encoder.format, {"streams": 0, "events": 0, "chars": 0, "encode_seconds": 0.0}
+        )
+        totals["streams"] += 1
+        totals["events"] += encoder.events
+        totals["chars"] += encoder.chars
+        totals["encode_seconds"] += encoder.encode_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        running = sum(1 for run in self._runs.values() if not run.done)
+        return {
+            "runs": len(self._runs),
+            "running": running,
+            "subscribers": sum(run.subscribers for run in self._runs.values()),
+            "encoding": {
+                event_format: {
+                    "streams": totals["streams"],
+                    "events": totals["events"],
+                    "chars": totals["chars"],
+                    "chars_per_stream": round(totals["chars"] / totals["streams"], 1),
+                    "encode_ms_per_stream": round(totals["encode_seconds"] * 1000 / totals["streams"], 3),
+                }
+                for event_format, totals in self._encoding.items()
+            },
+        }
+
+    async def shutdown(self):
+        """停止定期清理，取消所有仍在运行的咨询"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        tasks = [run.task for run in self._runs.values() if run.task and not run.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
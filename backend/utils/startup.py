@@ -0,0 +1,74 @@
+"""启动耗时报告
+
+按阶段记录进程启动的耗时，应用就绪后写入日志，并在 /api/agent/status 和
+/metrics（rightify_startup_seconds）中导出：
+
+- 里程碑（自进程启动以来的秒数）：imported（backend.main 导入完成）、
+  serving（启动事件完成，开始处理请求）、agent_ready（Agent在后台初始化完成）
+- 阶段耗时（秒）：import.main、config、agent.import、agent.llm、agent.tools 等
+
+进程启动时间读取 /proc/self/stat，不可用时（非Linux）以本模块的导入时间为起点。
+本模块只依赖标准库，在 backend.main 中最先导入。
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+_logger = logging.getLogger("rightify.startup")
+
+def process_age() -> Optional[float]:
+    """当前进程已运行的秒数（Linux），无法读取时返回None"""
+    try:
+        with open("/proc/self/stat", encoding="utf-8") as f:
+            # 进程名可能包含空格，从最后一个右括号之后开始按字段拆分（第22个字段为启动时刻）
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", encoding="utf-8") as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class StartupReport:
+    """启动阶段耗时和里程碑"""
+
+    def __init__(self):
+        age = process_age()
+        # 以 perf_counter 表示的进程启动时刻
+        self.origin = time.perf_counter() - (age or 0.0)
+        self.origin_source = "proc" if age is not None else "module_import"
+        self.phases: Dict[str, float] = {}
+        self.milestones: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = round(seconds, 4)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark(self, name: str):
+        """记录里程碑（自进程启动以来的秒数）"""
+        self.milestones[name] = round(time.perf_counter() - self.origin, 4)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "milestones": dict(self.milestones),
+            "phases": dict(self.phases),
+            "origin": self.origin_source,
+        }
+
+    def log_summary(self):
+        milestones = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.milestones.items())
+        phases = ", ".join(
+            f"{name} {seconds:.3f}s" for name, seconds in sorted(self.phases.items(), key=lambda item: -item[1])
+        )
+        _logger.info(f"Startup: {milestones} ({phases})")
+
+startup_report = StartupReport()
@@ -0,0 +1,79 @@
+"""长文本分块
+
+按段落切分长文本，相邻分块之间保留少量重叠，保证跨段落的上下文不丢失。
+超长段落再按句子切分，单个句子仍然过长时按字符数硬切。
+
+分块边界由段落内容决定（内容定义分块）：段落哈希满足条件时在其后切分，
+因此在文档中间插入或修改内容只影响附近的分块，之后的分块保持不变，
+按分块内容缓存的分析结果仍然可以复用。分块达到 chunk_chars 时强制切分。
+"""
+
+import re
+import zlib
+from typing import List
+
+SENTENCE_END = re.compile(r"(?<=[。！？；!?;])")
+
+def _split_long_paragraph(paragraph: str, chunk_chars: int) -> List[str]:
+    pieces: List[str] = []
+    current = ""
+    for sentence in SENTENCE_END.split(paragraph):
+        while len(sentence) > chunk_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:chunk_chars])
+            sentence = sentence[chunk_chars:]
+        if len(current) + len(sentence) > chunk_chars and current:
+            pieces.append(current)
+            current = ""
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+def _is_boundary(paragraph: str, target_chars: int) -> bool:
+    """段落是否为分块边界，概率约为 段落长度/目标分块大小，只取决于段落内容"""
+    return zlib.crc32(paragraph.encode("utf-8")) % target_chars < len(paragraph)
+
+def split_text(text: str, chunk_chars: int = 4000, overlap_chars: int = 300) -> List[str]:
+    """将文本切分为按段落对齐、相互重叠的分块"""
+    paragraphs: List[str] = []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > chunk_chars:
+            paragraphs.extend(_split_long_paragraph(paragraph, chunk_chars))
+        else:
+            paragraphs.append(paragraph)
+
+    # 内容边界的期望间隔约为上限的2/3，不足上限1/3的分块不在内容边界处切分
+    target_chars = max(chunk_chars * 2 // 3, 1)
+    min_chars = chunk_chars // 3
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_chars = 0
+    at_boundary = False
+    for paragraph in paragraphs:
+        if current and (at_boundary or current_chars + len(paragraph) > chunk_chars):
+            chunks.append("\n".join(current))
+            # 从上一块末尾带入不超过 overlap_chars 的完整段落作为重叠
+            overlap: List[str] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                if overlap_size + len(previous) > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += len(previous)
+            if overlap_size + len(paragraph) > chunk_chars:
+                overlap, overlap_size = [], 0
+            current, current_chars = overlap, overlap_size
+        current.append(paragraph)
+        current_chars += len(paragraph)
+        at_boundary = current_chars >= min_chars and _is_boundary(paragraph, target_chars)
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
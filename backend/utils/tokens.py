@@ -0,0 +1,38 @@
+"""Token估算工具
+
+用于在没有分词器的情况下快速估算文本的token数量：
+中日韩字符大致按1个token计算，其余字符按4个字符1个token计算。
+"""
+
+from typing import Any
+import json
+
+def _is_cjk(char: str) -> bool:
+    """判断字符是否为中日韩字符或全角符号"""
+    code = ord(char)
+    return (
+        0x4E00 <= code <= 0x9FFF or
+        0x3400 <= code <= 0x4DBF or
+        0x3000 <= code <= 0x303F or
+        0xFF00 <= code <= 0xFFEF
+    )
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数量"""
+    if not text:
+        return 0
+
+    cjk_count = sum(1 for char in text if _is_cjk(char))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
+
+def estimate_object_tokens(obj: Any) -> int:
+    """估算任意可JSON序列化对象的token数量"""
+    if obj is None:
+        return 0
+    if isinstance(obj, str):
+        return estimate_tokens(obj)
+    try:
+        return estimate_tokens(json.dumps(obj, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        return estimate_tokens(str(obj))
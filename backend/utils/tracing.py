@@ -0,0 +1,320 @@
+"""请求追踪
+
+每个API请求打开一个根span，图节点、工具调用和LLM调用作为子span记录在同一个
+trace中。当前span保存在ContextVar里，asyncio任务创建时继承调用方的span，
+因此后台运行的咨询和投机执行的工具也会归入发起它们的请求。
+
+结束的trace保存在有界的内存环形缓冲区中（/api/admin/traces 查询）；配置
+OTLP_ENDPOINT 后同时以OTLP/HTTP JSON格式批量发送到本地collector。
+"""
+
+import asyncio
+import functools
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+import httpx
+
+from backend.config import settings
+
+# 追踪模块被日志模块引用，这里直接使用标准库logger避免循环导入
+logger = logging.getLogger("rightify.tracing")
+
+class Span:
+    """一次操作的计时和属性"""
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "attributes",
+        "start_time", "end_time", "status", "error", "_started"
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time is None:
+            return None
+        return round((self.end_time - self.start_time) * 1000, 3)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float):
+        """累加数值属性（如同一span内多次LLM调用的token数）"""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.end_time = self.start_time + (time.perf_counter() - self._started)
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_trace_id() -> Optional[str]:
+    span = current_span.get()
+    return span.trace_id if span is not None else None
+
+def annotate(**attributes: Any):
+    """为当前span添加属性，没有活动span时忽略"""
+    span = current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+def parse_traceparent(header: str) -> Optional[str]:
+    """从W3C traceparent请求头中取出trace ID"""
+    parts = header.split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and parts[1] != "0" * 32:
+        return parts[1].lower()
+    return None
+
+class TraceRecord:
+    """一个trace的所有span"""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        self.dropped_spans = 0
+
+    def summary(self) -> Dict[str, Any]:
+        root = self.root
+        tokens = 0
+        cache_hits = 0
+        for span in self.spans:
+            tokens += span.attributes.get("prompt_tokens", 0) + span.attributes.get("completion_tokens", 0)
+            if span.attributes.get("cache") in ("hit", "join", "session", "speculation"):
+                cache_hits += 1
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name if root else None,
+            "start_time": root.start_time if root else (self.spans[0].start_time if self.spans else None),
+            "duration_ms": root.duration_ms if root else None,
+            "status": root.status if root else "in_progress",
+            "spans": len(self.spans),
+            "errors": sum(1 for span in self.spans if span.status == "error"),
+            "tokens": tokens,
+            "cache_hits": cache_hits,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.summary(),
+            "dropped_spans": self.dropped_spans,
+            "span_list": [span.to_dict() for span in sorted(self.spans, key=lambda span: span.start_time)],
+        }
+
+class Tracer:
+    """span的创建和有界存储"""
+
+    def __init__(self, max_traces: int = 200, max_spans_per_trace: int = 500, enabled: bool = True):
+        self.max_traces = max_traces
+        self.max_spans_per_trace = max_spans_per_trace
+        self.enabled = enabled
+        self._traces: "OrderedDict[str, TraceRecord]" = OrderedDict()
+        self.exporter: Optional["OTLPExporter"] = None
+
+    @contextmanager
+    def span(self, name: str, root: bool = False, trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+        """打开子span（root=True时开始新的trace）"""
+        parent = None if root else current_span.get()
+        if not self.enabled or (parent is None and not root):
+            # 不在请求内（如离线任务）时不记录
+            yield None
+            return
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else (trace_id or secrets.token_hex(16)),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes
+        )
+        token = current_span.set(span)
+        error: Optional[BaseException] = None
+        try:
+            yield span
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            current_span.reset(token)
+            span.finish(error)
+            self._record(span, is_root=parent is None)
+
+    def _record(self, span: Span, is_root: bool):
+        record = self._traces.get(span.trace_id)
+        if record is None:
+            record = self._traces[span.trace_id] = TraceRecord(span.trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        if is_root:
+            record.root = span
+        if len(record.spans) < self.max_spans_per_trace:
+            record.spans.append(span)
+        else:
+            record.dropped_spans += 1
+        if self.exporter is not None:
+            self.exporter.submit(span)
+
+    def traces(self, limit: int = 50, min_duration_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """最近的trace摘要（新的在前）"""
+        summaries = []
+        for record in reversed(self._traces.values()):
+            summary = record.summary()
+            if min_duration_ms and (summary["duration_ms"] or 0) < min_duration_ms:
+                continue
+            summaries.append(summary)
+            if len(summaries) >= limit:
+                break
+        return summaries
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        record = self._traces.get(trace_id)
+        return record.to_dict() if record else None
+
+def traced(name: str, **attributes: Any) -> Callable:
+    """异步函数的span装饰器"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name, **attributes):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_span(span: Span) -> Dict[str, Any]:
+    payload = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 2 if span.parent_id is None else 1,
+        "startTimeUnixNano": str(int(span.start_time * 1e9)),
+        "endTimeUnixNano": str(int((span.end_time or span.start_time) * 1e9)),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1},
+    }
+    if span.parent_id:
+        payload["parentSpanId"] = span.parent_id
+    return payload
+
+class OTLPExporter:
+    """按批次以OTLP/HTTP JSON发送span，队列满时丢弃"""
+
+    def __init__(self, endpoint: str, service_name: str, interval: float = 5.0, max_queue: int = 10000, batch_size: int = 512):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.interval = interval
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self._pending: List[Span] = []
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"exported": 0, "dropped": 0, "failed_batches": 0}
+
+    def submit(self, span: Span):
+        if len(self._pending) >= self.max_queue:
+            self.stats["dropped"] += 1
+            return
+        self._pending.append(span)
+
+    def start(self):
+        self._client = httpx.AsyncClient(timeout=10.0)
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            payload = {
+                "resourceSpans": [{
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                    "scopeSpans": [{"scope": {"name": "rightify"}, "spans": [otlp_span(span) for span in batch]}],
+                }]
+            }
+            try:
+                response = await self._client.post(self.endpoint, json=payload)
+                response.raise_for_status()
+                self.stats["exported"] += len(batch)
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                logger.warning(f"OTLP export of {len(batch)} spans failed: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._client is not None:
+            await self.flush()
+            await self._client.aclose()
+
+tracer = Tracer(
+    max_traces=settings.trace_buffer_size,
+    max_spans_per_trace=settings.trace_max_spans,
+    enabled=settings.enable_tracing
+)
+
+class TracingMiddleware:
+    """为每个API请求打开根span（ASGI中间件），响应头返回 X-Trace-ID"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        if scope["type"] != "http" or not tracer.enabled or not scope["path"].startswith(settings.api_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        trace_id = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        with tracer.span(
+            f"{scope['method']} {scope['path']}", root=True, trace_id=trace_id,
+            method=scope["method"], path=scope["path"]
+        ) as span:
+            async def send_with_trace(message: Dict[str, Any]):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("status_code", message["status"])
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", span.trace_id.encode())
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
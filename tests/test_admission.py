@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.utils.admission import AdmissionController, AdmissionLimiter, AdmissionRejected
+
+def test_queue_full_is_rejected_immediately():
+    async def run_test():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_queue=1, max_wait=1.0)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire()
+        limiter.release()
+        await waiter
+        return limiter.stats()
+
+    stats = asyncio.run(run_test())
+    assert stats["active"] == 1
+    assert stats["admitted"] == 2
+    assert stats["shed_queue_full"] == 1
+
+def test_wait_timeout_is_rejected():
+    async def run_test():
+        limiter = AdmissionLimiter("test", max_concurrent=1, max_queue=5, max_wait=0.05)
+        await limiter.acquire()
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire()
+        return limiter.stats()
+
+    stats = asyncio.run(run_test())
+    assert stats["shed_timeout"] == 1
+    assert stats["queued"] == 0
+
+def test_endpoint_limit_within_budget():
+    budgets = {"expensive": {"concurrency": 4, "queue": 0, "max_wait": 1.0}}
+    controller = AdmissionController(
+        budgets, endpoint_limits={"report": 1},
+        endpoint_budgets={"report": "expensive", "consult": "expensive"}
+    )
+
+    async def run_test():
+        await controller.acquire("report")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("report")
+        await controller.acquire("consult")
+        return controller.metrics()
+
+    metrics = asyncio.run(run_test())
+    assert metrics["budgets"]["expensive"]["active"] == 2
+    assert metrics["endpoints"]["report"]["shed_queue_full"] == 1
+
+def test_endpoint_and_budget_waits_share_one_deadline():
+    budgets = {"expensive": {"concurrency": 2, "queue": 5, "max_wait": 0.2}}
+    controller = AdmissionController(
+        budgets, endpoint_limits={"report": 1},
+        endpoint_budgets={"report": "expensive", "consult": "expensive"}
+    )
+
+    async def run_test():
+        await controller.acquire("report")
+        await controller.acquire("consult")
+        started = time.monotonic()
+        waiting = asyncio.create_task(controller.acquire("report"))
+        await asyncio.sleep(0.15)
+        # 只归还接口名额，预算仍然占满
+        controller.endpoints["report"].release()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await waiting
+        return rejected.value, time.monotonic() - started
+
+    rejected, elapsed = asyncio.run(run_test())
+    assert (rejected.limiter, rejected.reason) == ("expensive", "wait_timeout")
+    assert elapsed < 0.3
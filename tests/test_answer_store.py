@@ -0,0 +1,33 @@
+from backend.config import settings
+from backend.utils.answer_store import AnswerStore, build_store, expected_build_version, normalize_query
+
+RECORDS = [
+    {"query": "劳动合同解除补偿？", "case_type": "labor", "answer": "按工作年限支付经济补偿", "plan": ["法律案情分析"]},
+    {"query": "交通事故赔偿标准", "case_type": "general", "answer": "按责任比例赔偿"},
+]
+
+def test_lookup_matches_normalized_query(tmp_path):
+    path = tmp_path / "answers.bin"
+    assert build_store(RECORDS, path, expected_build_version()) == 2
+    store = AnswerStore(str(path))
+
+    record = store.lookup("劳动合同 解除补偿", "labor")
+    assert record["answer"] == "按工作年限支付经济补偿"
+    assert record["plan"] == ["法律案情分析"]
+    assert store.lookup("劳动合同解除补偿", "general") is None
+    assert store.lookup("租房押金不退怎么办") is None
+
+    metrics = store.metrics()
+    assert (metrics["hits"], metrics["misses"], metrics["hit_rate"]) == (1, 2, 0.3333)
+    assert normalize_query("ＡＢＣ，def！") == "abcdef"
+    store.close()
+
+def test_stale_version_is_ignored(tmp_path, monkeypatch):
+    path = tmp_path / "answers.bin"
+    build_store(RECORDS, path, expected_build_version())
+    monkeypatch.setattr(settings, "answer_store_version", "2")
+
+    store = AnswerStore(str(path))
+    assert store.lookup("交通事故赔偿标准") is None
+    assert store.metrics()["stale"] is True
+    store.close()
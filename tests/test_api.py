@@ -1,12 +1,53 @@
 from fastapi.testclient import TestClient
+
+from backend.config import settings
+from backend.devtools.fake_llm import FakeLLMServer
 from backend.main import app
 
-client = TestClient(app)
+def test_legal_consultation(monkeypatch):
+    with FakeLLMServer() as llm_server:
+        monkeypatch.setattr(settings, "openai_base_url", llm_server.base_url)
+        with TestClient(app) as client:
+            response = client.post('/api/legal/consult', json={
+                "query": "劳动合同纠纷",
+                "case_type": "民事"
+            })
+    assert response.status_code == 200
+    assert '"type":"final_answer"' in response.text.replace(" ", "")
+    assert '"type":"complete"' in response.text.replace(" ", "")
+
+def test_legal_consultation_requires_query():
+    with TestClient(app) as client:
+        response = client.post('/api/legal/consult', json={"text": "劳动合同纠纷"})
+    assert response.status_code == 400
+
+def test_admin_endpoints_fail_closed(monkeypatch):
+    client = TestClient(app)
+    monkeypatch.setattr(settings, "admin_token", None)
+    assert client.get('/api/admin/traces').status_code == 403
+    assert client.get('/api/admin/profiles').status_code == 403
+
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    assert client.get('/api/admin/traces', headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get('/api/admin/traces', headers={"X-Admin-Token": "secret"}).status_code == 200
+
+def test_batch_analysis_validates_concurrency_and_releases_slot(monkeypatch):
+    import backend.main as main
+
+    class FakeAgent:
+        async def analyze_cases(self, case_descriptions, concurrency):
+            for index, description in enumerate(case_descriptions):
+                yield {"indices": [index], "data": {"summary": description}}
+
+    async def get_agent():
+        return FakeAgent()
+
+    monkeypatch.setattr(main, "get_agent", get_agent)
+    client = TestClient(app)
+    response = client.post('/api/legal/analyze/batch', json={"case_descriptions": ["拖欠工资"], "concurrency": "many"})
+    assert response.status_code == 400
 
-def test_legal_consultation():
-    response = client.post('/api/legal/consult', json={
-        "text": "劳动合同纠纷",
-        "case_type": "民事"
-    })
+    response = client.post('/api/legal/analyze/batch', json={"case_descriptions": ["拖欠工资", "违法解除"], "concurrency": 2})
     assert response.status_code == 200
-    assert 'event' in response.text
\ No newline at end of file
+    assert len(response.text.splitlines()) == 2
+    assert main.admission.budgets["expensive"].active == 0
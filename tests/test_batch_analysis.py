@@ -0,0 +1,37 @@
+import asyncio
+
+from backend.agents.legal_agent import LegalPlanExecuteAgent
+
+class FakeAnalysisTool:
+    def __init__(self):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def analyze(self, case_description):
+        self.calls.append(case_description)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if "失败" in case_description:
+            return {"error": "bad input"}
+        return {"case_type": "劳动纠纷", "summary": case_description}
+
+def test_batch_analysis_dedupes_and_reports_stats():
+    agent = LegalPlanExecuteAgent()
+    tool = FakeAnalysisTool()
+    agent.tools = {"legal_analysis": tool}
+    descriptions = ["拖欠工资", "违法解除", "拖欠工资", "  ", "失败案例"] + [f"案情{i}" for i in range(10)]
+
+    async def run_test():
+        return [item async for item in agent.analyze_cases(descriptions, concurrency=3)]
+
+    items = asyncio.run(run_test())
+    results, summary = items[:-1], items[-1]
+    assert len(tool.calls) == 13
+    assert tool.max_active == 3
+    assert next(item for item in results if item["data"]["summary"] == "拖欠工资")["indices"] == [0, 2]
+    assert summary["type"] == "summary"
+    assert (summary["unique"], summary["duplicates"], summary["empty"]) == (13, 1, 1)
+    assert (summary["succeeded"], summary["failed"]) == (12, 1)
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from backend.bulk_runner import BulkRunner, percentile, read_questions
+
+class FakeAgent:
+    def __init__(self):
+        self.queries = []
+
+    async def stream_consultation(self, query, case_type="general"):
+        self.queries.append(query)
+        await asyncio.sleep(0.01)
+        yield {"type": "planning", "data": {"plan": ["法律案情分析"]}}
+        if query == "crash":
+            raise RuntimeError("boom")
+        yield {"type": "final_answer", "content": f"回答：{query}"}
+
+def questions(count):
+    return [{"id": str(i), "query": f"问题{i}"} for i in range(count)]
+
+def test_bulk_run_writes_results_and_resumes(tmp_path):
+    output = tmp_path / "results.jsonl"
+    agent = FakeAgent()
+
+    report = asyncio.run(BulkRunner(agent, output, concurrency=3).run(iter(questions(5) + [{"id": "x", "query": "crash"}])))
+    assert (report["succeeded"], report["failed"]) == (5, 1)
+    assert report["latency_ms"]["p99"] >= report["latency_ms"]["p50"] > 0
+
+    resumed = asyncio.run(BulkRunner(agent, output, concurrency=3).run(iter(questions(8))))
+    assert (resumed["skipped"], resumed["succeeded"]) == (5, 3)
+    assert len(agent.queries) == 9
+
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert sorted(record["id"] for record in records) == sorted([str(i) for i in range(8)] + ["x"])
+    assert next(record for record in records if record["id"] == "x")["error"] == "boom"
+
+def test_failed_questions_are_retried_on_rerun(tmp_path):
+    output = tmp_path / "results.jsonl"
+    agent = FakeAgent()
+    batch = questions(2) + [{"id": "x", "query": "crash"}]
+
+    asyncio.run(BulkRunner(agent, output).run(iter(batch)))
+    rerun = asyncio.run(BulkRunner(agent, output).run(iter(batch)))
+    assert (rerun["skipped"], rerun["failed"]) == (2, 1)
+    assert agent.queries.count("crash") == 2
+
+def test_invalid_lines_are_recorded_as_failed(tmp_path):
+    source = tmp_path / "questions.jsonl"
+    source.write_text("\n".join([
+        json.dumps({"id": "a", "query": "问题a"}, ensure_ascii=False),
+        "{not json",
+        json.dumps({"id": "b", "case_type": "劳动纠纷"}),
+        json.dumps(["问题"], ensure_ascii=False),
+    ]), encoding="utf-8")
+    agent = FakeAgent()
+
+    report = asyncio.run(BulkRunner(agent, tmp_path / "results.jsonl").run(read_questions(source)))
+    assert (report["succeeded"], report["failed"]) == (1, 3)
+    assert agent.queries == ["问题a"]
+    lines = (tmp_path / "results.jsonl").read_text(encoding="utf-8").splitlines()
+    records = {record["id"]: record for record in map(json.loads, lines)}
+    assert set(records) == {"a", "2", "b", "4"}
+    assert "Invalid JSON on line 2" in records["2"]["error"]
+    assert records["b"]["error"] == "Line 3 has no query"
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
@@ -0,0 +1,78 @@
+import asyncio
+
+from typing_extensions import TypedDict
+from langgraph.graph import StateGraph, END
+
+from backend.agents.checkpoint import SQLiteCheckpointSaver
+from backend.agents.legal_agent import LegalPlanExecuteAgent
+from backend.config import settings
+
+class CounterState(TypedDict):
+    value: int
+
+def build_graph(checkpointer):
+    workflow = StateGraph(CounterState)
+    workflow.add_node("first", lambda state: {"value": state["value"] + 1})
+    workflow.add_node("second", lambda state: {"value": state["value"] * 10})
+    workflow.set_entry_point("first")
+    workflow.add_edge("first", "second")
+    workflow.add_edge("second", END)
+    return workflow.compile(checkpointer=checkpointer, interrupt_before=["second"])
+
+def test_checkpoints_survive_restart_and_resume(tmp_path):
+    db_path = str(tmp_path / "checkpoints.sqlite")
+    config = {"configurable": {"thread_id": "t1"}}
+
+    saver = SQLiteCheckpointSaver(db_path)
+    saver.register_thread("t1", "session-1")
+    asyncio.run(build_graph(saver).ainvoke({"value": 1}, config))
+    saver.close()
+
+    # 新实例只能从SQLite文件中读取
+    restored = SQLiteCheckpointSaver(db_path)
+    assert restored.find_resumable_thread("session-1") == "t1"
+    result = asyncio.run(build_graph(restored).ainvoke(None, config))
+    assert result == {"value": 20}
+    restored.close()
+
+def test_pruning_keeps_latest_checkpoints(tmp_path):
+    saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), keep_per_thread=1, prune_interval=1)
+    config = {"configurable": {"thread_id": "t2"}}
+    graph = build_graph(saver)
+    asyncio.run(graph.ainvoke({"value": 1}, config))
+    asyncio.run(graph.ainvoke(None, config))
+    saver.flush()
+
+    assert len(list(saver.list(config))) == 1
+    saver.close()
+
+def test_failed_consultation_is_not_resumable(tmp_path, monkeypatch):
+    class FakeResponse:
+        content = '{"plan": ["法律案情分析"], "reasoning": ""}'
+
+    class FakeLLM:
+        async def ainvoke(self, messages):
+            return FakeResponse()
+
+    class FakeTool:
+        async def execute(self, **kwargs):
+            return {"summary": "ok"}
+
+    async def fail_store(result_id, execution_results):
+        raise RuntimeError("store unavailable")
+
+    monkeypatch.setattr(settings, "enable_speculative_tools", False)
+    agent = LegalPlanExecuteAgent()
+    agent.llm = FakeLLM()
+    agent.tools = {"legal_analysis": FakeTool()}
+    agent.checkpointer = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"))
+    agent._build_graph()
+    monkeypatch.setattr(agent, "_store_execution_results", fail_store)
+
+    async def run_test():
+        return [event async for event in agent.stream_consultation("公司拖欠工资", session_id="s1")]
+
+    events = asyncio.run(run_test())
+    assert events[-1]["type"] == "error"
+    assert agent.checkpointer.find_resumable_thread("s1") is None
+    agent.checkpointer.close()
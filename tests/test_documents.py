@@ -0,0 +1,76 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+from backend.utils.documents import DocumentError, DocumentStore, DocumentTooLarge, UnsupportedDocumentType
+
+async def stream(data: bytes, chunk_size: int = 1024):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+def make_docx(paragraphs):
+    body = "".join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+    xml = (
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", xml)
+    return buffer.getvalue()
+
+def make_store(tmp_path, max_file_size=1024 * 1024):
+    return DocumentStore(str(tmp_path), max_file_size, [".txt", ".docx"], extract_workers=1)
+
+def test_upload_is_extracted_once_per_content(tmp_path):
+    store = make_store(tmp_path)
+    content = "劳动合同\n\n甲方：某公司\n乙方：张三".encode("utf-8") * 200
+
+    async def run_test():
+        first = await store.save_stream("contract.txt", stream(content))
+        second = await store.save_stream("copy.txt", stream(content))
+        return first, second, await store.get_text(first["document_id"])
+
+    try:
+        first, second, text = asyncio.run(run_test())
+    finally:
+        store.shutdown()
+    assert first["reused"] is False and second["reused"] is True
+    assert first["document_id"] == second["document_id"]
+    assert text.startswith("劳动合同")
+    assert not list(tmp_path.glob(".upload-*"))
+
+def test_docx_extraction(tmp_path):
+    store = make_store(tmp_path)
+
+    async def run_test():
+        metadata = await store.save_stream("contract.docx", stream(make_docx(["第一条 工作内容", "第二条 劳动报酬"])))
+        return await store.get_text(metadata["document_id"])
+
+    try:
+        text = asyncio.run(run_test())
+    finally:
+        store.shutdown()
+    assert text == "第一条 工作内容\n第二条 劳动报酬"
+
+def test_rejects_large_and_unsupported_files(tmp_path):
+    store = make_store(tmp_path, max_file_size=100)
+
+    with pytest.raises(DocumentTooLarge):
+        asyncio.run(store.save_stream("big.txt", stream(b"x" * 1000, chunk_size=64)))
+    with pytest.raises(UnsupportedDocumentType):
+        asyncio.run(store.save_stream("image.png", stream(b"x")))
+    assert not list(tmp_path.glob(".upload-*"))
+
+def test_failed_extraction_removes_uploaded_file(tmp_path):
+    store = make_store(tmp_path)
+
+    try:
+        with pytest.raises(DocumentError):
+            asyncio.run(store.save_stream("empty.txt", stream(b"\n\n  \n")))
+    finally:
+        store.shutdown()
+    assert [path.name for path in tmp_path.iterdir()] == ["text"]
+    assert not list((tmp_path / "text").iterdir())
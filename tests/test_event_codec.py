@@ -0,0 +1,51 @@
+import asyncio
+import json
+import zlib
+
+from backend.utils.compression import StreamCompressionMiddleware, negotiate_encoding
+from backend.utils.event_codec import EventEncoder
+
+EVENT = {
+    "type": "execution",
+    "content": "正在执行：案例检索",
+    "data": {"step": "案例检索", "step_number": 2},
+    "timestamp": "2026-01-01T08:00:00",
+}
+
+def test_compact_format_uses_short_keys():
+    encoder = EventEncoder("compact")
+    compact = json.loads(encoder.encode(EVENT))
+    assert set(compact) == {"t", "d", "ts"}
+    assert compact["t"] == 3 and isinstance(compact["ts"], int)
+    assert json.loads(encoder.encode({"type": "final_answer", "content": "回答"}))["c"] == "回答"
+
+    verbose = EventEncoder("json")
+    assert json.loads(verbose.encode(EVENT)) == EVENT
+    assert encoder.chars < verbose.chars
+    assert encoder.events == 2
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding("") is None
+
+def test_stream_compression_flushes_each_chunk():
+    events = [f"data: {i}\n\n".encode() for i in range(3)]
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        for index, body in enumerate(events):
+            await send({"type": "http.response.body", "body": body, "more_body": index < len(events) - 1})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(StreamCompressionMiddleware(app)(scope, None, send))
+
+    assert (b"content-encoding", b"gzip") in sent[0]["headers"]
+    decompressor = zlib.decompressobj(31)
+    # 每个分块单独解压即可得到对应事件，不依赖后续数据
+    assert [decompressor.decompress(message["body"]) for message in sent[1:]] == events
@@ -0,0 +1,39 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from backend.devtools.fake_llm import FakeLLMConfig, LatencyModel, create_app
+from backend.utils.json_utils import extract_json
+
+PLANNER_MESSAGES = [{"role": "system", "content": "请分析以下用户查询并制定详细的执行计划。"}]
+
+def test_non_streaming_planner_response():
+    client = TestClient(create_app(FakeLLMConfig(seed=1)))
+    response = client.post("/v1/chat/completions", json={"model": "fake", "messages": PLANNER_MESSAGES})
+    assert response.status_code == 200
+    body = response.json()
+    assert extract_json(body["choices"][0]["message"]["content"])["plan"]
+    assert body["usage"]["completion_tokens"] > 0
+
+def test_streaming_response_and_error_injection():
+    client = TestClient(create_app(FakeLLMConfig(seed=1)))
+    response = client.post("/chat/completions", json={
+        "messages": [{"role": "user", "content": "公司违法解除劳动合同怎么办"}],
+        "stream": True,
+        "stream_options": {"include_usage": True}
+    })
+    lines = [line[6:] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert lines[-1] == "[DONE]"
+    chunks = [json.loads(line) for line in lines[:-1]]
+    content = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks if chunk["choices"])
+    assert content and chunks[-1]["usage"]["completion_tokens"] == len(content)
+
+    failing = TestClient(create_app(FakeLLMConfig(error_429=1.0)))
+    response = failing.post("/v1/chat/completions", json={"messages": PLANNER_MESSAGES})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+
+def test_latency_distributions():
+    assert LatencyModel("fixed:200").sample() == 0.2
+    samples = [LatencyModel("uniform:100:300").sample() for _ in range(100)]
+    assert all(0.1 <= value <= 0.3 for value in samples)
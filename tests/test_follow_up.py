@@ -0,0 +1,105 @@
+import asyncio
+
+from backend.agents.legal_agent import LegalPlanExecuteAgent
+from backend.agents.memory import SessionMemoryManager
+from backend.config import settings
+from backend.devtools.fake_llm import canned_response
+
+QUERY = "公司违法解除劳动合同，拒绝支付经济补偿怎么办"
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+class CountingLLM:
+    """按提示词返回模拟服务的固定输出，并记录调用的提示词"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        prompt = "\n".join(message.content for message in messages)
+        self.prompts.append(prompt)
+        return FakeResponse(canned_response(prompt, answer_chars=100))
+
+class FakeTool:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        return {"tool": self.name}
+
+def make_agent(monkeypatch):
+    monkeypatch.setattr(settings, "tool_cache_ttl", 0)
+    monkeypatch.setattr(settings, "enable_speculative_tools", False)
+    agent = LegalPlanExecuteAgent()
+    agent.llm = CountingLLM()
+    agent.tools = {
+        name: FakeTool(name)
+        for name in ("legal_analysis", "case_search", "lawyer_recommendation", "report_generator")
+    }
+    agent.memory = SessionMemoryManager()
+    agent._build_graph()
+    return agent
+
+def consult(agent, query, **kwargs):
+    async def run():
+        return [event async for event in agent.stream_consultation(query, session_id="s1", **kwargs)]
+    return asyncio.run(run())
+
+def test_is_follow_up_rules(monkeypatch):
+    agent = make_agent(monkeypatch)
+    assert not agent._is_follow_up("那赔偿金怎么算", "general", "s1", None)
+
+    consult(agent, QUERY, case_type="劳动纠纷")
+    # 追问标记词
+    assert agent._is_follow_up("那赔偿金怎么算", "general", "s1", None)
+    assert agent._is_follow_up("如果对方不同意呢", "general", "s1", None)
+    # 短问题与原始案情的双字词重叠
+    assert agent._is_follow_up("经济补偿的标准", "general", "s1", None)
+    assert not agent._is_follow_up("房屋租赁押金不退", "general", "s1", None)
+    # 超过长度上限的问题视为新的咨询
+    monkeypatch.setattr(settings, "follow_up_max_query_chars", 5)
+    assert not agent._is_follow_up("经济补偿的标准", "general", "s1", None)
+    # 案件类型变化或显式指定时不按内容判断
+    assert not agent._is_follow_up("那赔偿金怎么算", "刑事纠纷", "s1", None)
+    assert not agent._is_follow_up("那赔偿金怎么算", "劳动纠纷", "s1", False)
+
+def test_follow_up_reuses_steps_and_saves_llm_calls(monkeypatch):
+    agent = make_agent(monkeypatch)
+    consult(agent, QUERY)
+    first_calls = len(agent.llm.prompts)
+    tool_calls = {name: tool.calls for name, tool in agent.tools.items()}
+    # 规划、两个LLM步骤（风险评估、解决方案建议）和最终回答
+    assert first_calls == 4
+
+    events = consult(agent, "那能帮我出一份报告吗")
+    planning = next(event for event in events if event["type"] == "planning")
+    assert planning["data"]["follow_up"] is True
+    assert planning["data"]["plan"] == ["报告生成"]
+    assert planning["data"]["reused_steps"] == ["法律案情分析", "案例检索", "律师推荐", "风险评估", "解决方案建议"]
+
+    # 追问只重新执行报告步骤，LLM只用于生成最终回答
+    follow_up_calls = len(agent.llm.prompts) - first_calls
+    assert follow_up_calls == 1
+    assert follow_up_calls <= first_calls / 2
+    assert "执行计划" not in agent.llm.prompts[-1]
+    tool_calls["report_generator"] += 1
+    assert {name: tool.calls for name, tool in agent.tools.items()} == tool_calls
+
+    final = next(event for event in events if event["type"] == "final_answer")
+    steps = {step["step"]: step["reused"] for step in final["data"]["steps"]}
+    assert steps["报告生成"] is False and steps["案例检索"] is True
+
+def test_follow_up_reruns_steps_whose_inputs_changed(monkeypatch):
+    agent = make_agent(monkeypatch)
+    consult(agent, QUERY, case_type="劳动纠纷")
+    events = consult(agent, "换成合同纠纷看看律师", case_type="合同纠纷", follow_up=True)
+    planning = next(event for event in events if event["type"] == "planning")
+    # 案件类型是案例检索和律师推荐的输入，这两步需要重新执行
+    assert planning["data"]["plan"] == ["案例检索", "律师推荐"]
+    assert planning["data"]["reused_steps"] == ["法律案情分析", "风险评估", "解决方案建议"]
+    assert agent.tools["case_search"].calls == 2
+    assert agent.tools["legal_analysis"].calls == 1
@@ -0,0 +1,29 @@
+import asyncio
+
+from backend.agents.legal_agent import LegalPlanExecuteAgent, merge_dict
+from backend.config import settings
+
+class FakeTool:
+    async def execute(self, **kwargs):
+        return {"cases": []}
+
+def test_executor_returns_only_changed_keys(monkeypatch):
+    monkeypatch.setattr(settings, "tool_cache_ttl", 0)
+    agent = LegalPlanExecuteAgent()
+    agent.tools = {"case_search": FakeTool()}
+    state = {
+        "messages": [],
+        "plan": ["法律案情分析", "案例检索"],
+        "current_step": 1,
+        "execution_results": {"法律案情分析": {"summary": "很长的分析结果"}},
+        "final_answer": "",
+        "case_type": "labor",
+        "session_id": "s1",
+        "metadata": {"case_context": "拖欠工资", "step_signatures": {"法律案情分析": "a"}},
+    }
+
+    update = asyncio.run(agent._executor_node(state))
+    assert update["current_step"] == 2
+    assert update["execution_results"] == {"案例检索": {"cases": []}}
+    assert set(update["metadata"]["step_signatures"]) == {"法律案情分析", "案例检索"}
+    assert "法律案情分析" in merge_dict(state["execution_results"], update["execution_results"])
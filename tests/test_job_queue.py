@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from backend.utils.job_queue import InMemoryJobBackend, JobManager, QueueFullError, RedisJobBackend
+from backend.utils.local_redis import LocalRedis
+from backend.utils.rate_limit import current_client, llm_degraded
+
+async def echo_handler(payload, emit):
+    await emit({"type": "progress", "content": payload["value"]})
+    return {"value": payload["value"]}
+
+async def run_jobs(backend):
+    manager = JobManager(backend, {"echo": echo_handler}, workers=1)
+    low = await manager.submit("echo", {"value": "low"}, priority="low")
+    high = await manager.submit("echo", {"value": "high"}, priority="high")
+    assert (await manager.metrics())["queue_depth"] == {"high": 1, "normal": 0, "low": 1}
+
+    manager.start()
+    while (await manager.get(low["job_id"]))["status"] != "succeeded":
+        await asyncio.sleep(0.01)
+    await manager.stop()
+
+    high_job = await manager.get(high["job_id"])
+    low_job = await manager.get(low["job_id"])
+    assert high_job["result"] == {"value": "high"}
+    assert high_job["started_at"] <= low_job["started_at"]
+    assert await manager.events(low["job_id"]) == [{"type": "progress", "content": "low", "seq": 1}]
+
+@pytest.mark.parametrize("make_backend", [
+    InMemoryJobBackend,
+    lambda: RedisJobBackend(LocalRedis()),
+])
+def test_jobs_run_in_priority_order(make_backend):
+    asyncio.run(run_jobs(make_backend()))
+
+def test_full_queue_rejects_submissions():
+    async def run_test():
+        manager = JobManager(InMemoryJobBackend(), {"echo": echo_handler}, max_queue_size=1)
+        await manager.submit("echo", {"value": 1})
+        with pytest.raises(QueueFullError):
+            await manager.submit("echo", {"value": 2})
+
+    asyncio.run(run_test())
+
+@pytest.mark.parametrize("make_backend", [
+    lambda: InMemoryJobBackend(max_events=3),
+    lambda: RedisJobBackend(LocalRedis(), max_events=3),
+])
+def test_event_sequence_survives_trimming(make_backend):
+    async def run_test():
+        backend = make_backend()
+        for value in range(5):
+            await backend.append_event("job", {"value": value})
+        return await backend.get_events("job"), await backend.get_events("job", after=3)
+
+    retained, resumed = asyncio.run(run_test())
+    assert [event["seq"] for event in retained] == [3, 4, 5]
+    assert [event["value"] for event in resumed] == [3, 4]
+
+@pytest.mark.parametrize("make_backend", [
+    InMemoryJobBackend,
+    lambda: RedisJobBackend(LocalRedis()),
+])
+def test_cancel_frees_queue_capacity(make_backend):
+    async def run_test():
+        manager = JobManager(make_backend(), {"echo": echo_handler}, max_queue_size=1)
+        job = await manager.submit("echo", {"value": 1})
+        assert await manager.cancel(job["job_id"])
+        assert (await manager.metrics())["queue_depth_total"] == 0
+        await manager.submit("echo", {"value": 2})
+
+    asyncio.run(run_test())
+
+@pytest.mark.parametrize("make_backend", [
+    InMemoryJobBackend,
+    lambda: RedisJobBackend(LocalRedis()),
+])
+def test_cancel_loses_to_worker_that_already_took_the_job(make_backend):
+    async def run_test():
+        backend = make_backend()
+        manager = JobManager(backend, {"echo": echo_handler})
+        job_ids = {(await manager.submit("echo", {"value": value}))["job_id"] for value in (1, 2)}
+        # worker已经取出任务，但还没有把状态改为running
+        taken_id = await backend.dequeue(timeout=0.1)
+        cancelled_id = (job_ids - {taken_id}).pop()
+        assert not await manager.cancel(taken_id)
+        await manager._run_job(taken_id)
+
+        assert await manager.cancel(cancelled_id)
+        await manager._run_job(cancelled_id)
+        return await manager.get(taken_id), await manager.get(cancelled_id)
+
+    taken, cancelled = asyncio.run(run_test())
+    assert taken["status"] == "succeeded"
+    assert cancelled["status"] == "cancelled" and cancelled["started_at"] is None
+
+def test_job_runs_with_submitting_client_context():
+    seen = []
+
+    async def context_handler(payload, emit):
+        seen.append((current_client.get(), llm_degraded.get()))
+        return {}
+
+    async def run_test():
+        manager = JobManager(InMemoryJobBackend(), {"ctx": context_handler})
+        client_token = current_client.set("ip:1.2.3.4")
+        degraded_token = llm_degraded.set(True)
+        try:
+            job = await manager.submit("ctx", {})
+        finally:
+            current_client.reset(client_token)
+            llm_degraded.reset(degraded_token)
+        # worker在没有请求上下文的任务中执行
+        await asyncio.create_task(manager._run_job(job["job_id"]))
+        return current_client.get()
+
+    assert asyncio.run(run_test()) is None
+    assert seen == [("ip:1.2.3.4", True)]
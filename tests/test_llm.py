@@ -0,0 +1,31 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from backend.devtools.fake_llm import FakeLLMConfig, FakeLLMServer
+from backend.utils import rate_limit
+from backend.utils.llm import create_llm
+from backend.utils.rate_limit import current_client, get_token_budget
+from backend.utils.shared_state import InMemorySharedState, set_shared_state
+
+def test_streaming_client_debits_tokens(monkeypatch):
+    set_shared_state(InMemorySharedState())
+    monkeypatch.setattr(rate_limit, "_token_budget", None)
+    monkeypatch.setattr("backend.config.settings.enable_rate_limit", True)
+
+    with FakeLLMServer(FakeLLMConfig(latency="fixed:0", token_rate=0, seed=1)) as server:
+        monkeypatch.setattr("backend.config.settings.openai_base_url", server.base_url)
+        llm = create_llm(streaming=True)
+
+        async def run_test():
+            token = current_client.set("ip:test")
+            try:
+                await llm.ainvoke([HumanMessage(content="公司违法解除劳动合同怎么办")])
+            finally:
+                current_client.reset(token)
+            return await get_token_budget().usage("ip:test")
+
+        debited = asyncio.run(run_test())
+
+    assert llm.usage["prompt_tokens"] > 0 and llm.usage["completion_tokens"] > 0
+    assert debited == llm.usage["prompt_tokens"] + llm.usage["completion_tokens"]
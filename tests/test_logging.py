@@ -0,0 +1,38 @@
+import json
+import logging
+import queue
+
+from backend.utils.logger import BoundedQueueHandler, SamplingFilter, setup_logger, stop_logging
+
+def test_queue_logger_writes_json_lines(tmp_path):
+    log_file = tmp_path / "app.log"
+    test_logger = setup_logger(
+        "rightify-test-json", level="INFO", log_file=str(log_file), log_format="json", use_queue=True
+    )
+    test_logger.info("step %s done", "案例检索", extra={"consultation_id": "c1"})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        test_logger.error("failed", exc_info=True)
+    stop_logging("rightify-test-json")
+
+    records = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert records[0]["message"] == "step 案例检索 done"
+    assert records[0]["consultation_id"] == "c1"
+    assert "ValueError: boom" in records[1]["exception"]
+
+def test_queue_overflow_policies():
+    record = logging.LogRecord("rightify", logging.INFO, __file__, 1, "message %d", (1,), None)
+    for overflow, expected in (("drop_new", "message 1"), ("drop_oldest", "message 2")):
+        handler = BoundedQueueHandler(queue.Queue(maxsize=1), overflow)
+        handler.handle(record)
+        handler.handle(logging.LogRecord("rightify", logging.INFO, __file__, 1, "message %d", (2,), None))
+        assert handler.dropped == 1
+        assert handler.queue.get_nowait().getMessage() == expected
+
+def test_sampling_filter_only_drops_debug():
+    sampling = SamplingFilter({"rightify.agent": 0.0})
+    debug = logging.LogRecord("rightify.agent.graph", logging.DEBUG, __file__, 1, "x", None, None)
+    info = logging.LogRecord("rightify.agent", logging.INFO, __file__, 1, "x", None, None)
+    other = logging.LogRecord("rightify.api", logging.DEBUG, __file__, 1, "x", None, None)
+    assert (sampling.filter(debug), sampling.filter(info), sampling.filter(other)) == (False, True, True)
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import random
+
+from langchain_core.messages import AIMessage
+
+from backend.tools.legal_tools import LegalAnalysisTool
+from backend.utils.shared_state import InMemorySharedState, set_shared_state
+from backend.utils.text_chunks import split_text
+
+class ChunkLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        prompt = messages[-1].content
+        issue = "加班费" if "加班" in prompt else "经济补偿"
+        return AIMessage(content="```json\n" + json.dumps({
+            "case_type": "劳动纠纷",
+            "legal_relations": ["劳动关系"],
+            "key_issues": [issue],
+            "evidence_requirements": ["劳动合同"],
+            "risk_level": "高" if "加班" in prompt else "低",
+            "summary": issue,
+        }, ensure_ascii=False) + "\n```")
+
+def test_split_text_is_paragraph_aware_with_overlap():
+    paragraphs = [f"第{i}段" + "内容" * 40 for i in range(10)]
+    chunks = split_text("\n\n".join(paragraphs), chunk_chars=300, overlap_chars=100)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 300 + len(chunks) for chunk in chunks)
+    # 每块以完整段落开始，且与上一块末尾的段落重叠
+    assert all(chunk.startswith("第") for chunk in chunks)
+    assert chunks[1].split("\n")[0] == chunks[0].split("\n")[-1]
+
+def test_split_text_boundaries_survive_middle_edit():
+    rng = random.Random(0)
+    words = ["劳动合同", "解除", "经济补偿", "加班费", "工资", "证据", "仲裁", "通知"]
+    paragraphs = ["".join(rng.choice(words) for _ in range(rng.randint(3, 15))) + "。" for _ in range(120)]
+    original = split_text("\n".join(paragraphs), chunk_chars=300, overlap_chars=60)
+    edited = split_text(
+        "\n".join(paragraphs[:60] + ["补充说明：公司解除前未通知工会。"] + paragraphs[60:]),
+        chunk_chars=300, overlap_chars=60
+    )
+    # 中间插入一段只影响插入位置附近的分块，之后的分块与原文完全相同
+    changed = [chunk for chunk in edited if chunk not in original]
+    assert 1 <= len(changed) <= 3
+    assert edited[-5:] == original[-5:]
+
+def test_long_analysis_merges_and_caches_chunks(monkeypatch):
+    monkeypatch.setattr("backend.config.settings.analysis_long_input_tokens", 100)
+    monkeypatch.setattr("backend.config.settings.analysis_chunk_chars", 200)
+    set_shared_state(InMemorySharedState())
+    tool = LegalAnalysisTool()
+    tool.llm = ChunkLLM()
+    text = "\n".join(["公司解除劳动合同未支付补偿。" * 10, "员工长期加班未获加班费。" * 10, "双方签订了书面合同。" * 10])
+
+    async def run_test():
+        first = await tool.analyze(text)
+        calls = tool.llm.calls
+        edited = await tool.analyze(text + "\n补充：公司已出具解除通知。")
+        return first, calls, edited
+
+    try:
+        first, calls, edited = asyncio.run(run_test())
+    finally:
+        set_shared_state(None)
+    assert first["chunks"] == calls == 3
+    assert first["key_issues"] == ["经济补偿", "加班费"]
+    assert first["legal_relations"] == ["劳动关系"]
+    assert first["risk_assessment"]["level"] == "高"
+    # 只有变化的最后一块需要重新分析
+    assert tool.llm.calls == calls + 1
+    assert edited["failed_chunks"] == 0
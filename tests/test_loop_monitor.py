@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.utils.loop_monitor import BlockingCallError, LoopMonitor
+
+def blocking_handler():
+    time.sleep(0.3)
+
+def test_blocking_call_is_sampled_and_fails_strict_mode():
+    monitor = LoopMonitor(interval=0.02, threshold_ms=100, fail_ms=200)
+
+    async def run_test():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_handler()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    with pytest.raises(BlockingCallError) as error:
+        asyncio.run(run_test())
+    metrics = monitor.metrics()
+    assert metrics["stalls"] == 1
+    assert metrics["max_lag_ms"] >= 250
+    assert "blocking_handler" in metrics["recent_stalls"][0]["stack"][-1]
+    assert "blocking_handler" in str(error.value)
+
+def test_idle_loop_has_no_stalls():
+    monitor = LoopMonitor(interval=0.01, threshold_ms=100, fail_ms=100)
+
+    async def run_test():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    asyncio.run(run_test())
+    assert monitor.metrics()["ticks"] > 0
+    assert monitor.metrics()["stalls"] == 0
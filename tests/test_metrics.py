@@ -0,0 +1,57 @@
+import asyncio
+
+from backend.utils.logger import log_async_calls
+from backend.utils.metrics import STREAM_DURATION, STREAM_FIRST_EVENT, MetricsRegistry, timed
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_duration_seconds", "test", ("node",), buckets=(0.1, 1.0))
+    child = histogram.labels("planner")
+    for value in (0.05, 0.1, 0.5, 3.0):
+        child.observe(value)
+    registry.counter("test_total", "test").inc(2)
+    registry.register_collector(lambda: [("test_queue_depth", "gauge", "test", [({"priority": "high"}, 3)])])
+
+    text = asyncio.run(registry.render())
+    assert 'test_duration_seconds_bucket{node="planner",le="0.1"} 2' in text
+    assert 'test_duration_seconds_bucket{node="planner",le="1"} 3' in text
+    assert 'test_duration_seconds_bucket{node="planner",le="+Inf"} 4' in text
+    assert 'test_duration_seconds_count{node="planner"} 4' in text
+    assert "test_total 2" in text
+    assert 'test_queue_depth{priority="high"} 3' in text
+
+def test_timed_records_status():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_node_seconds", "test", ("node", "status"))
+
+    @timed(histogram, "executor")
+    async def node(fail):
+        if fail:
+            raise ValueError("boom")
+        return "ok"
+
+    async def run_test():
+        await node(False)
+        try:
+            await node(True)
+        except ValueError:
+            pass
+
+    asyncio.run(run_test())
+    assert histogram.labels("executor", "success").counts[0] == 1
+    assert sum(histogram.labels("executor", "error").counts) == 1
+
+def test_async_generators_record_first_event_and_duration():
+    @log_async_calls("test")
+    async def stream():
+        await asyncio.sleep(0.01)
+        yield 1
+        yield 2
+
+    async def run_test():
+        return [item async for item in stream()]
+
+    assert asyncio.run(run_test()) == [1, 2]
+    function = stream.__wrapped__.__qualname__
+    assert STREAM_FIRST_EVENT.labels("test", function).sum >= 0.01
+    assert sum(STREAM_DURATION.labels("test", function, "success").counts) == 1
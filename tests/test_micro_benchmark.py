@@ -0,0 +1,28 @@
+import json
+
+from backend.devtools.micro_benchmark import run_suite, synthetic_cases, synthetic_lawyers
+from backend.tools.legal_tools import LawyerRecommendationTool, LegalCaseSearchTool
+from backend.utils.json_utils import format_for_prompt
+
+def test_tool_matchers_on_synthetic_data():
+    search_tool = LegalCaseSearchTool()
+    search_tool.mock_cases = synthetic_cases(200)
+    matched = search_tool._match_cases("违法解除", "劳动纠纷")
+    assert matched and all(case["case_type"] == "劳动纠纷" for case in matched)
+
+    lawyer_tool = LawyerRecommendationTool()
+    lawyer_tool.mock_lawyers = synthetic_lawyers(200)
+    ranked = lawyer_tool._rank_lawyers("劳动法", "北京")
+    scores = [lawyer["match_score"] for lawyer in ranked]
+    assert ranked and scores == sorted(scores, reverse=True)
+    assert "match_score" not in lawyer_tool.mock_lawyers[0]
+
+def test_format_for_prompt_keeps_chinese():
+    text = format_for_prompt([{"step": "检索案例"}])
+    assert "检索案例" in text and json.loads(text) == [{"step": "检索案例"}]
+
+def test_run_suite_small():
+    results = run_suite(sizes=(100,), min_time=0.001, repeat=2)
+    assert results["tools.case_search[100]"]["size"] == 100
+    assert results["agent.format_results[3]"]["per_op_us"] > 0
+    assert "logger.log_async_calls.decorated" in results
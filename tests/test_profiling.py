@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+from backend.utils.profiling import ProfileStore, RequestProfiler, profile_session
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+async def profiled_tool():
+    for _ in range(10):
+        busy(0.01)
+        await asyncio.sleep(0)
+
+async def unrelated_request():
+    for _ in range(10):
+        busy(0.01)
+        await asyncio.sleep(0)
+
+def test_profile_covers_only_the_profiled_request(tmp_path):
+    profiler = RequestProfiler(interval_ms=1)
+
+    async def request():
+        session = profiler.start("POST /api/legal/consult", profile_id="abc123")
+        token = profile_session.set(session)
+        try:
+            # 请求内部创建的任务同样计入
+            await asyncio.create_task(profiled_tool())
+        finally:
+            profile_session.reset(token)
+            profiler.stop(session)
+        return session
+
+    async def run_test():
+        other = asyncio.create_task(unrelated_request())
+        session = await request()
+        await other
+        assert asyncio.get_running_loop().get_task_factory() is None
+        return session
+
+    session = asyncio.run(run_test())
+    collapsed = session.collapsed()
+    assert session.samples > 0
+    assert "profiled_tool" in collapsed
+    assert "unrelated_request" not in collapsed
+
+    store = ProfileStore(str(tmp_path), max_profiles=1)
+    asyncio.run(store.save(session))
+    assert asyncio.run(store.get("abc123")) == collapsed
+    assert asyncio.run(store.list())[0]["profile_id"] == "abc123"
+    assert asyncio.run(store.get("../abc123")) is None
+
+def test_restarted_profile_stops_previous_sampler():
+    profiler = RequestProfiler(interval_ms=1)
+    sampling, release = threading.Event(), threading.Event()
+
+    def blocking_task_frames():
+        sampling.set()
+        release.wait()
+        return set()
+
+    async def run_test():
+        first = profiler.start("first")
+        first.task_frames = blocking_task_frames
+        old_sampler = profiler._sampler
+        # 旧采样线程正在采样时结束分析并立即开始新的分析
+        sampling.wait()
+        profiler.stop(first)
+        second = profiler.start("second")
+        release.set()
+        old_sampler.join(timeout=1)
+        alive = old_sampler.is_alive()
+        profiler.stop(second)
+        return alive
+
+    assert asyncio.run(run_test()) is False
+
+def test_profiling_requires_configured_admin_token(monkeypatch, tmp_path):
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    from backend.utils import profiling
+
+    async def endpoint(request):
+        return PlainTextResponse("ok")
+
+    monkeypatch.setattr(profiling, "profile_store", ProfileStore(str(tmp_path)))
+    client = TestClient(profiling.ProfilingMiddleware(Starlette(routes=[Route("/api/legal/search-cases", endpoint)])))
+
+    monkeypatch.setattr("backend.config.settings.admin_token", None)
+    assert client.get("/api/legal/search-cases", headers={"X-Profile": "1"}).status_code == 403
+    assert client.get("/api/legal/search-cases").status_code == 200
+
+    monkeypatch.setattr("backend.config.settings.admin_token", "secret")
+    assert client.get("/api/legal/search-cases?profile=1", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.get("/api/legal/search-cases?profile=1", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200 and response.headers["x-profile-id"]
@@ -0,0 +1,33 @@
+import asyncio
+
+from backend.utils.rate_limit import SlidingWindowLimiter, client_identity
+from backend.utils.shared_state import InMemorySharedState
+
+def test_sliding_window_weights_previous_window():
+    limiter = SlidingWindowLimiter("test", limit=10, window=60, state=InMemorySharedState())
+
+    async def run_test():
+        results = [await limiter.hit("c1", now=50.0) for _ in range(11)]
+        # 下一个窗口过半时，上一窗口的10次请求按一半计入
+        results.append(await limiter.hit("c1", cost=5, now=90.0))
+        results.append(await limiter.hit("c1", now=90.0))
+        return results
+
+    results = asyncio.run(run_test())
+    assert [allowed for allowed, _ in results[:10]] == [True] * 10
+    assert results[10] == (False, 10)
+    assert results[11] == (True, 0)
+    assert results[12][0] is False
+
+def test_clients_are_limited_independently():
+    limiter = SlidingWindowLimiter("test", limit=1, window=60, state=InMemorySharedState())
+
+    async def run_test():
+        return [await limiter.hit(client, now=10.0) for client in ("a", "a", "b")]
+
+    assert [allowed for allowed, _ in asyncio.run(run_test())] == [True, False, True]
+
+def test_client_identity_hashes_api_key():
+    identity = client_identity({"authorization": "Bearer secret"}, "10.0.0.1")
+    assert identity.startswith("key:") and "secret" not in identity
+    assert client_identity({}, "10.0.0.1") == "ip:10.0.0.1"
@@ -0,0 +1,75 @@
+import asyncio
+
+from backend.agents.memory import SessionMemoryManager
+
+def test_session_window_is_token_bounded():
+    memory = SessionMemoryManager(max_tokens_per_session=50, keep_recent_turns=2)
+
+    async def run():
+        for i in range(6):
+            await memory.record_consultation("s1", f"第{i}个问题" * 5, f"第{i}个回答" * 5)
+
+    asyncio.run(run())
+    session = memory.get("s1")
+    assert len(session.turns) == 2
+    assert session.summary
+    assert session.conversation_tokens <= 50 + session.turns[0].tokens
+
+def test_lru_eviction_of_idle_sessions():
+    memory = SessionMemoryManager(max_sessions=2)
+
+    async def run():
+        await memory.record_consultation("a", "问题", "回答")
+        await memory.record_consultation("b", "问题", "回答")
+        memory.get("a")
+        await memory.record_consultation("c", "问题", "回答")
+
+    asyncio.run(run())
+    assert memory.get("b") is None
+    assert memory.get("a") is not None
+    assert memory.get("c") is not None
+    assert memory.stats()["evictions"] == 1
+
+def test_successful_results_are_reusable_by_signature():
+    memory = SessionMemoryManager()
+
+    asyncio.run(memory.record_consultation(
+        "s1", "问题", "回答",
+        plan=["案例检索", "律师推荐"],
+        execution_results={"案例检索": {"cases": []}, "律师推荐": {"error": "timeout"}},
+        step_signatures={"案例检索": "sig-a", "律师推荐": "sig-b"}
+    ))
+    session = memory.get("s1")
+    assert session.get_cached_result("sig-a") == {"cases": []}
+    assert session.get_cached_result("sig-b") is None
+
+def test_token_total_is_consistent_across_summarizer_awaits():
+    async def slow_summarizer(summary, turns):
+        await asyncio.sleep(0.01)
+        return "摘要"
+
+    memory = SessionMemoryManager(max_tokens_per_session=10, keep_recent_turns=1, summarizer=slow_summarizer)
+
+    async def run():
+        await asyncio.gather(*[
+            memory.record_consultation("s1", f"第{i}个问题" * 3, f"第{i}个回答" * 3) for i in range(3)
+        ])
+
+    asyncio.run(run())
+    assert memory.total_tokens == memory.get("s1").total_tokens
+
+def test_session_evicted_while_summarizing_is_not_counted():
+    memory = SessionMemoryManager(max_tokens_per_session=10, keep_recent_turns=1)
+
+    async def evicting_summarizer(summary, turns):
+        memory.clear("s1")
+        return "摘要"
+
+    memory.summarizer = evicting_summarizer
+
+    async def run():
+        await memory.record_consultation("s1", "问题" * 10, "回答" * 10)
+
+    asyncio.run(run())
+    assert memory.get("s1") is None
+    assert memory.total_tokens == 0
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from backend.agents.memory import SessionMemoryManager
+from backend.utils.local_redis import LocalRedis
+from backend.utils.shared_state import InMemorySharedState, RedisSharedState, SharedState
+
+def make_states():
+    return [InMemorySharedState(), RedisSharedState(LocalRedis())]
+
+@pytest.mark.parametrize("state", make_states(), ids=["memory", "redis"])
+def test_single_flight_runs_factory_once(state):
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"content": "result"}
+
+    async def run_test():
+        results = await asyncio.gather(*[state.single_flight("k", factory, ttl=60) for _ in range(5)])
+        results.append(await state.single_flight("k", factory, ttl=60))
+        return results
+
+    results = asyncio.run(run_test())
+    assert len(calls) == 1
+    assert all(result == {"content": "result"} for result in results)
+
+def test_single_flight_is_shared_between_workers():
+    redis = LocalRedis()
+    workers = [RedisSharedState(redis), RedisSharedState(redis)]
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def run_test():
+        return await asyncio.gather(*[worker.single_flight("k", factory, ttl=60) for worker in workers])
+
+    assert asyncio.run(run_test()) == ["done", "done"]
+    assert len(calls) == 1
+
+@pytest.mark.parametrize("state", make_states(), ids=["memory", "redis"])
+def test_incr_many(state):
+    async def run_test():
+        await state.incr("a", 2, ttl=60)
+        return await state.incr_many({"a": 1, "b": 5}, ttl=60)
+
+    assert asyncio.run(run_test()) == [3, 5]
+
+def test_session_memory_is_shared_through_store():
+    store = RedisSharedState(LocalRedis())
+    worker_a = SessionMemoryManager(store=store)
+    worker_b = SessionMemoryManager(store=store)
+
+    async def run_test():
+        await worker_a.record_consultation("s1", "公司拖欠工资怎么办？", "可以申请劳动仲裁。", case_type="labor")
+        return await worker_b.load("s1")
+
+    session = asyncio.run(run_test())
+    assert session.case_type == "labor"
+    assert [turn.role for turn in session.turns] == ["user", "assistant"]
+
+def test_cache_churn_does_not_evict_counters_or_results():
+    state = InMemorySharedState(max_entries=10)
+
+    async def run_test():
+        await state.incr("rl:chat:1.2.3.4:0", 3, ttl=60)
+        await state.set("execution_results:abc", {"steps": 1}, ttl=60)
+        for index in range(100):
+            await state.single_flight(f"tool:{index}", lambda: asyncio.sleep(0, result=index), ttl=60)
+        return await state.get_many(["rl:chat:1.2.3.4:0", "execution_results:abc", "sf:result:tool:0"])
+
+    counter, result, oldest_cache = asyncio.run(run_test())
+    assert counter == 3 and result == {"steps": 1}
+    assert oldest_cache is None
+    assert len(state._data) == 10
+
+def test_shared_state_is_abstract():
+    with pytest.raises(TypeError):
+        SharedState()
+
+def test_durable_store_trims_to_low_water_mark():
+    state = InMemorySharedState(max_durable_entries=100)
+
+    async def run_test():
+        for index in range(101):
+            await state.incr(f"rl:req:client{index}:0", ttl=60)
+
+    asyncio.run(run_test())
+    # 超出上限后一次清理到90%，之后的写入不再触发全量扫描
+    assert len(state._durable) == 90
+    assert asyncio.run(state.get("rl:req:client100:0")) == 1
+    assert asyncio.run(state.get("rl:req:client0:0")) is None
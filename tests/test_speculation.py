@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from backend.agents.legal_agent import LegalPlanExecuteAgent
+from backend.agents.memory import SessionMemoryManager
+from backend.config import settings
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+class FakeLLM:
+    async def ainvoke(self, messages):
+        await asyncio.sleep(0.05)
+        return FakeResponse(json.dumps({"plan": ["法律案情分析", "案例检索"], "reasoning": ""}, ensure_ascii=False))
+
+class FakeTool:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    async def execute(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.03)
+        return {"tool": self.name}
+
+def test_speculative_results_are_adopted_or_discarded(monkeypatch):
+    monkeypatch.setattr(settings, "tool_cache_ttl", 0)
+    agent = LegalPlanExecuteAgent()
+    agent.llm = FakeLLM()
+    agent.tools = {name: FakeTool(name) for name in ("legal_analysis", "case_search", "lawyer_recommendation")}
+    agent._build_graph()
+
+    async def run_test():
+        return [event async for event in agent.stream_consultation("公司拖欠工资怎么办")]
+
+    events = asyncio.run(run_test())
+    final = next(event for event in events if event["type"] == "final_answer")
+    execution_results = asyncio.run(agent.get_execution_results(final["data"]["result_id"]))
+    assert execution_results["案例检索"] == {"tool": "case_search"}
+    assert agent.tools["case_search"].calls == 1
+
+    metrics = agent.speculation_metrics()
+    assert (metrics["started"], metrics["adopted"], metrics["wasted"]) == (2, 1, 1)
+    assert metrics["wasted_ratio"] == 0.5
+    assert metrics["saved_ms"] > 0
+    assert metrics["in_flight"] == 0
+
+def test_speculation_is_cancelled_on_session_cache_hit(monkeypatch):
+    monkeypatch.setattr(settings, "tool_cache_ttl", 0)
+    agent = LegalPlanExecuteAgent()
+    agent.llm = FakeLLM()
+    agent.tools = {name: FakeTool(name) for name in ("legal_analysis", "case_search", "lawyer_recommendation")}
+    agent.memory = SessionMemoryManager()
+    agent._build_graph()
+    query = "公司拖欠工资怎么办"
+    signature = agent._step_signature("case_search", {"keywords": query, "case_type": "general"})
+    asyncio.run(agent.memory.record_consultation(
+        "s1", "之前的问题", "之前的回答",
+        execution_results={"案例检索": {"tool": "cached"}},
+        step_signatures={"案例检索": signature}
+    ))
+
+    async def run_test():
+        return [event async for event in agent.stream_consultation(query, session_id="s1")]
+
+    events = asyncio.run(run_test())
+    final = next(event for event in events if event["type"] == "final_answer")
+    execution_results = asyncio.run(agent.get_execution_results(final["data"]["result_id"]))
+    assert execution_results["案例检索"] == {"tool": "cached"}
+
+    metrics = agent.speculation_metrics()
+    # 两个投机任务都没有被采用：案例检索命中会话缓存，律师推荐不在计划中
+    assert (metrics["started"], metrics["adopted"], metrics["wasted"]) == (2, 0, 2)
+    assert metrics["in_flight"] == 0
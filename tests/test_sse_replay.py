@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from backend.utils.sse_replay import ConsultationRunRegistry
+
+async def fake_consultation(count: int):
+    for i in range(count):
+        await asyncio.sleep(0)
+        yield {"type": "execution", "content": f"step {i}"}
+
+async def collect(run, last_event_id=0):
+    return [(event_id, json.loads(data)) async for event_id, data in run.subscribe(last_event_id)]
+
+def test_event_ids_are_monotonic_and_replayable():
+    async def run_test():
+        registry = ConsultationRunRegistry()
+        run = registry.start("c1", fake_consultation(5))
+        live = await collect(run)
+        replayed = await collect(registry.get("c1"), last_event_id=3)
+        return live, replayed
+
+    live, replayed = asyncio.run(run_test())
+    assert [event_id for event_id, _ in live] == [1, 2, 3, 4, 5]
+    assert [event["content"] for _, event in replayed] == ["step 3", "step 4"]
+
+def test_replay_buffer_is_bounded():
+    async def run_test():
+        registry = ConsultationRunRegistry(buffer_size=3)
+        run = registry.start("c1", fake_consultation(10))
+        await run.task
+        return await collect(run)
+
+    events = asyncio.run(run_test())
+    assert [event_id for event_id, _ in events] == [7, 8, 9, 10]
+    assert events[0][1]["type"] == "reset"
+    assert events[0][1]["data"] == {"missed_from": 1, "missed_to": 7}
+
+def test_reconnect_after_gap_gets_reset_event():
+    async def run_test():
+        registry = ConsultationRunRegistry(buffer_size=3)
+        run = registry.start("c1", fake_consultation(10))
+        await run.task
+        return await collect(run, last_event_id=4), await collect(run, last_event_id=8)
+
+    gapped, contiguous = asyncio.run(run_test())
+    reset_id, reset = gapped[0]
+    assert (reset_id, reset["type"], reset["data"]) == (7, "reset", {"missed_from": 5, "missed_to": 7})
+    assert [event_id for event_id, _ in gapped[1:]] == [8, 9, 10]
+    assert [event_id for event_id, _ in contiguous] == [9, 10]
+
+def test_finished_runs_are_evicted_when_full():
+    async def run_test():
+        registry = ConsultationRunRegistry(max_runs=2)
+        for run_id in ("a", "b", "c"):
+            await registry.start(run_id, fake_consultation(1)).task
+        return registry
+
+    registry = asyncio.run(run_test())
+    assert registry.get("a") is None
+    assert registry.get("c") is not None
+
+def test_sweeper_removes_expired_runs():
+    async def run_test():
+        registry = ConsultationRunRegistry(finished_ttl=0)
+        await registry.start("a", fake_consultation(1)).task
+        registry.start_sweeper(interval=0.01)
+        await asyncio.sleep(0.05)
+        remaining = registry.get("a")
+        await registry.shutdown()
+        return remaining
+
+    assert asyncio.run(run_test()) is None
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from backend.config import Settings
+from backend.utils.startup import StartupReport
+
+def test_startup_report_phases_and_milestones():
+    report = StartupReport()
+    with report.phase("config"):
+        pass
+    report.mark("serving")
+    data = report.to_dict()
+    assert data["phases"]["config"] >= 0
+    assert data["milestones"]["serving"] > 0
+
+def test_settings_have_no_import_side_effects(tmp_path):
+    settings = Settings(openai_api_key=None, upload_dir=str(tmp_path / "uploads"))
+    assert not (tmp_path / "uploads").exists()
+    with pytest.raises(ValueError):
+        settings.check_required()
+    settings.create_directories()
+    assert (tmp_path / "uploads").is_dir()
+
+def test_main_import_does_not_load_agent_dependencies():
+    code = (
+        "import sys, backend.main; "
+        "loaded = [m for m in ('langchain', 'langgraph', 'langchain_openai', 'backend.agents.legal_agent') if m in sys.modules]; "
+        "assert not loaded, loaded"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True,
+        env={**os.environ, "OPENAI_API_KEY": "test-key"}
+    )
+    assert result.returncode == 0, result.stderr
+
+def test_main_import_does_not_write_to_disk(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-c", "import backend.main"], capture_output=True, text=True, cwd=tmp_path,
+        env={**os.environ, "OPENAI_API_KEY": "test-key", "PYTHONPATH": root}
+    )
+    assert result.returncode == 0, result.stderr
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,50 @@
+import asyncio
+
+from backend.utils.tracing import Tracer, annotate, otlp_span, parse_traceparent
+
+def test_child_spans_join_request_trace():
+    tracer = Tracer(max_traces=2)
+
+    async def tool():
+        with tracer.span("tool.case_search", tool="case_search"):
+            annotate(cache="hit")
+
+    async def request(trace_id=None):
+        with tracer.span("POST /api/legal/consult", root=True, trace_id=trace_id):
+            # 后台任务继承请求的span
+            await asyncio.create_task(tool())
+            with tracer.span("llm") as span:
+                span.attributes.update(prompt_tokens=100, completion_tokens=20)
+
+    asyncio.run(request("0af7651916cd43dd8448eb211c80319c"))
+    trace = tracer.get("0af7651916cd43dd8448eb211c80319c")
+    assert trace["spans"] == 3
+    assert trace["tokens"] == 120
+    assert trace["cache_hits"] == 1
+    root = next(span for span in trace["span_list"] if span["parent_id"] is None)
+    assert all(span["parent_id"] == root["span_id"] for span in trace["span_list"] if span is not root)
+
+    # 不在请求内的span不记录，缓冲区只保留最近的trace
+    with tracer.span("orphan") as span:
+        assert span is None
+    asyncio.run(request())
+    asyncio.run(request())
+    assert len(tracer.traces()) == 2
+    assert tracer.get("0af7651916cd43dd8448eb211c80319c") is None
+
+def test_span_errors_and_otlp_payload():
+    tracer = Tracer()
+    try:
+        with tracer.span("GET /api/health", root=True):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    summary = tracer.traces()[0]
+    assert summary["status"] == "error"
+    span = tracer._traces[summary["trace_id"]].spans[0]
+    payload = otlp_span(span)
+    assert payload["status"]["code"] == 2
+    assert "parentSpanId" not in payload
+
+    assert parse_traceparent("00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01") == "0af7651916cd43dd8448eb211c80319c"
+    assert parse_traceparent("garbage") is None